@@ -29,6 +29,7 @@ class GroupTombstoneDetailsEndpoint(ProjectEndpoint):
             # will allow new events to be captured
             group_tombstone_id=None
         )
+        GroupHash.objects.invalidate_cache(project.id)
 
         tombstone.delete()
 
@@ -317,6 +317,7 @@ def handle_discard(request, group_list, projects, user):
                 GroupHash.objects.filter(group=group).update(
                     group=None, group_tombstone_id=tombstone.id
                 )
+                GroupHash.objects.invalidate_cache(group.project_id)
 
     for project in projects:
         _delete_groups(request, project, groups_to_delete.get(project.id), delete_type="discard")
@@ -1,4 +1,6 @@
 import zlib
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
 
 from sentry.utils import metrics
 from sentry.utils.json import prune_empty_keys
@@ -9,6 +11,9 @@ ATTACHMENT_DATA_CHUNK_KEY = "{key}:a:{id}:{chunk_index}"
 
 UNINITIALIZED_DATA = object()
 
+# Attachments larger than this are spooled to disk when opened as file.
+ATTACHMENT_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
 
 class MissingAttachmentChunks(Exception):
     pass
@@ -63,6 +68,29 @@ class CachedAttachment:
         assert self._data is not UNINITIALIZED_DATA
         return self._data
 
+    def open(self):
+        """
+        Returns a readable file object with the attachment's contents.
+
+        Unlike ``data``, the contents are never held in memory as a whole.
+        Chunks are decompressed one by one into a temporary file, which is
+        kept in memory only for small attachments. Raises
+        ``MissingAttachmentChunks`` if any chunk is missing.
+        """
+        if self._data is not UNINITIALIZED_DATA or self._cache is None:
+            return BytesIO(self.data)
+
+        fileobj = SpooledTemporaryFile(max_size=ATTACHMENT_SPOOL_MAX_SIZE)
+        try:
+            for chunk in self._cache.iter_data_chunks(self):
+                fileobj.write(chunk)
+        except BaseException:
+            fileobj.close()
+            raise
+
+        fileobj.seek(0)
+        return fileobj
+
     def delete(self):
         for key in self.chunk_keys:
             self._cache.inner.delete(key)
@@ -151,16 +179,18 @@ class BaseAttachmentCache:
             attachment.setdefault("key", key)
             yield CachedAttachment(cache=self, **attachment)
 
-    def get_data(self, attachment):
-        data = []
-
+    def iter_data_chunks(self, attachment):
+        """
+        Yields the decompressed chunks of an attachment one by one.
+        """
         for key in attachment.chunk_keys:
             raw_data = self.inner.get(key, raw=True)
             if raw_data is None:
                 raise MissingAttachmentChunks()
-            data.append(zlib.decompress(raw_data))
+            yield zlib.decompress(raw_data)
 
-        return b"".join(data)
+    def get_data(self, attachment):
+        return b"".join(self.iter_data_chunks(attachment))
 
     def delete(self, key):
         for attachment in self.get(key):
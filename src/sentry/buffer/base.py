@@ -1,9 +1,13 @@
 import logging
 
-from django.db.models import F
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, router, transaction
+from django.db.models import AutoField, F, Model
 
 from sentry.signals import buffer_incr_complete
 from sentry.tasks.process_buffer import process_incr
+from sentry.utils import metrics
+from sentry.utils.dates import to_timestamp
 from sentry.utils.services import Service
 
 
@@ -82,3 +86,178 @@ class Buffer(Service, metaclass=BufferMount):
             created=created,
             sender=model,
         )
+
+    def process_batch(self, items):
+        """
+        Processes many increments at once. ``items`` is a list of
+        ``(model, columns, filters, extra, signal_only)`` tuples as passed to
+        ``process``.
+
+        Increments of the same model that touch the same columns are applied
+        with a single ``UPDATE``. Everything that cannot be batched, rows
+        which do not exist yet and the rows of a failed ``UPDATE`` go through
+        ``process`` one by one. An increment that fails there is logged and
+        does not keep the remaining ones from being applied.
+        """
+        from sentry.models import Group
+
+        batches = {}
+        for model, columns, filters, extra, signal_only in items:
+            extra = dict(extra or ())
+            if model is Group and "last_seen" in extra and "times_seen" in columns:
+                # The score is recomputed from last_seen and times_seen, see
+                # ``process``.
+                extra.pop("score", None)
+
+            if signal_only or not columns or not self._is_batchable(model, filters, extra):
+                self._process_one(model, columns, filters, extra, signal_only)
+                continue
+
+            batch_key = (
+                model,
+                tuple(sorted(filters)),
+                tuple(sorted(columns)),
+                tuple(sorted(extra)),
+            )
+            batches.setdefault(batch_key, []).append((columns, filters, extra))
+
+        for (model, filter_names, column_names, extra_names), rows in batches.items():
+            updated = ()
+            if len(rows) > 1:
+                try:
+                    updated = self._update_many(
+                        model, filter_names, column_names, extra_names, rows
+                    )
+                except Exception:
+                    self.logger.exception(
+                        "buffer.batch-update.failed", extra={"model": model.__name__}
+                    )
+
+            for idx, (columns, filters, extra) in enumerate(rows):
+                if idx not in updated:
+                    self._process_one(model, columns, filters, extra)
+                    continue
+
+                buffer_incr_complete.send_robust(
+                    model=model,
+                    columns=columns,
+                    filters=filters,
+                    extra=extra,
+                    created=False,
+                    sender=model,
+                )
+
+    def _process_one(self, model, columns, filters, extra=None, signal_only=None):
+        try:
+            self.process(model, columns, filters, extra, signal_only)
+        except Exception:
+            self.logger.exception("buffer.process.failed", extra={"model": model.__name__})
+
+    def _is_batchable(self, model, filters, extra):
+        if not filters:
+            return False
+        for name, value in list(filters.items()) + list(extra.items()):
+            # Model instances and expressions need to be resolved by the ORM.
+            if isinstance(value, Model) or hasattr(value, "resolve_expression"):
+                return False
+            if name != "pk":
+                try:
+                    model._meta.get_field(name)
+                except FieldDoesNotExist:
+                    return False
+        return True
+
+    def _update_many(self, model, filter_names, column_names, extra_names, rows):
+        """
+        Applies the increments in ``rows`` with a single ``UPDATE ... FROM
+        (VALUES ...)`` and returns the indexes of the rows that were updated.
+        """
+        from sentry.models import Group
+
+        using = router.db_for_write(model)
+        connection = connections[using]
+        qn = connection.ops.quote_name
+        table = qn(model._meta.db_table)
+
+        def get_field(name):
+            return model._meta.pk if name == "pk" else model._meta.get_field(name)
+
+        def get_value_ref(alias, field):
+            # Auto fields have pseudo types such as ``bigserial`` which cannot
+            # be cast to, use the type of a column referencing them instead
+            # (see ``FlexibleForeignKey``).
+            if hasattr(field, "get_related_db_type"):
+                db_type = field.get_related_db_type(connection)
+            elif isinstance(field, AutoField):
+                db_type = field.rel_db_type(connection)
+            else:
+                db_type = field.db_type(connection)
+            return f"data.{alias}::{db_type}" if db_type else f"data.{alias}"
+
+        aliases = ["idx"]
+        assignments = []
+        conditions = []
+
+        for i, name in enumerate(filter_names):
+            field = get_field(name)
+            aliases.append(f"f{i}")
+            conditions.append(f"{table}.{qn(field.column)} = {get_value_ref(f'f{i}', field)}")
+
+        for i, name in enumerate(column_names):
+            field = get_field(name)
+            column = qn(field.column)
+            aliases.append(f"i{i}")
+            assignments.append(f"{column} = {table}.{column} + {get_value_ref(f'i{i}', field)}")
+
+        for i, name in enumerate(extra_names):
+            field = get_field(name)
+            aliases.append(f"e{i}")
+            assignments.append(f"{qn(field.column)} = {get_value_ref(f'e{i}', field)}")
+
+        # HACK(dcramer): see ``process``, this is the batched ScoreClause.
+        with_score = model is Group and "last_seen" in extra_names and "times_seen" in column_names
+        if with_score:
+            aliases.append("score")
+            times_seen_ref = get_value_ref(
+                f"i{column_names.index('times_seen')}", get_field("times_seen")
+            )
+            assignments.append(
+                f"{qn('score')} = log({table}.{qn('times_seen')} + {times_seen_ref}) * 600 + data.score::integer"
+            )
+
+        params = []
+        for idx, (columns, filters, extra) in enumerate(rows):
+            params.append(idx)
+            for name in filter_names:
+                params.append(get_field(name).get_db_prep_save(filters[name], connection))
+            for name in column_names:
+                params.append(columns[name])
+            for name in extra_names:
+                params.append(get_field(name).get_db_prep_save(extra[name], connection))
+            if with_score:
+                params.append(int(to_timestamp(extra["last_seen"])))
+
+        placeholder = "(%s)" % ", ".join(["%s"] * len(aliases))
+        sql = "UPDATE {} SET {} FROM (VALUES {}) AS data ({}) WHERE {} RETURNING data.idx".format(
+            table,
+            ", ".join(assignments),
+            ", ".join([placeholder] * len(rows)),
+            ", ".join(aliases),
+            " AND ".join(conditions),
+        )
+
+        # The savepoint keeps a failing statement from aborting a transaction
+        # the caller might be in, so the rows can still be processed one by
+        # one.
+        with transaction.atomic(using=using):
+            cursor = connection.cursor()
+            cursor.execute(sql, params)
+            updated = {idx for idx, in cursor.fetchall()}
+
+        metrics.incr(
+            "buffer.batch-update",
+            amount=len(updated),
+            skip_internal=True,
+            tags={"module": model.__module__, "model": model.__name__},
+        )
+        return updated
@@ -1,13 +1,120 @@
+import atexit
+import os
+import threading
+
+from celery.signals import worker_process_shutdown
+
 from sentry.buffer import Buffer
+from sentry.utils import metrics
+
+_flusher_lock = threading.Lock()
 
 
 class InProcessBuffer(Buffer):
     """
     In-process buffer which computes changes in real-time.
 
-    **Note**: This does not actually buffer anything, and should only be used
-              in development and testing environments.
+    By default this does not actually buffer anything, and should only be
+    used in development and testing environments.
+
+    If ``flush_interval`` is set, increments are accumulated in memory
+    instead and written in batches by a background thread every
+    ``flush_interval`` seconds, or as soon as ``max_pending`` keys are
+    waiting. This gives single node installations without Redis the write
+    coalescing of ``RedisBuffer``. Pending increments are flushed when the
+    process exits, but they are lost if it gets killed. If a batched
+    ``UPDATE`` fails, its increments are applied one by one instead.
     """
 
+    def __init__(self, flush_interval=0, max_pending=1000, **options):
+        assert flush_interval >= 0
+        assert max_pending > 0
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pid = None
+
+        if self.flush_interval:
+            atexit.register(self.flush)
+            # Celery's pool processes exit without running atexit handlers.
+            worker_process_shutdown.connect(self._flush_on_shutdown, weak=False)
+
     def incr(self, model, columns, filters, extra=None, signal_only=None):
-        self.process(model, columns, filters, extra, signal_only)
+        if not self.flush_interval:
+            self.process(model, columns, filters, extra, signal_only)
+            return
+
+        try:
+            key = (model, tuple(sorted(filters.items())))
+            hash(key)
+        except TypeError:
+            self.process(model, columns, filters, extra, signal_only)
+            return
+
+        self._ensure_flusher()
+
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = [dict(columns), filters, dict(extra or ()), signal_only]
+            else:
+                pending_columns, pending_extra = pending[0], pending[2]
+                for column, amount in columns.items():
+                    pending_columns[column] = pending_columns.get(column, 0) + amount
+                if extra:
+                    pending_extra.update(extra)
+                if signal_only is True:
+                    pending[3] = True
+            if len(self._pending) >= self.max_pending:
+                self._wakeup.set()
+
+    def _ensure_flusher(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+
+        with _flusher_lock:
+            if self._pid == pid:
+                return
+
+            # A forked process starts out empty, the increments it inherited
+            # are flushed by its parent.
+            self._pending = {}
+            self._lock = threading.Lock()
+            self._wakeup = threading.Event()
+            flusher = threading.Thread(target=self._run_flusher, name="sentry.buffer.inprocess")
+            flusher.daemon = True
+            flusher.start()
+            self._pid = pid
+
+    def _run_flusher(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                self.logger.exception("buffer.flush.failed")
+
+    def _flush_on_shutdown(self, **kwargs):
+        self.flush()
+
+    def flush(self):
+        """
+        Writes all pending increments to the database.
+        """
+        if self._pid != os.getpid():
+            return
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return
+
+        metrics.timing("buffer.inprocess.flush-size", len(pending))
+        self.process_batch(
+            [
+                (model, columns, filters, extra, signal_only)
+                for (model, _), (columns, filters, extra, signal_only) in pending.items()
+            ]
+        )
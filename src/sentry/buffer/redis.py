@@ -1,12 +1,17 @@
+import atexit
+import os
 import pickle
 import threading
+from collections import defaultdict
 from datetime import datetime
 from time import time
 
+from celery.signals import worker_process_shutdown
 from django.db import models
 from django.utils import timezone
 from django.utils.encoding import force_bytes, force_text
 
+from sentry import options
 from sentry.buffer import Buffer
 from sentry.exceptions import InvalidConfiguration
 from sentry.tasks.process_buffer import process_incr, process_pending
@@ -14,10 +19,28 @@ from sentry.utils import json, metrics
 from sentry.utils.compat import crc32
 from sentry.utils.hashlib import md5_text
 from sentry.utils.imports import import_string
-from sentry.utils.redis import get_cluster_from_options
+from sentry.utils.redis import get_cluster_from_options, load_script
 
+incr_script = load_script("buffer/incr.lua")
+
+# Increments that are coalesced in the process before they are sent to Redis,
+# by buffer key, and the process they belong to.
 _local_buffers = None
+_local_buffers_pid = None
 _local_buffers_lock = threading.Lock()
+_shutdown_hooks_registered = False
+
+
+def _is_json_value(value):
+    # Only values that survive a JSON round trip unchanged can be encoded as
+    # JSON, everything else falls back to pickle.
+    if value is None or isinstance(value, (str, int, float)):
+        return True
+    if isinstance(value, list):
+        return all(_is_json_value(x) for x in value)
+    if isinstance(value, dict):
+        return all(isinstance(k, str) and _is_json_value(v) for k, v in value.items())
+    return False
 
 
 class PendingBuffer:
@@ -50,13 +73,35 @@ class PendingBuffer:
 class RedisBuffer(Buffer):
     key_expire = 60 * 60  # 1 hour
     pending_key = "b:p"
+    # Coalesced increments are sent to Redis early once this many keys are
+    # waiting in the process.
+    local_buffer_max_keys = 1000
 
-    def __init__(self, pending_partitions=1, incr_batch_size=2, **options):
+    def __init__(self, pending_partitions=1, incr_batch_size=2, incr_coalesce_window=0, **options):
         self.cluster, options = get_cluster_from_options("SENTRY_BUFFER_OPTIONS", options)
         self.pending_partitions = pending_partitions
         self.incr_batch_size = incr_batch_size
+        self.incr_coalesce_window = incr_coalesce_window
         assert self.pending_partitions > 0
         assert self.incr_batch_size > 0
+        assert self.incr_coalesce_window >= 0
+        if self.incr_coalesce_window:
+            self._register_shutdown_hooks()
+
+    def _register_shutdown_hooks(self):
+        global _shutdown_hooks_registered
+
+        with _local_buffers_lock:
+            if _shutdown_hooks_registered:
+                return
+            _shutdown_hooks_registered = True
+
+        atexit.register(self._flush_local_buffers)
+        # Celery's pool processes exit without running atexit handlers.
+        worker_process_shutdown.connect(self._flush_on_shutdown, weak=False)
+
+    def _flush_on_shutdown(self, **kwargs):
+        self._flush_local_buffers()
 
     def validate(self):
         try:
@@ -115,10 +160,19 @@ class RedisBuffer(Buffer):
         elif isinstance(value, datetime):
             type_ = "d"
             value = value.strftime("%s.%f")
+        elif isinstance(value, bool):
+            type_ = "b"
+            value = int(value)
         elif isinstance(value, int):
             type_ = "i"
         elif isinstance(value, float):
             type_ = "f"
+        elif value is None:
+            type_ = "n"
+            value = ""
+        elif isinstance(value, (dict, list)) and _is_json_value(value):
+            type_ = "j"
+            value = json.dumps(value)
         else:
             raise TypeError(type(value))
         return (type_, str(value))
@@ -139,9 +193,33 @@ class RedisBuffer(Buffer):
             return int(value)
         elif type_ == "f":
             return float(value)
+        elif type_ == "b":
+            return bool(int(value))
+        elif type_ == "n":
+            return None
+        elif type_ == "j":
+            return json.loads(value)
         else:
             raise TypeError(f"invalid type: {type_}")
 
+    def _dump_filters(self, filters):
+        if options.get("buffer.redis-json-encoding"):
+            try:
+                return json.dumps(self._dump_values(filters))
+            except TypeError:
+                pass
+        # TODO(dcramer): once this goes live in production, we can kill the pickle path
+        # (this is to ensure a zero downtime deploy where we can transition event processing)
+        return pickle.dumps(filters)
+
+    def _dump_extra_value(self, value):
+        if options.get("buffer.redis-json-encoding"):
+            try:
+                return json.dumps(self._dump_value(value))
+            except TypeError:
+                pass
+        return pickle.dumps(value)
+
     def incr(self, model, columns, filters, extra=None, signal_only=None):
         """
         Increment the key by doing the following:
@@ -153,45 +231,121 @@ class RedisBuffer(Buffer):
         - Add hashmap key to pending flushes
         """
 
-        # TODO(dcramer): longer term we'd rather not have to serialize values
-        # here (unless it's to JSON)
         key = self._make_key(model, filters)
+        if self.incr_coalesce_window:
+            self._coalesce_incr(key, model, columns, filters, extra, signal_only)
+        else:
+            self._incr(key, model, columns, filters, extra, signal_only)
+
+        metrics.incr(
+            "buffer.incr",
+            skip_internal=True,
+            tags={"module": model.__module__, "model": model.__name__},
+        )
+
+    def _incr(self, key, model, columns, filters, extra=None, signal_only=None):
+        from sentry.models import Group
+
         pending_key = self._make_pending_key_from_key(key)
         # We can't use conn.map() due to wanting to support multiple pending
         # keys (one per Redis partition)
         conn = self.cluster.get_local_client_for_key(key)
 
-        pipe = conn.pipeline()
-        pipe.hsetnx(key, "m", f"{model.__module__}.{model.__name__}")
-        # TODO(dcramer): once this goes live in production, we can kill the pickle path
-        # (this is to ensure a zero downtime deploy where we can transition event processing)
-        pipe.hsetnx(key, "f", pickle.dumps(filters))
-        # pipe.hsetnx(key, 'f', json.dumps(self._dump_values(filters)))
+        args = [
+            f"{model.__module__}.{model.__name__}",
+            self._dump_filters(filters),
+            self.key_expire,
+            time(),
+            "1" if signal_only is True else "0",
+            len(columns),
+        ]
         for column, amount in columns.items():
-            pipe.hincrby(key, "i+" + column, amount)
+            args.extend((column, amount))
 
         if extra:
-            # Group tries to serialize 'score', so we'd need some kind of processing
-            # hook here
-            # e.g. "update score if last_seen or times_seen is changed"
             for column, value in extra.items():
-                # TODO(dcramer): once this goes live in production, we can kill the pickle path
-                # (this is to ensure a zero downtime deploy where we can transition event processing)
-                pipe.hset(key, "e+" + column, pickle.dumps(value))
-                # pipe.hset(key, 'e+' + column, json.dumps(self._dump_value(value)))
+                # Group tries to serialize 'score', which cannot be encoded
+                # without pickling the group. It is recomputed by
+                # `Buffer.process` whenever last_seen and times_seen change.
+                if (
+                    column == "score"
+                    and model is Group
+                    and "last_seen" in extra
+                    and "times_seen" in columns
+                    and options.get("buffer.redis-json-encoding")
+                ):
+                    continue
+                args.extend((column, self._dump_extra_value(value)))
+
+        incr_script(conn, [key, pending_key], args)
+
+    def _coalesce_incr(self, key, model, columns, filters, extra=None, signal_only=None):
+        """
+        Merges the increment into the increments of the same key that are
+        waiting in the process. Counters are summed up, extra values are last
+        write wins like in Redis. All waiting increments are sent to Redis
+        once the coalesce window has passed.
+        """
+        global _local_buffers, _local_buffers_pid
+
+        with _local_buffers_lock:
+            pid = os.getpid()
+            if _local_buffers_pid != pid:
+                # A forked process neither inherits the timer thread nor
+                # should it send the increments of its parent, which flushes
+                # them itself.
+                _local_buffers = None
+                _local_buffers_pid = pid
+
+            if _local_buffers is None:
+                _local_buffers = {}
+                timer = threading.Timer(self.incr_coalesce_window, self._flush_local_buffers)
+                timer.daemon = True
+                timer.start()
+
+            pending = _local_buffers.get(key)
+            if pending is None:
+                _local_buffers[key] = [
+                    model,
+                    dict(columns),
+                    filters,
+                    dict(extra or ()),
+                    signal_only,
+                ]
+            else:
+                pending_columns, pending_extra = pending[1], pending[3]
+                for column, amount in columns.items():
+                    pending_columns[column] = pending_columns.get(column, 0) + amount
+                if extra:
+                    pending_extra.update(extra)
+                if signal_only is True:
+                    pending[4] = True
+                metrics.incr("buffer.coalesced", skip_internal=True)
 
-        if signal_only is True:
-            pipe.hset(key, "s", "1")
+            flush = len(_local_buffers) >= self.local_buffer_max_keys
 
-        pipe.expire(key, self.key_expire)
-        pipe.zadd(pending_key, {key: time()})
-        pipe.execute()
+        if flush:
+            self._flush_local_buffers()
 
-        metrics.incr(
-            "buffer.incr",
-            skip_internal=True,
-            tags={"module": model.__module__, "model": model.__name__},
-        )
+    def _flush_local_buffers(self):
+        """
+        Sends all increments that are waiting in the process to Redis.
+        """
+        global _local_buffers
+
+        with _local_buffers_lock:
+            if _local_buffers_pid != os.getpid():
+                return
+            local_buffers, _local_buffers = _local_buffers, None
+
+        if not local_buffers:
+            return
+
+        for key, (model, columns, filters, extra, signal_only) in local_buffers.items():
+            try:
+                self._incr(key, model, columns, filters, extra or None, signal_only)
+            except Exception:
+                self.logger.exception("buffer.flush-local.failed", extra={"redis_key": key})
 
     def process_pending(self, partition=None):
         if partition is None and self.pending_partitions > 1:
@@ -211,31 +365,111 @@ class RedisBuffer(Buffer):
             return
 
         pending_buffer = PendingBuffer(self.incr_batch_size)
+        now = time()
 
         try:
-            keycount = 0
-            with self.cluster.all() as conn:
-                results = conn.zrange(pending_key, 0, -1)
-
-            with self.cluster.all() as conn:
-                for host_id, keys in results.value.items():
-                    if not keys:
-                        continue
-                    keycount += len(keys)
-                    for key in keys:
-                        pending_buffer.append(key.decode("utf-8"))
-                        if pending_buffer.full():
-                            process_incr.apply_async(kwargs={"batch_keys": pending_buffer.flush()})
-                    conn.target([host_id]).zrem(pending_key, *keys)
+            chunk_size = options.get("buffer.redis-pending-chunk-size")
+            if chunk_size:
+                keycount, oldest = self._drain_pending(
+                    pending_key, lock_key, chunk_size, pending_buffer
+                )
+            else:
+                keycount = 0
+                oldest = None
+                with self.cluster.all() as conn:
+                    results = conn.zrange(pending_key, 0, -1, withscores=True)
+
+                with self.cluster.all() as conn:
+                    for host_id, keys in results.value.items():
+                        if not keys:
+                            continue
+                        keycount += len(keys)
+                        if oldest is None or keys[0][1] < oldest:
+                            oldest = keys[0][1]
+                        for key, _ in keys:
+                            pending_buffer.append(key.decode("utf-8"))
+                            if pending_buffer.full():
+                                process_incr.apply_async(
+                                    kwargs={"batch_keys": pending_buffer.flush()}
+                                )
+                        conn.target([host_id]).zrem(pending_key, *[key for key, _ in keys])
 
             # queue up remainder of pending keys
             if not pending_buffer.empty():
                 process_incr.apply_async(kwargs={"batch_keys": pending_buffer.flush()})
 
             metrics.timing("buffer.pending-size", keycount)
+            if oldest is not None:
+                metrics.timing("buffer.pending-lag", now - oldest)
         finally:
             client.delete(lock_key)
 
+    def _drain_pending(self, pending_key, lock_key, chunk_size, pending_buffer):
+        """
+        Reads the pending keys in chunks of ``chunk_size`` per host, from all
+        hosts at once, and queues them up for processing while draining. Only
+        as many keys as were pending when draining started are read, keys that
+        keep getting added are left for the next run.
+
+        Keys are only removed from the pending set once their batch has been
+        queued up, so none get lost if that fails. Returns the number of
+        drained keys and the score of the oldest one.
+        """
+        keycount = 0
+        oldest = None
+
+        with self.cluster.all() as conn:
+            results = conn.zcard(pending_key)
+        remaining = {host_id: count for host_id, count in results.value.items() if count}
+
+        # Keys that have been read but not queued up yet, by host. They are
+        # still in the pending set, so the next chunk starts after them.
+        unqueued = {host_id: [] for host_id in remaining}
+
+        def queue_up():
+            process_incr.apply_async(kwargs={"batch_keys": pending_buffer.flush()})
+            with self.cluster.all() as conn:
+                for host_id, keys in unqueued.items():
+                    if keys:
+                        conn.target([host_id]).zrem(pending_key, *keys)
+                        del keys[:]
+
+        while remaining:
+            # Draining can take longer than the lock lives, keep holding it.
+            self.cluster.get_routing_client().expire(lock_key, 60)
+
+            with self.cluster.all() as conn:
+                results = {
+                    host_id: conn.target([host_id]).zrange(
+                        pending_key,
+                        len(unqueued[host_id]),
+                        len(unqueued[host_id]) + chunk_size - 1,
+                        withscores=True,
+                    )
+                    for host_id in remaining
+                }
+
+            for host_id, result in results.items():
+                chunk = result.value[host_id]
+                remaining[host_id] -= len(chunk)
+                if not chunk or remaining[host_id] <= 0:
+                    del remaining[host_id]
+
+                if chunk and (oldest is None or chunk[0][1] < oldest):
+                    oldest = chunk[0][1]
+
+                keycount += len(chunk)
+                for key, _ in chunk:
+                    pending_buffer.append(key.decode("utf-8"))
+                    unqueued[host_id].append(key)
+                    if pending_buffer.full():
+                        queue_up()
+
+        if not pending_buffer.empty():
+            queue_up()
+
+        return keycount, oldest
+
     def process(self, key=None, batch_keys=None):
         assert not (key is None and batch_keys is None)
         assert not (key is not None and batch_keys is not None)
@@ -243,9 +477,66 @@ class RedisBuffer(Buffer):
         if key is not None:
             batch_keys = [key]
 
+        if len(batch_keys) > 1 and options.get("buffer.redis-batch-process"):
+            self._process_batch(batch_keys)
+            return
+
         for key in batch_keys:
             self._process_single_incr(key)
 
+    def _process_batch(self, keys):
+        """
+        Claims all keys with one round trip per Redis host and applies their
+        increments with ``Buffer.process_batch``.
+        """
+        with self.cluster.map() as conn:
+            locks = {key: conn.set(self._make_lock_key(key), "1", nx=True, ex=10) for key in keys}
+
+        claimed = []
+        for key, locked in locks.items():
+            if locked.value:
+                claimed.append(key)
+            else:
+                metrics.incr("buffer.revoked", tags={"reason": "locked"}, skip_internal=False)
+                self.logger.debug("buffer.revoked.locked", extra={"redis_key": key})
+
+        try:
+            router = self.cluster.get_router()
+            keys_by_host = defaultdict(list)
+            for key in claimed:
+                keys_by_host[router.get_host_for_key(key)].append(key)
+
+            items = []
+            for host, host_keys in keys_by_host.items():
+                # Like in ``_process_single_incr``, reading and deleting the
+                # keys happens in a transaction, so no increment gets lost.
+                pipe = self.cluster.get_local_client(host).pipeline()
+                for key in host_keys:
+                    pipe.hgetall(key)
+                    pipe.zrem(self._make_pending_key_from_key(key), key)
+                    pipe.delete(key)
+                results = pipe.execute()
+
+                for key, values in zip(host_keys, results[::3]):
+                    try:
+                        item = self._load_incr(key, values)
+                    except Exception:
+                        self.logger.exception("buffer.load-incr.failed", extra={"redis_key": key})
+                        continue
+                    if item is not None:
+                        items.append(item)
+
+            # The keys are gone from Redis at this point. ``process_batch``
+            # falls back to processing the rows one by one if an ``UPDATE``
+            # fails, so a broken batch does not drop the increments of every
+            # other key.
+            super().process_batch(items)
+        finally:
+            if claimed:
+                with self.cluster.map() as conn:
+                    for key in claimed:
+                        conn.delete(self._make_lock_key(key))
+
     def _process_single_incr(self, key):
         client = self.cluster.get_routing_client()
         lock_key = self._make_lock_key(key)
@@ -266,42 +557,51 @@ class RedisBuffer(Buffer):
             pipe.delete(key)
             values = pipe.execute()[0]
 
-            # XXX(python3): In python2 this isn't as important since redis will
-            # return string tyes (be it, byte strings), but in py3 we get bytes
-            # back, and really we just want to deal with keys as strings.
-            values = {force_text(k): v for k, v in values.items()}
-
-            if not values:
-                metrics.incr("buffer.revoked", tags={"reason": "empty"}, skip_internal=False)
-                self.logger.debug("buffer.revoked.empty", extra={"redis_key": key})
-                return
-
-            # XXX(py3): Note that ``import_string`` explicitly wants a str in
-            # python2, so we'll decode (for python3) and then translate back to
-            # a byte string (in python2) for import_string.
-            model = import_string(str(values.pop("m").decode("utf-8")))  # NOQA
-
-            if values["f"].startswith(b"{"):
-                filters = self._load_values(json.loads(values.pop("f").decode("utf-8")))
-            else:
-                # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
-                filters = pickle.loads(values.pop("f"))
-
-            incr_values = {}
-            extra_values = {}
-            signal_only = None
-            for k, v in values.items():
-                if k.startswith("i+"):
-                    incr_values[k[2:]] = int(v)
-                elif k.startswith("e+"):
-                    if v.startswith(b"["):
-                        extra_values[k[2:]] = self._load_value(json.loads(v.decode("utf-8")))
-                    else:
-                        # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
-                        extra_values[k[2:]] = pickle.loads(v)
-                elif k == "s":
-                    signal_only = bool(int(v))  # Should be 1 if set
-
-            super().process(model, incr_values, filters, extra_values, signal_only)
+            item = self._load_incr(key, values)
+            if item is not None:
+                super().process(*item)
         finally:
             client.delete(lock_key)
+
+    def _load_incr(self, key, values):
+        """
+        Decodes the hash of a buffer key into the arguments of
+        ``Buffer.process``. Returns ``None`` if the key was empty.
+        """
+        # XXX(python3): In python2 this isn't as important since redis will
+        # return string tyes (be it, byte strings), but in py3 we get bytes
+        # back, and really we just want to deal with keys as strings.
+        values = {force_text(k): v for k, v in values.items()}
+
+        if not values:
+            metrics.incr("buffer.revoked", tags={"reason": "empty"}, skip_internal=False)
+            self.logger.debug("buffer.revoked.empty", extra={"redis_key": key})
+            return None
+
+        # XXX(py3): Note that ``import_string`` explicitly wants a str in
+        # python2, so we'll decode (for python3) and then translate back to
+        # a byte string (in python2) for import_string.
+        model = import_string(str(values.pop("m").decode("utf-8")))  # NOQA
+
+        if values["f"].startswith(b"{"):
+            filters = self._load_values(json.loads(values.pop("f").decode("utf-8")))
+        else:
+            # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
+            filters = pickle.loads(values.pop("f"))
+
+        incr_values = {}
+        extra_values = {}
+        signal_only = None
+        for k, v in values.items():
+            if k.startswith("i+"):
+                incr_values[k[2:]] = int(v)
+            elif k.startswith("e+"):
+                if v.startswith(b"["):
+                    extra_values[k[2:]] = self._load_value(json.loads(v.decode("utf-8")))
+                else:
+                    # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
+                    extra_values[k[2:]] = pickle.loads(v)
+            elif k == "s":
+                signal_only = bool(int(v))  # Should be 1 if set
+
+        return model, incr_values, filters, extra_values, signal_only
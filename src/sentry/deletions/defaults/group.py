@@ -122,7 +122,11 @@ class GroupDeletionTask(ModelDeletionTask):
         if not self.skip_models or similarity not in self.skip_models:
             similarity.delete(None, instance)
 
-        return super().delete_instance(instance)
+        rv = super().delete_instance(instance)
+        # Grouphashes are deleted in bulk, which bypasses the invalidation of
+        # their cache.
+        models.GroupHash.objects.invalidate_cache(instance.project_id)
+        return rv
 
     def mark_deletion_in_progress(self, instance_list):
         from sentry.models import Group, GroupStatus
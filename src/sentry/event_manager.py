@@ -4,7 +4,6 @@ import logging
 import random
 import time
 from datetime import datetime, timedelta
-from io import BytesIO
 
 import sentry_sdk
 from django.conf import settings
@@ -349,8 +348,13 @@ class EventManager:
         _derive_interface_tags_many(jobs)
 
         do_background_grouping_before = options.get("store.background-grouping-before")
+
+        # Frame components are shared between all grouping configs that are
+        # run for this event.
+        grouping_cache = {} if options.get("store.grouping-component-cache") else None
+
         if do_background_grouping_before:
-            _run_background_grouping(project, job)
+            _run_background_grouping(project, job, cache=grouping_cache)
 
         secondary_hashes = None
 
@@ -361,7 +365,7 @@ class EventManager:
                     loader = SecondaryGroupingConfigLoader()
                     secondary_grouping_config = loader.get_config_dict(project)
                     secondary_hashes = _calculate_event_grouping(
-                        project, secondary_event, secondary_grouping_config
+                        project, secondary_event, secondary_grouping_config, cache=grouping_cache
                     )
         except Exception:
             sentry_sdk.capture_exception()
@@ -376,7 +380,9 @@ class EventManager:
         with sentry_sdk.start_span(op="event_manager.save.calculate_event_grouping"), metrics.timer(
             "event_manager.calculate_event_grouping"
         ):
-            hashes = _calculate_event_grouping(project, job["event"], grouping_config)
+            hashes = _calculate_event_grouping(
+                project, job["event"], grouping_config, cache=grouping_cache
+            )
 
         hashes = CalculatedHashes(
             hashes=hashes.hashes + (secondary_hashes and secondary_hashes.hashes or []),
@@ -385,7 +391,7 @@ class EventManager:
         )
 
         if not do_background_grouping_before:
-            _run_background_grouping(project, job)
+            _run_background_grouping(project, job, cache=grouping_cache)
 
         if hashes.tree_labels:
             job["finest_tree_label"] = hashes.finest_tree_label
@@ -537,11 +543,11 @@ class EventManager:
 
 
 @metrics.wraps("event_manager.background_grouping")
-def _calculate_background_grouping(project, event, config):
-    return _calculate_event_grouping(project, event, config)
+def _calculate_background_grouping(project, event, config, cache=None):
+    return _calculate_event_grouping(project, event, config, cache=cache)
 
 
-def _run_background_grouping(project, job):
+def _run_background_grouping(project, job, cache=None):
     """Optionally run a fraction of events with a third grouping config
     This can be helpful to measure its performance impact.
     This does not affect actual grouping.
@@ -552,7 +558,7 @@ def _run_background_grouping(project, job):
             config = BackgroundGroupingConfigLoader().get_config_dict(project)
             if config["id"]:
                 copied_event = copy.deepcopy(job["event"])
-                _calculate_background_grouping(project, copied_event, config)
+                _calculate_background_grouping(project, copied_event, config, cache=cache)
     except Exception:
         sentry_sdk.capture_exception()
 
@@ -970,12 +976,12 @@ def get_culprit(data):
     )
 
 
-def _save_aggregate(event, hashes, release, metadata, received_timestamp, **kwargs):
+def _save_aggregate(event, hashes, release, metadata, received_timestamp, use_cache=True, **kwargs):
     project = event.project
 
-    flat_grouphashes = [
-        GroupHash.objects.get_or_create(project=project, hash=hash)[0] for hash in hashes.hashes
-    ]
+    flat_grouphashes = GroupHash.objects.get_or_create_many(
+        project, hashes.hashes, use_cache=use_cache
+    )
 
     # The root_hierarchical_hash is the least specific hash within the tree, so
     # typically hierarchical_hashes[0], unless a hash `n` has been split in
@@ -984,7 +990,7 @@ def _save_aggregate(event, hashes, release, metadata, received_timestamp, **kwar
     # when groups are created and also relieves contention by locking a more
     # specific hash than `hierarchical_hashes[0]`.
     existing_grouphash, root_hierarchical_hash = _find_existing_grouphash(
-        project, flat_grouphashes, hashes.hierarchical_hashes
+        project, flat_grouphashes, hashes.hierarchical_hashes, use_cache=use_cache
     )
 
     if root_hierarchical_hash is not None:
@@ -1043,7 +1049,7 @@ def _save_aggregate(event, hashes, release, metadata, received_timestamp, **kwar
             flat_grouphashes = [gh for gh in all_hashes if gh.hash in hashes.hashes]
 
             existing_grouphash, root_hierarchical_hash = _find_existing_grouphash(
-                project, flat_grouphashes, hashes.hierarchical_hashes
+                project, flat_grouphashes, hashes.hierarchical_hashes, use_cache=False
             )
 
             if root_hierarchical_hash is not None:
@@ -1104,7 +1110,19 @@ def _save_aggregate(event, hashes, release, metadata, received_timestamp, **kwar
 
                 return group, is_new, is_regression
 
-    group = Group.objects.get(id=existing_grouphash.group_id)
+    try:
+        group = Group.objects.get(id=existing_grouphash.group_id)
+    except Group.DoesNotExist:
+        if not use_cache:
+            raise
+        # The grouphash was served from the cache, but its group has been
+        # deleted since (bulk deletions do not invalidate the cache). Start
+        # over with grouphashes read from the database.
+        metrics.incr("grouphash_cache.stale_group", skip_internal=True)
+        GroupHash.objects.invalidate_cache(project.id)
+        return _save_aggregate(
+            event, hashes, release, metadata, received_timestamp, use_cache=False, **kwargs
+        )
 
     is_new = False
 
@@ -1153,6 +1171,7 @@ def _find_existing_grouphash(
     project,
     flat_grouphashes,
     hierarchical_hashes,
+    use_cache=True,
 ):
     all_grouphashes = []
     root_hierarchical_hash = None
@@ -1160,10 +1179,9 @@ def _find_existing_grouphash(
     found_split = False
 
     if hierarchical_hashes:
-        hierarchical_grouphashes = {
-            h.hash: h
-            for h in GroupHash.objects.filter(project=project, hash__in=hierarchical_hashes)
-        }
+        hierarchical_grouphashes = GroupHash.objects.get_many_for_project(
+            project.id, hierarchical_hashes, use_cache=use_cache
+        )
 
         for hash in reversed(hierarchical_hashes):
             group_hash = hierarchical_grouphashes.get(hash)
@@ -1538,7 +1556,7 @@ def save_attachment(
         timestamp = datetime.utcnow().replace(tzinfo=UTC)
 
     try:
-        data = attachment.data
+        fileobj = attachment.open()
     except MissingAttachmentChunks:
         track_outcome(
             org_id=project.organization_id,
@@ -1554,12 +1572,13 @@ def save_attachment(
         logger.exception("Missing chunks for cache_key=%s", cache_key)
         return
 
-    file = File.objects.create(
-        name=attachment.name,
-        type=attachment.type,
-        headers={"Content-Type": attachment.content_type},
-    )
-    file.putfile(BytesIO(data), blob_size=settings.SENTRY_ATTACHMENT_BLOB_SIZE)
+    with fileobj:
+        file = File.objects.create(
+            name=attachment.name,
+            type=attachment.type,
+            headers={"Content-Type": attachment.content_type},
+        )
+        file.putfile(fileobj, blob_size=settings.SENTRY_ATTACHMENT_BLOB_SIZE)
 
     EventAttachment.objects.create(
         event_id=event_id,
@@ -1627,10 +1646,13 @@ def _materialize_event_metrics(jobs):
 
 
 @metrics.wraps("save_event.calculate_event_grouping")
-def _calculate_event_grouping(project, event, grouping_config) -> CalculatedHashes:
+def _calculate_event_grouping(project, event, grouping_config, cache=None) -> CalculatedHashes:
     """
     Main entrypoint for modifying/enhancing and grouping an event, writes
     hashes back into event payload.
+
+    `cache` can be shared between the grouping configs run for one event so
+    that grouping components are not recalculated for every config.
     """
 
     with metrics.timer("event_manager.normalize_stacktraces_for_grouping"):
@@ -1657,10 +1679,10 @@ def _calculate_event_grouping(project, event, grouping_config) -> CalculatedHash
         # event.  If that config has since been deleted (because it was an
         # experimental grouping config) we fall back to the default.
         try:
-            hashes = event.get_hashes(grouping_config)
+            hashes = event.get_hashes(grouping_config, cache=cache)
         except GroupingConfigNotFound:
             event.data["grouping_config"] = get_grouping_config_dict_for_project(project)
-            hashes = event.get_hashes()
+            hashes = event.get_hashes(cache=cache)
 
     hashes.write_to_event(event.data)
     return hashes
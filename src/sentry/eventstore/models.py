@@ -326,7 +326,7 @@ class Event:
 
         return get_grouping_config_dict_for_event_data(self.data, self.project)
 
-    def get_hashes(self, force_config=None) -> CalculatedHashes:
+    def get_hashes(self, force_config=None, cache=None) -> CalculatedHashes:
         """
         Returns _all_ information that is necessary to group an event into
         issues. It returns two lists of hashes, `(flat_hashes,
@@ -365,7 +365,9 @@ class Event:
                 return rv
 
         # Create fresh hashes
-        flat_variants, hierarchical_variants = self.get_sorted_grouping_variants(force_config)
+        flat_variants, hierarchical_variants = self.get_sorted_grouping_variants(
+            force_config, cache=cache
+        )
         flat_hashes, _ = self._hashes_from_sorted_grouping_variants(flat_variants)
         hierarchical_hashes, tree_labels = self._hashes_from_sorted_grouping_variants(
             hierarchical_variants
@@ -375,11 +377,11 @@ class Event:
             hashes=flat_hashes, hierarchical_hashes=hierarchical_hashes, tree_labels=tree_labels
         )
 
-    def get_sorted_grouping_variants(self, force_config=None):
+    def get_sorted_grouping_variants(self, force_config=None, cache=None):
         """Get grouping variants sorted into flat and hierarchical variants"""
         from sentry.grouping.api import sort_grouping_variants
 
-        variants = self.get_grouping_variants(force_config)
+        variants = self.get_grouping_variants(force_config, cache=cache)
         return sort_grouping_variants(variants)
 
     @staticmethod
@@ -418,7 +420,7 @@ class Event:
         # We have modified event data, so any cached interfaces have to be reset:
         self.__dict__.pop("interfaces", None)
 
-    def get_grouping_variants(self, force_config=None, normalize_stacktraces=False):
+    def get_grouping_variants(self, force_config=None, normalize_stacktraces=False, cache=None):
         """
         This is similar to `get_hashes` but will instead return the
         grouping components for each variant in a dictionary.
@@ -458,7 +460,7 @@ class Event:
             span.set_tag("project", self.project_id)
             span.set_tag("event_id", self.event_id)
 
-            return get_grouping_variants_for_event(self, config)
+            return get_grouping_variants_for_event(self, config, cache=cache)
 
     def get_primary_hash(self):
         hashes = self.get_hashes()
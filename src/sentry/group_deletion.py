@@ -27,6 +27,7 @@ def delete_group(group):
     GroupHash.objects.filter(project_id=group.project_id, group__id=group.id).exclude(
         state=GroupHash.State.SPLIT
     ).delete()
+    GroupHash.objects.invalidate_cache(group.project_id)
     # We remove `GroupInbox` rows here so that they don't end up influencing queries for
     # `Group` instances that are pending deletion
     GroupInbox.objects.filter(project_id=group.project.id, group__id=group.id).delete()
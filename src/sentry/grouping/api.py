@@ -19,9 +19,15 @@ from sentry.grouping.variants import (
     FallbackVariant,
     SaltedComponentVariant,
 )
+from sentry.utils.cache import BoundedCache
 
 HASH_RE = re.compile(r"^[0-9a-f]{32}$")
 
+# Process-local cache of compiled fingerprinting rules.  Entries are keyed by
+# the hash of the rules, so changed rules never hit an outdated entry.
+FINGERPRINTING_RULES_CACHE_SIZE = 200
+_fingerprinting_rules_cache = BoundedCache(max_size=FINGERPRINTING_RULES_CACHE_SIZE)
+
 
 class GroupingConfigNotFound(LookupError):
     pass
@@ -162,15 +168,21 @@ def get_fingerprinting_config_for_project(project):
     from sentry.utils.hashlib import md5_text
 
     cache_key = "fingerprinting-rules:" + md5_text(rules).hexdigest()
+    rv = _fingerprinting_rules_cache.get(cache_key)
+    if rv is not None:
+        return rv
+
     rv = cache.get(cache_key)
     if rv is not None:
-        return FingerprintingRules.from_json(rv)
+        rv = FingerprintingRules.from_json(rv)
+    else:
+        try:
+            rv = FingerprintingRules.from_config_string(rules)
+        except InvalidFingerprintingConfig:
+            rv = FingerprintingRules([])
+        cache.set(cache_key, rv.to_json())
 
-    try:
-        rv = FingerprintingRules.from_config_string(rules)
-    except InvalidFingerprintingConfig:
-        rv = FingerprintingRules([])
-    cache.set(cache_key, rv.to_json())
+    _fingerprinting_rules_cache.set(cache_key, rv)
     return rv
 
 
@@ -229,8 +241,12 @@ def _get_calculated_grouping_variants_for_event(event, context):
     return rv
 
 
-def get_grouping_variants_for_event(event, config=None):
-    """Returns a dict of all grouping variants for this event."""
+def get_grouping_variants_for_event(event, config=None, cache=None):
+    """Returns a dict of all grouping variants for this event.
+
+    Passing the same `cache` dictionary for multiple grouping configs of one
+    event lets them share the components of cacheable strategies.
+    """
     # If a checksum is set the only variant that comes back from this
     # event is the checksum variant.
     checksum = event.data.get("checksum")
@@ -259,7 +275,7 @@ def get_grouping_variants_for_event(event, config=None):
 
     if config is None:
         config = load_default_grouping_config()
-    context = GroupingContext(config)
+    context = GroupingContext(config, cache=cache)
 
     # At this point we need to calculate the default event values.  If the
     # fingerprint is salted we will wrap it.
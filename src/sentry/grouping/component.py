@@ -1,4 +1,6 @@
-from sentry.grouping.utils import hash_from_values
+from hashlib import md5
+
+from django.utils.encoding import force_bytes
 
 DEFAULT_HINTS = {"salt": "a static salt"}
 
@@ -33,8 +35,25 @@ def calculate_tree_label(values):
 class GroupingComponent:
     """A grouping component is a recursive structure that is flattened
     into components to make a hash for grouping purposes.
+
+    Hints only matter when the component tree is rendered for the user, so
+    they can be given as a callable that is invoked on first access.
     """
 
+    __slots__ = (
+        "id",
+        "_hint",
+        "contributes",
+        "contributes_to_similarity",
+        "variant_provider",
+        "values",
+        "tree_label",
+        "is_prefix_frame",
+        "is_sentinel_frame",
+        "similarity_encoder",
+        "similarity_self_encoder",
+    )
+
     def __init__(
         self,
         id,
@@ -52,7 +71,7 @@ class GroupingComponent:
         self.id = id
 
         # Default values
-        self.hint = DEFAULT_HINTS.get(id)
+        self._hint = DEFAULT_HINTS.get(id)
         self.contributes = None
         self.contributes_to_similarity = None
         self.variant_provider = variant_provider
@@ -78,6 +97,12 @@ class GroupingComponent:
     def name(self):
         return KNOWN_MAJOR_COMPONENT_NAMES.get(self.id)
 
+    @property
+    def hint(self):
+        if callable(self._hint):
+            self._hint = self._hint()
+        return self._hint
+
     @property
     def description(self):
         items = []
@@ -127,7 +152,7 @@ class GroupingComponent:
     ):
         """Updates an already existing component with new values."""
         if hint is not None:
-            self.hint = hint
+            self._hint = hint
         if values is not None:
             if contributes is None:
                 contributes = _calculate_contributes(values)
@@ -147,13 +172,27 @@ class GroupingComponent:
         if is_sentinel_frame is not None:
             self.is_sentinel_frame = is_sentinel_frame
 
+    def _copy(self):
+        rv = object.__new__(self.__class__)
+        for attr in self.__slots__:
+            setattr(rv, attr, getattr(self, attr))
+        return rv
+
     def shallow_copy(self):
         """Creates a shallow copy."""
-        rv = object.__new__(self.__class__)
-        rv.__dict__.update(self.__dict__)
+        rv = self._copy()
         rv.values = list(self.values)
         return rv
 
+    def deep_copy(self):
+        """Creates a copy of the entire component tree."""
+        rv = self._copy()
+        rv.values = [
+            value.deep_copy() if isinstance(value, GroupingComponent) else value
+            for value in self.values
+        ]
+        return rv
+
     def iter_values(self):
         """Recursively walks the component and flattens it into a list of
         values.
@@ -167,8 +206,24 @@ class GroupingComponent:
 
     def get_hash(self):
         """Returns the hash of the values if it contributes."""
-        if self.contributes:
-            return hash_from_values(self.iter_values())
+        if not self.contributes:
+            return None
+
+        # Same as hashing `iter_values` but walks the tree with an explicit
+        # stack instead of a chain of nested generators.
+        result = md5()
+        stack = [iter(self.values)]
+        while stack:
+            for value in stack[-1]:
+                if isinstance(value, GroupingComponent):
+                    if value.contributes:
+                        stack.append(iter(value.values))
+                        break
+                else:
+                    result.update(force_bytes(value, errors="replace"))
+            else:
+                stack.pop()
+        return result.hexdigest()
 
     def encode_for_similarity(self):
         if not self.contributes_to_similarity:
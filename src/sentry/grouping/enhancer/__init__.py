@@ -1,6 +1,7 @@
 import base64
 import os
 import zlib
+from functools import partial
 
 import msgpack
 from parsimonious.exceptions import ParseError
@@ -8,6 +9,9 @@ from parsimonious.grammar import Grammar, NodeVisitor
 
 from sentry import projectoptions
 from sentry.grouping.component import GroupingComponent
+from sentry.utils import metrics
+from sentry.utils.cache import BoundedCache
+from sentry.utils.hashlib import md5_text
 from sentry.utils.strings import unescape_string
 
 from .actions import Action, FlagAction, VarAction
@@ -16,6 +20,7 @@ from .matchers import (
     CalleeMatch,
     CallerMatch,
     ExceptionFieldMatch,
+    FamilyMatch,
     FrameMatch,
     Match,
     create_match_frame,
@@ -70,6 +75,19 @@ _        = space*
 VERSIONS = [1, 2]
 LATEST_VERSION = VERSIONS[-1]
 
+# Process-local cache of which frame-local rules match a frame, shared across
+# events.  Keyed by the hash of the enhancements config, the rule kind, the
+# platform and the values of the match frame, so a changed config never hits
+# entries of the previous one.
+FRAME_RULES_CACHE_SIZE = 20000
+_frame_rules_cache = BoundedCache(max_size=FRAME_RULES_CACHE_SIZE)
+
+# Process-local cache of which rules can match a stack trace with frames of the
+# given families.  Keyed by the hash of the enhancements config, because
+# `Enhancements.loads` creates a new instance for every event.
+CANDIDATE_RULES_CACHE_SIZE = 1000
+_candidate_rules_cache = BoundedCache(max_size=CANDIDATE_RULES_CACHE_SIZE)
+
 
 class StacktraceState:
     def __init__(self):
@@ -115,35 +133,137 @@ class Enhancements:
 
         self._modifier_rules = [rule for rule in self.iter_rules() if rule.is_modifier]
         self._updater_rules = [rule for rule in self.iter_rules() if rule.is_updater]
+        self._config_hash = None
 
-    def apply_modifications_to_frame(self, frames, platform, exception_data):
-        """This applies the frame modifications to the frames itself.  This
-        does not affect grouping.
+    @property
+    def config_hash(self):
+        """A hash identifying the rules of this config, including its bases."""
+        if self._config_hash is None:
+            self._config_hash = md5_text(self.dumps()).hexdigest()
+        return self._config_hash
+
+    def _get_candidate_rules(self, rules, match_frames):
+        """Returns the rules that can match any of the given frames as pairs of
+        position in `rules` and rule, in their original order.  Most rules of
+        the built-in bases are restricted to a frame family, so they are
+        skipped entirely for stack traces of other families.
         """
+        families = frozenset(frame["family"] for frame in match_frames)
+        cache_key = (self.config_hash, rules is self._modifier_rules, families)
+        positions = _candidate_rules_cache.get(cache_key)
+        if positions is None:
+            positions = tuple(
+                pos
+                for pos, rule in enumerate(rules)
+                if rule.families is None or not rule.families.isdisjoint(families)
+            )
+            _candidate_rules_cache.set(cache_key, positions)
+        return [(pos, rules[pos]) for pos in positions]
 
+    def _get_frame_local_rules(self, rules, match_frame, platform, cache):
+        """Returns the positions of all frame-local rules in `rules` that match
+        the given match frame.  The result only depends on the values of the
+        match frame, so it is shared across events.
+        """
+        cache_key = (
+            self.config_hash,
+            rules is self._modifier_rules,
+            platform,
+            tuple(match_frame.values()),
+        )
+        rv = _frame_rules_cache.get(cache_key)
+        if rv is None:
+            rv = tuple(
+                pos
+                for pos, rule in enumerate(rules)
+                if rule.is_frame_local and rule.matches_frame(match_frame, platform, cache)
+            )
+            _frame_rules_cache.set(cache_key, rv)
+            return rv, False
+        return rv, True
+
+    def _iter_matching_frame_actions(
+        self, rules, match_frames, platform, exception_data, modifies_frames=False
+    ):
+        """Yields every rule that matches any frame together with its list of
+        `(idx, action)` pairs, in the order of `rules`.  The caller must apply
+        the actions before advancing the iterator.  If the actions modify the
+        match frames, the matches of later rules are based on the modified
+        frames, just like when evaluating the rules one after another.
+        """
         cache = {}
+        hits = misses = 0
+        frame_states = [None] * len(match_frames)
+        frames_by_rule = {}
+
+        def update_frame_local_matches():
+            nonlocal hits, misses
+            for idx, match_frame in enumerate(match_frames):
+                state = tuple(match_frame.values())
+                if frame_states[idx] == state:
+                    continue
+                if frame_states[idx] is not None:
+                    for frame_indexes in frames_by_rule.values():
+                        if idx in frame_indexes:
+                            frame_indexes.remove(idx)
+                frame_states[idx] = state
+
+                positions, hit = self._get_frame_local_rules(rules, match_frame, platform, cache)
+                if hit:
+                    hits += 1
+                else:
+                    misses += 1
+                for pos in positions:
+                    frame_indexes = frames_by_rule.setdefault(pos, [])
+                    frame_indexes.append(idx)
+                    frame_indexes.sort()
+
+        update_frame_local_matches()
+
+        for pos, rule in self._get_candidate_rules(rules, match_frames):
+            if rule.is_frame_local:
+                actions = [
+                    (idx, action) for idx in frames_by_rule.get(pos, ()) for action in rule.actions
+                ]
+            else:
+                actions = rule.get_matching_frame_actions(
+                    match_frames, platform, exception_data, cache
+                )
 
-        match_frames = [create_match_frame(frame, platform) for frame in frames]
+            if actions:
+                yield rule, actions
+                if modifies_frames:
+                    update_frame_local_matches()
 
-        for rule in self._modifier_rules:
-            for idx, action in rule.get_matching_frame_actions(
-                match_frames, platform, exception_data, cache
-            ):
+        metrics.incr("grouping.enhancer.frame_cache.hit", amount=hits, skip_internal=True)
+        metrics.incr("grouping.enhancer.frame_cache.miss", amount=misses, skip_internal=True)
+
+    def apply_modifications_to_frame(self, frames, platform, exception_data, match_frames=None):
+        """This applies the frame modifications to the frames itself.  This
+        does not affect grouping.
+
+        `match_frames` can be passed if the caller already created them.
+        """
+
+        if match_frames is None:
+            match_frames = [create_match_frame(frame, platform) for frame in frames]
+
+        for rule, actions in self._iter_matching_frame_actions(
+            self._modifier_rules, match_frames, platform, exception_data, modifies_frames=True
+        ):
+            for idx, action in actions:
                 action.apply_modifications_to_frame(frames, match_frames, idx, rule=rule)
 
     def update_frame_components_contributions(self, components, frames, platform, exception_data):
 
-        cache = {}
-
         match_frames = [create_match_frame(frame, platform) for frame in frames]
 
         stacktrace_state = StacktraceState()
         # Apply direct frame actions and update the stack state alongside
-        for rule in self._updater_rules:
-
-            for idx, action in rule.get_matching_frame_actions(
-                match_frames, platform, exception_data, cache
-            ):
+        for rule, actions in self._iter_matching_frame_actions(
+            self._updater_rules, match_frames, platform, exception_data
+        ):
+            for idx, action in actions:
                 action.update_frame_components_contributions(components, frames, idx, rule=rule)
                 action.modify_stacktrace_state(stacktrace_state, rule)
 
@@ -153,6 +273,12 @@ class Enhancements:
         max_frames = stacktrace_state.get("max-frames")
 
         if max_frames > 0:
+            max_frames_hint = partial(
+                stacktrace_state.add_to_hint,
+                "ignored because only %d %s considered"
+                % (max_frames, "frames are" if max_frames != 1 else "frame is"),
+                var="max-frames",
+            )
             ignored = 0
             for component in reversed(components):
                 if not component.contributes:
@@ -160,12 +286,7 @@ class Enhancements:
                 ignored += 1
                 if ignored <= max_frames:
                     continue
-                hint = "ignored because only %d %s considered" % (
-                    max_frames,
-                    "frames are" if max_frames != 1 else "frame is",
-                )
-                hint = stacktrace_state.add_to_hint(hint, var="max-frames")
-                component.update(hint=hint, contributes=False)
+                component.update(hint=max_frames_hint, contributes=False)
 
         return stacktrace_state
 
@@ -253,11 +374,13 @@ class Enhancements:
             data = data.encode("ascii", "ignore")
         padded = data + b"=" * (4 - (len(data) % 4))
         try:
-            return cls._from_config_structure(
+            rv = cls._from_config_structure(
                 msgpack.loads(zlib.decompress(base64.urlsafe_b64decode(padded)), raw=False)
             )
         except (LookupError, AttributeError, TypeError, ValueError) as e:
             raise ValueError("invalid stack trace rule config: %s" % e)
+        rv._config_hash = md5_text(data).hexdigest()
+        return rv
 
     @classmethod
     def from_config_string(self, s, bases=None, id=None):
@@ -285,16 +408,52 @@ class Rule:
             else:
                 self._other_matchers.append(matcher)
 
+        # Matchers are pure, so they can be evaluated in any order.  The
+        # cheap ones go first to reject frames before glob matching.
+        self._other_matchers.sort(key=lambda matcher: matcher.cost)
+
+        # The frame families this rule is restricted to, or `None` if it can
+        # match frames of any family.
+        self._families = None
+        for matcher in self._other_matchers:
+            if isinstance(matcher, FamilyMatch) and not matcher.negated:
+                if b"all" in matcher._flags:
+                    continue
+                if self._families is None:
+                    self._families = frozenset(matcher._flags)
+                else:
+                    self._families &= matcher._flags
+
         self.actions = actions
         self._is_updater = any(action.is_updater for action in actions)
         self._is_modifier = any(action.is_modifier for action in actions)
+        self._matcher_description = None
+
+        # Whether the rule only looks at the frame it is matched against, in
+        # which case its result can be memoized per frame.
+        self._is_frame_local = bool(self._other_matchers) and not (
+            self._exception_matchers
+            or any(isinstance(m, (CallerMatch, CalleeMatch)) for m in self._other_matchers)
+        )
 
     @property
     def matcher_description(self):
-        rv = " ".join(x.description for x in self.matchers)
-        for action in self.actions:
-            rv = f"{rv} {action}"
-        return rv
+        if self._matcher_description is None:
+            rv = " ".join(x.description for x in self.matchers)
+            for action in self.actions:
+                rv = f"{rv} {action}"
+            self._matcher_description = rv
+        return self._matcher_description
+
+    @property
+    def families(self):
+        """The frame families this rule can match, `None` for all families."""
+        return self._families
+
+    @property
+    def is_frame_local(self):
+        """Does this rule only depend on the frame it is matched against?"""
+        return self._is_frame_local
 
     @property
     def is_modifier(self):
@@ -312,6 +471,14 @@ class Rule:
             matchers[matcher.key] = matcher.pattern
         return {"match": matchers, "actions": [str(x) for x in self.actions]}
 
+    def matches_frame(self, match_frame, platform, cache=None):
+        """Checks a frame-local rule against a single match frame."""
+        families = self._families
+        if families is not None and match_frame["family"] not in families:
+            return False
+        frames = [match_frame]
+        return all(m.matches_frame(frames, 0, platform, None, cache) for m in self._other_matchers)
+
     def get_matching_frame_actions(self, frames, platform, exception_data=None, cache=None):
         """Given a frame returns all the matching actions based on this rule.
         If the rule does not match `None` is returned.
@@ -327,7 +494,10 @@ class Rule:
         rv = []
 
         # 2 - Check if frame matchers match
+        families = self._families
         for idx, frame in enumerate(frames):
+            if families is not None and frame["family"] not in families:
+                continue
             if all(
                 m.matches_frame(frames, idx, platform, exception_data, cache)
                 for m in self._other_matchers
@@ -1,3 +1,5 @@
+from functools import partial
+
 from sentry.grouping.utils import get_rule_bool
 from sentry.stacktraces.functions import set_in_app
 from sentry.utils.compat import zip
@@ -23,6 +25,13 @@ ACTION_FLAGS = {
 REVERSE_ACTION_FLAGS = {v: k for k, v in ACTION_FLAGS.items()}
 
 
+def _format_rule_hint(template, rule):
+    rule_hint = "stack trace rule"
+    if rule:
+        rule_hint = f"{rule_hint} ({rule.matcher_description})"
+    return template % rule_hint
+
+
 class Action:
 
     is_modifier = False
@@ -103,35 +112,35 @@ class FlagAction(Action):
                 set_in_app(frame, self.flag)
                 match_frame["in_app"] = frame["in_app"]
 
+    def _get_hint(self, rule):
+        if self.key == "group":
+            template = "%s by %%s" % (self.flag and "un-ignored" or "ignored")
+        elif self.key == "app":
+            template = "marked %s by %%s" % (self.flag and "in-app" or "out of app")
+        else:
+            template = f"marked as {self.key} frame by %s"
+        # Hints are only needed when the grouping info is rendered, so the
+        # rule description is not formatted until then.
+        return partial(_format_rule_hint, template, rule)
+
     def update_frame_components_contributions(self, components, frames, idx, rule=None):
-        rule_hint = "stack trace rule"
-        if rule:
-            rule_hint = f"{rule_hint} ({rule.matcher_description})"
+        hint = self._get_hint(rule)
 
         sliced_components = self._slice_to_range(components, idx)
         sliced_frames = self._slice_to_range(frames, idx)
         for component, frame in zip(sliced_components, sliced_frames):
             if self.key == "group" and self.flag != component.contributes:
-                component.update(
-                    contributes=self.flag,
-                    hint="{} by {}".format(self.flag and "un-ignored" or "ignored", rule_hint),
-                )
+                component.update(contributes=self.flag, hint=hint)
             # The in app flag was set by `apply_modifications_to_frame`
             # but we want to add a hint if there is none yet.
             elif self.key == "app" and self._in_app_changed(frame, component):
-                component.update(
-                    hint="marked {} by {}".format(self.flag and "in-app" or "out of app", rule_hint)
-                )
+                component.update(hint=hint)
 
             elif self.key == "prefix":
-                component.update(
-                    is_prefix_frame=True, hint=f"marked as prefix frame by {rule_hint}"
-                )
+                component.update(is_prefix_frame=True, hint=hint)
 
             elif self.key == "sentinel":
-                component.update(
-                    is_sentinel_frame=True, hint=f"marked as sentinel frame by {rule_hint}"
-                )
+                component.update(is_sentinel_frame=True, hint=hint)
 
 
 class VarAction(Action):
@@ -4,7 +4,7 @@ from sentry.grouping.utils import get_rule_bool
 from sentry.stacktraces.functions import get_function_name_for_frame
 from sentry.stacktraces.platform import get_behavior_family_for_platform
 from sentry.utils.functional import cached
-from sentry.utils.glob import glob_match
+from sentry.utils.glob import glob_match, is_literal_pattern
 from sentry.utils.safe import get_path
 
 from .exceptions import InvalidEnhancerConfig
@@ -57,12 +57,23 @@ def _get_function_name(frame_data: dict, platform: Optional[str]):
     return function_name or "<unknown>"
 
 
-def create_match_frame(frame_data: dict, platform: Optional[str]) -> dict:
-    """Create flat dict of values relevant to matchers"""
+def create_match_frame(
+    frame_data: dict, platform: Optional[str], function: Optional[str] = None
+) -> dict:
+    """Create flat dict of values relevant to matchers
+
+    `function` is the trimmed function name of the frame, if the caller has
+    already computed it.
+    """
+    if function is None:
+        function = _get_function_name(frame_data, platform)
+    else:
+        function = function or "<unknown>"
+
     match_frame = dict(
         category=get_path(frame_data, "data", "category"),
         family=get_behavior_family_for_platform(frame_data.get("platform") or platform),
-        function=_get_function_name(frame_data, platform),
+        function=function,
         in_app=frame_data.get("in_app"),
         module=get_path(frame_data, "module"),
         package=frame_data.get("package"),
@@ -84,6 +95,10 @@ def create_match_frame(frame_data: dict, platform: Optional[str]) -> dict:
 class Match:
     description = None
 
+    # Relative cost of evaluating the matcher.  Rules evaluate their cheapest
+    # matchers first to bail out of non-matching frames early.
+    cost = 3
+
     def matches_frame(self, frames, idx, platform, exception_data, cache):
         raise NotImplementedError()
 
@@ -117,6 +132,8 @@ class FrameMatch(Match):
     # Global registry of matchers
     instances = {}
 
+    cost = 2
+
     @classmethod
     def from_key(cls, key, pattern, negated):
 
@@ -219,6 +236,8 @@ class PathMatch(PathLikeMatch):
 
 
 class FamilyMatch(FrameMatch):
+    cost = 0
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._flags = set(self._encoded_pattern.split(b","))
@@ -231,6 +250,8 @@ class FamilyMatch(FrameMatch):
 
 
 class InAppMatch(FrameMatch):
+    cost = 0
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._ref_val = get_rule_bool(self.pattern)
@@ -241,17 +262,34 @@ class InAppMatch(FrameMatch):
 
 
 class FunctionMatch(FrameMatch):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._is_literal = is_literal_pattern(self.pattern)
+        if self._is_literal:
+            self.cost = 1
+
     def _positive_frame_match(self, match_frame, platform, exception_data, cache):
+        if self._is_literal:
+            return match_frame["function"] == self._encoded_pattern
 
         return cached(cache, glob_match, match_frame["function"], self._encoded_pattern)
 
 
 class FrameFieldMatch(FrameMatch):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._is_literal = is_literal_pattern(self.pattern)
+        if self._is_literal:
+            self.cost = 1
+
     def _positive_frame_match(self, match_frame, platform, exception_data, cache):
         field = match_frame[self.field]
         if field is None:
             return False
 
+        if self._is_literal:
+            return field == self._encoded_pattern
+
         return cached(cache, glob_match, field, self._encoded_pattern)
 
 
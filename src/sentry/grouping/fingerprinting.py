@@ -5,7 +5,7 @@ from parsimonious.grammar import Grammar, NodeVisitor
 
 from sentry.grouping.utils import get_rule_bool
 from sentry.stacktraces.platform import get_behavior_family_for_platform
-from sentry.utils.glob import glob_match
+from sentry.utils.glob import glob_match, is_literal_pattern
 from sentry.utils.safe import get_path
 from sentry.utils.strings import unescape_string
 
@@ -240,6 +240,16 @@ MATCHERS = {
 }
 
 
+# Match groups in the order rules test them.  A rule only applies if all of
+# its match groups match, so the groups with few values are tested before the
+# frames of the event.
+MATCH_GROUPS = ("tags", "log_info", "toplevel", "exceptions", "frames")
+
+# Keys whose values are glob matched case sensitively and without path
+# normalization.  Literal patterns of these keys are compared directly.
+CASE_SENSITIVE_KEYS = frozenset(["type", "module", "function"])
+
+
 class Match:
     def __init__(self, key, pattern, negated=False):
         if key.startswith("tags."):
@@ -252,8 +262,16 @@ class Match:
         self.pattern = pattern
         self.negated = negated
 
-    @property
-    def match_group(self):
+        self.match_group = self._get_match_group()
+        if self.key == "family":
+            self._flags = frozenset(self.pattern.split(","))
+        elif self.key == "app":
+            self._ref_val = get_rule_bool(self.pattern)
+        self._is_literal = (
+            self.key in CASE_SENSITIVE_KEYS or self.key.startswith("tags.")
+        ) and is_literal_pattern(self.pattern)
+
+    def _get_match_group(self):
         if self.key == "message":
             return "toplevel"
         if self.key in ("logger", "level"):
@@ -308,13 +326,13 @@ class Match:
             if self._positive_path_match(value):
                 return True
         elif self.key == "family":
-            flags = self.pattern.split(",")
-            if "all" in flags or value in flags:
+            if "all" in self._flags or value in self._flags:
                 return True
         elif self.key == "app":
-            ref_val = get_rule_bool(self.pattern)
-            if ref_val is not None and ref_val == value:
+            if self._ref_val is not None and self._ref_val == value:
                 return True
+        elif self._is_literal:
+            return value == self.pattern
         elif glob_match(value, self.pattern, ignorecase=self.key in ("level", "value")):
             return True
         return False
@@ -350,12 +368,17 @@ class Rule:
         self.fingerprint = fingerprint
         self.attributes = attributes
 
-    def get_fingerprint_values_for_event_access(self, access):
         by_match_group = {}
-        for matcher in self.matchers:
+        for matcher in matchers:
             by_match_group.setdefault(matcher.match_group, []).append(matcher)
+        self._match_groups = [
+            (match_group, by_match_group[match_group])
+            for match_group in MATCH_GROUPS
+            if match_group in by_match_group
+        ]
 
-        for match_group, matchers in by_match_group.items():
+    def get_fingerprint_values_for_event_access(self, access):
+        for match_group, matchers in self._match_groups:
             for values in access.get_values(match_group):
                 if all(x.matches(values) for x in matchers):
                     break
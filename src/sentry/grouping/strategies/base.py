@@ -64,9 +64,17 @@ def strategy(
 
 
 class GroupingContext:
-    def __init__(self, strategy_config: "StrategyConfiguration"):
+    def __init__(
+        self,
+        strategy_config: "StrategyConfiguration",
+        cache: Optional[Dict[Any, GroupingComponent]] = None,
+    ):
         self._stack = [strategy_config.initial_context]
         self.config = strategy_config
+        # Components of strategies that declare a cache key.  The cache can be
+        # shared between the grouping configs that are run for the same event
+        # as the cache key covers all inputs of such a strategy.
+        self.cache = cache
         self.push()
         self["variant"] = None
 
@@ -104,15 +112,30 @@ class GroupingContext:
             raise RuntimeError(f"failed to dispatch interface {path} to strategy")
 
         kwargs["context"] = self
+        variant = self["variant"]
+
+        cache_key = None
+        if self.cache is not None and variant is not None:
+            cache_key = strategy.get_cache_key(interface, *args, **kwargs)
+            if cache_key is not None:
+                component = self.cache.get(cache_key)
+                if component is not None:
+                    # Callers are free to update the returned component, so
+                    # the cached one must never be handed out.
+                    return component.deep_copy()
+
         with sentry_sdk.start_span(
             op="sentry.grouping.GroupingContext.get_grouping_component", description=path
         ):
             rv = strategy(interface, *args, **kwargs)
         assert isinstance(rv, dict)
 
-        if self["variant"] is not None:
+        if variant is not None:
             assert len(rv) == 1
-            return rv[self["variant"]]
+            component = rv[variant]
+            if cache_key is not None and component is not None:
+                self.cache[cache_key] = component.deep_copy()
+            return component
 
         return rv
 
@@ -143,6 +166,7 @@ class Strategy:
         self.score = score
         self.func = func
         self.variant_processor_func: Optional[StrategyFunc] = None
+        self.cache_key_func: Optional[Callable[..., Any]] = None
 
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__} id={self.id!r}>"
@@ -164,6 +188,20 @@ class Strategy:
         self.variant_processor_func = func
         return func
 
+    def cache_key(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        """Registers a function that returns a hashable key covering all
+        inputs the strategy depends on, apart from the requested variant.
+        Components of such strategies are memoized in the grouping context
+        cache and reused across variants and grouping configs.
+        """
+        self.cache_key_func = func
+        return func
+
+    def get_cache_key(self, *args: Any, **kwargs: Any) -> Optional[Any]:
+        if self.cache_key_func is None:
+            return None
+        return (self.id, self._invoke(self.cache_key_func, *args, **kwargs))
+
     def get_grouping_component(
         self, event: Event, context: GroupingContext, variant: Optional[str] = None
     ) -> Optional[ReturnedVariants]:
@@ -48,6 +48,22 @@ RECURSION_COMPARISON_FIELDS = [
     "colno",
 ]
 
+# context values the frame strategy depends on.  Frame components are cached
+# per event by these values and the frame data, so this list must be kept in
+# sync with the context lookups of `frame` and its helpers.
+FRAME_CONTEXT_KEYS = (
+    "is_recursion",
+    "legacy_function_logic",
+    "javascript_fuzzing",
+    "contextline_platforms",
+    "php_detect_anonymous_classes",
+    "with_context_line_file_origin_bug",
+    "hierarchical_grouping",
+    "discard_native_filename",
+    "use_package_fallback",
+    "native_fuzzing",
+)
+
 # Ignore all those kinds of exception types as they are produced from platform
 # specific error codes.
 #
@@ -391,6 +407,23 @@ def frame(frame, event, context, **meta):
     return {context["variant"]: rv}
 
 
+@frame.cache_key
+def frame_cache_key(frame, event, context, **meta):
+    return (
+        frame.platform or event.platform,
+        frame.abs_path,
+        frame.filename,
+        frame.module,
+        frame.package,
+        frame.function,
+        frame.raw_function,
+        frame.context_line,
+        frame.data and frame.data.get("sourcemap") is not None,
+        tuple(frame.datapath or ()),
+        tuple(context[key] for key in FRAME_CONTEXT_KEYS),
+    )
+
+
 def get_contextline_component(frame, platform, function, context):
     """Returns a contextline component.  The caller's responsibility is to
     make sure context lines are only used for platforms where we trust the
@@ -1,11 +1,14 @@
 import functools
 import logging
 import random
+import signal
 import time
-from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from typing import (
     Any,
     Callable,
+    Collection,
+    List,
     Mapping,
     MutableMapping,
     MutableSequence,
@@ -29,7 +32,7 @@ from sentry.eventstore.processing import event_processing_store
 from sentry.ingest.types import ConsumerType
 from sentry.ingest.userreport import Conflict, save_userreport
 from sentry.killswitches import killswitch_matches_context
-from sentry.models import Project
+from sentry.models import Organization, Project, ProjectOption
 from sentry.signals import event_accepted
 from sentry.tasks.store import preprocess_event
 from sentry.utils import json, metrics
@@ -55,9 +58,116 @@ class AsyncResult(NamedTuple):  # TODO: Use Generic[T] with 3.7+
 
 Message = Any
 
+# Organization features checked while processing messages, which are loaded
+# once per batch.
+BATCH_ORGANIZATION_FEATURES = ("organizations:event-attachments",)
+
+
+def get_deduplication_key(project_id: int, event_id: str) -> str:
+    return f"ev:{project_id}:{event_id}"
+
+
+class IngestBatchContext:
+    """
+    Models and settings shared by all messages of a batch.
+
+    Everything in here is loaded once per batch with bulk cache lookups, so
+    that processing an individual message does not need to resolve its
+    project, organization, project options or feature flags again.
+    """
+
+    def __init__(
+        self,
+        projects: Mapping[int, Project],
+        organization_features: Optional[Mapping[Tuple[str, int], bool]] = None,
+        event_keys: Collection[str] = (),
+        processed_event_keys: Collection[str] = (),
+    ) -> None:
+        self.projects = projects
+        self._organization_features = dict(organization_features or {})
+        # Deduplication keys that have been looked up for the batch, and the
+        # subset of them that belong to already processed events.
+        self._event_keys = set(event_keys)
+        self._processed_event_keys = set(processed_event_keys)
+
+    @classmethod
+    def load(
+        cls, project_ids: Collection[int], event_keys: Collection[str] = ()
+    ) -> "IngestBatchContext":
+        with metrics.timer("ingest_consumer.fetch_projects"):
+            projects = {p.id: p for p in Project.objects.get_many_from_cache(project_ids)}
+
+        with metrics.timer("ingest_consumer.fetch_organizations"):
+            organization_ids = {p.organization_id for p in projects.values()}
+            organizations = {
+                o.id: o for o in Organization.objects.get_many_from_cache(organization_ids)
+            }
+            for project in projects.values():
+                try:
+                    project._organization_cache = organizations[project.organization_id]
+                except KeyError:
+                    continue
+
+        with metrics.timer("ingest_consumer.fetch_project_options"):
+            ProjectOption.objects.preload_all_values(projects.values())
+
+        with metrics.timer("ingest_consumer.fetch_features"):
+            organization_features = {
+                (name, organization.id): features.has(name, organization, actor=None)
+                for organization in organizations.values()
+                for name in BATCH_ORGANIZATION_FEATURES
+            }
+
+        with metrics.timer("ingest_consumer.fetch_processed_events"):
+            processed_event_keys = cache.get_many(event_keys) if event_keys else {}
+
+        return cls(
+            projects,
+            organization_features=organization_features,
+            event_keys=event_keys,
+            processed_event_keys=processed_event_keys,
+        )
+
+    def get_project(self, project_id: int) -> Optional[Project]:
+        return self.projects.get(project_id)
+
+    def has_feature(self, name: str, project: Project) -> bool:
+        key = (name, project.organization_id)
+        if key not in self._organization_features:
+            self._organization_features[key] = features.has(name, project.organization, actor=None)
+        return self._organization_features[key]
+
+    def is_event_processed(self, deduplication_key: str) -> bool:
+        if deduplication_key in self._processed_event_keys:
+            return True
+        if deduplication_key in self._event_keys:
+            return False
+        return cache.get(deduplication_key) is not None
+
+    def mark_event_processed(self, deduplication_key: str) -> None:
+        cache.set(deduplication_key, "", CACHE_TIMEOUT)
+        self._processed_event_keys.add(deduplication_key)
+
 
 class IngestConsumerWorker(AbstractBatchWorker):
-    def __init__(self, process_event_executor: Optional[ThreadPoolExecutor] = None) -> None:
+    """
+    Processes batches of ingest messages.
+
+    By default, all messages are decoded and processed in the consumer
+    process. If ``processes`` is given, the raw messages of a batch are handed
+    to a pool of worker processes instead, where they are decoded and
+    processed. All messages of a partition are routed to the same worker
+    process and processed in order there. A batch is only considered flushed
+    (and its offsets committed) once all worker processes have finished their
+    share of the batch. If a worker process dies, flushing the batch raises
+    ``BrokenProcessPool`` and the consumer crashes without committing.
+    """
+
+    def __init__(
+        self,
+        process_event_executor: Optional[ThreadPoolExecutor] = None,
+        processes: Optional[int] = None,
+    ) -> None:
         self.__process_event_executor = process_event_executor
         if self.__process_event_executor is None:
             self.__process_event = process_event
@@ -66,92 +176,168 @@ class IngestConsumerWorker(AbstractBatchWorker):
                 process_event_async, self.__process_event_executor
             )
 
+        # The worker processes are forked right away by initializing them.
+        # This must happen before the Kafka consumer is created, as
+        # librdkafka does not survive a fork.
+        self.__process_pools: Optional[List[ProcessPoolExecutor]] = None
+        # (topic, partition) -> index of the pool processing its messages
+        self.__pool_assignments: MutableMapping[Tuple[str, int], int] = {}
+        if processes:
+            self.__process_pools = [ProcessPoolExecutor(1) for _ in range(processes)]
+            for future in [
+                pool.submit(_initialize_worker_process) for pool in self.__process_pools
+            ]:
+                future.result()
+
     def process_message(self, message) -> Message:
+        if self.__process_pools is not None:
+            # Decoding is deferred to the worker process.
+            return (message.topic(), message.partition()), message.value()
+
         message = msgpack.unpackb(message.value(), use_list=False)
         return message
 
     def flush_batch(self, batch):
         mark_scope_as_unsafe()
         with metrics.timer("ingest_consumer.flush_batch"):
+            if self.__process_pools is not None:
+                return self._flush_batch_multiprocess(batch)
             return self._flush_batch(batch)
 
-    def _flush_batch(self, batch: Sequence[Message]):
-        attachment_chunks = []
-
-        # Processing functions may be either synchronous or asynchronous.
-        # Functions that return an ``AsyncResult`` may perform a combination of
-        # synchronous and asynchronous work, and need to be explicitly waited on
-        # to ensure they have completed and callbacks have been invoked before
-        # returning. Functions that return anything else are assumed to have
-        # completed successfully after they have returned.
-        other_messages: MutableSequence[
-            Tuple[
-                Callable[
-                    [Message, Mapping[int, Project]],
-                    Union[Any, AsyncResult],
-                ],
-                Message,
-            ]
-        ] = []
-
-        projects_to_fetch = set()
-
-        with metrics.timer("ingest_consumer.prepare_messages"):
-            for message in batch:
-                message_type = message["type"]
-                projects_to_fetch.add(message["project_id"])
-
-                if message_type == "event":
-                    other_messages.append((self.__process_event, message))
-                elif message_type == "attachment_chunk":
-                    attachment_chunks.append(message)
-                elif message_type == "attachment":
-                    other_messages.append((process_individual_attachment, message))
-                elif message_type == "user_report":
-                    other_messages.append((process_userreport, message))
-                else:
-                    raise ValueError(f"Unknown message type: {message_type}")
-                metrics.incr(
-                    "ingest_consumer.flush.messages_seen", tags={"message_type": message_type}
-                )
+    def _flush_batch_multiprocess(self, batch: Sequence[Tuple[Tuple[str, int], bytes]]):
+        values_by_pool: MutableMapping[int, List[bytes]] = {}
+        for topic_partition, value in batch:
+            # Partitions are spread over the pools in the order they are first
+            # seen, so that partitions of different topics do not collide.
+            pool_index = self.__pool_assignments.setdefault(
+                topic_partition, len(self.__pool_assignments) % len(self.__process_pools)
+            )
+            values_by_pool.setdefault(pool_index, []).append(value)
 
-        with metrics.timer("ingest_consumer.fetch_projects"):
-            projects = {p.id: p for p in Project.objects.get_many_from_cache(projects_to_fetch)}
-
-        if attachment_chunks:
-            # attachment_chunk messages need to be processed before attachment/event messages.
-            with metrics.timer("ingest_consumer.process_attachment_chunk_batch"):
-                for attachment_chunk in attachment_chunks:
-                    process_attachment_chunk(attachment_chunk, projects=projects)
-
-        if other_messages:
-            with metrics.timer("ingest_consumer.process_other_messages_batch"):
-                other_messages_flush_start = time.monotonic()
-
-                # Keep a mapping of futures to their metadata so that we can
-                # easily associate a future with its callback once completed.
-                results: MutableMapping["Future[Any]", "AsyncResult[Any]"] = {}
-
-                # Execute synchronous tasks and dispatch asynchronous tasks.
-                for processing_func, message in other_messages:
-                    result = processing_func(message, projects)
-                    if isinstance(result, AsyncResult):
-                        results[result.future] = result
-
-                # Wait for any asynchronous work to be completed, invoking
-                # callbacks (on the main thread) as results are ready.
-                for future in as_completed(results.keys()):
-                    results[future].callback(future)
-
-                metrics.timing(
-                    "ingest_consumer.process_other_messages_batch.normalized",
-                    (time.monotonic() - other_messages_flush_start) / len(other_messages),
-                )
+        futures = [
+            self.__process_pools[pool_index].submit(_flush_raw_batch, values)
+            for pool_index, values in values_by_pool.items()
+        ]
+
+        # Wait for all worker processes. Any error raised in a worker process,
+        # as well as ``BrokenProcessPool`` if one died, is re-raised here and
+        # prevents the offsets from being committed.
+        for future in futures:
+            future.result()
+
+    def _flush_batch(self, batch: Sequence[Message]):
+        _process_batch(batch, self.__process_event)
 
     def shutdown(self):
         if self.__process_event_executor is not None:
             self.__process_event_executor.shutdown()
 
+        if self.__process_pools is not None:
+            for pool in self.__process_pools:
+                pool.shutdown()
+
+
+def _initialize_worker_process() -> None:
+    from django.db import connections
+
+    # Shutdown is coordinated by the consumer process, which shuts down the pools
+    # once it received a signal.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    # Database connections must not be shared with the parent process.
+    connections.close_all()
+
+
+def _flush_raw_batch(values: Sequence[bytes]) -> None:
+    """
+    Entrypoint of worker processes. Decodes and processes a batch of raw
+    messages from a single partition.
+    """
+    mark_scope_as_unsafe()
+    with metrics.timer("ingest_consumer.flush_raw_batch"):
+        batch = [msgpack.unpackb(value, use_list=False) for value in values]
+        _process_batch(batch, process_event)
+
+
+def _process_batch(
+    batch: Sequence[Message],
+    process_event_func: Callable[[Message, IngestBatchContext], Union[Any, AsyncResult]],
+) -> None:
+    attachment_chunks = []
+
+    # Processing functions may be either synchronous or asynchronous.
+    # Functions that return an ``AsyncResult`` may perform a combination of
+    # synchronous and asynchronous work, and need to be explicitly waited on
+    # to ensure they have completed and callbacks have been invoked before
+    # returning. Functions that return anything else are assumed to have
+    # completed successfully after they have returned.
+    other_messages: MutableSequence[
+        Tuple[
+            Callable[
+                [Message, IngestBatchContext],
+                Union[Any, AsyncResult],
+            ],
+            Message,
+        ]
+    ] = []
+
+    projects_to_fetch = set()
+    event_keys_to_fetch = set()
+
+    with metrics.timer("ingest_consumer.prepare_messages"):
+        for message in batch:
+            message_type = message["type"]
+            projects_to_fetch.add(message["project_id"])
+
+            if message_type == "event":
+                other_messages.append((process_event_func, message))
+                event_keys_to_fetch.add(
+                    get_deduplication_key(int(message["project_id"]), message["event_id"])
+                )
+            elif message_type == "attachment_chunk":
+                attachment_chunks.append(message)
+            elif message_type == "attachment":
+                other_messages.append((process_individual_attachment, message))
+            elif message_type == "user_report":
+                other_messages.append((process_userreport, message))
+            else:
+                raise ValueError(f"Unknown message type: {message_type}")
+            metrics.incr("ingest_consumer.flush.messages_seen", tags={"message_type": message_type})
+
+    with metrics.timer("ingest_consumer.load_batch_context"):
+        context = IngestBatchContext.load(projects_to_fetch, event_keys=event_keys_to_fetch)
+
+    if attachment_chunks:
+        # attachment_chunk messages need to be processed before attachment/event messages.
+        with metrics.timer("ingest_consumer.process_attachment_chunk_batch"):
+            for attachment_chunk in attachment_chunks:
+                process_attachment_chunk(attachment_chunk, context=context)
+
+    if other_messages:
+        with metrics.timer("ingest_consumer.process_other_messages_batch"):
+            other_messages_flush_start = time.monotonic()
+
+            # Keep a mapping of futures to their metadata so that we can
+            # easily associate a future with its callback once completed.
+            results: MutableMapping["Future[Any]", "AsyncResult[Any]"] = {}
+
+            # Execute synchronous tasks and dispatch asynchronous tasks.
+            for processing_func, message in other_messages:
+                result = processing_func(message, context)
+                if isinstance(result, AsyncResult):
+                    results[result.future] = result
+
+            # Wait for any asynchronous work to be completed, invoking
+            # callbacks (on the main thread) as results are ready.
+            for future in as_completed(results.keys()):
+                results[future].callback(future)
+
+            metrics.timing(
+                "ingest_consumer.process_other_messages_batch.normalized",
+                (time.monotonic() - other_messages_flush_start) / len(other_messages),
+            )
+
 
 def trace_func(**span_kwargs):
     def wrapper(f):
@@ -169,8 +355,8 @@ def trace_func(**span_kwargs):
 
 
 @metrics.wraps("ingest_consumer.process_event")
-def _do_process_event(message: Message, projects: Mapping[int, Project]) -> None:
-    result = _load_event(message, projects)
+def _do_process_event(message: Message, context: IngestBatchContext) -> None:
+    result = _load_event(message, context)
     if result is None:
         return
 
@@ -179,7 +365,7 @@ def _do_process_event(message: Message, projects: Mapping[int, Project]) -> None
 
 
 def _load_event(
-    message: Message, projects: Mapping[int, Project]
+    message: Message, context: IngestBatchContext
 ) -> Optional[Tuple[Any, Callable[[str], None]]]:
     """
     Perform some initial filtering and deserialize the message payload. If the
@@ -215,8 +401,8 @@ def _load_event(
     # This code has been ripped from the old python store endpoint. We're
     # keeping it around because it does provide some protection against
     # reprocessing good events if a single consumer is in a restart loop.
-    deduplication_key = f"ev:{project_id}:{event_id}"
-    if cache.get(deduplication_key) is not None:
+    deduplication_key = get_deduplication_key(project_id, event_id)
+    if context.is_event_processed(deduplication_key):
         logger.warning(
             "pre-process-forwarder detected a duplicated event" " with id:%s for project:%s.",
             event_id,
@@ -236,9 +422,8 @@ def _load_event(
         # cause additional load on our logging infrastructure
         return
 
-    try:
-        project = projects[project_id]
-    except KeyError:
+    project = context.get_project(project_id)
+    if project is None:
         logger.error("Project for ingested event does not exist: %s", project_id)
         return
 
@@ -292,7 +477,7 @@ def _load_event(
             )
 
         # remember for an 1 hour that we saved this event (deduplication protection)
-        cache.set(deduplication_key, "", CACHE_TIMEOUT)
+        context.mark_event_processed(deduplication_key)
 
         # emit event_accepted once everything is done
         event_accepted.send_robust(ip=remote_addr, data=data, project=project, sender=process_event)
@@ -305,14 +490,14 @@ def _store_event(data) -> str:
 
 
 @trace_func(name="ingest_consumer.process_event")
-def process_event(message: Message, projects: Mapping[int, Project]) -> None:
-    return _do_process_event(message, projects)
+def process_event(message: Message, context: IngestBatchContext) -> None:
+    return _do_process_event(message, context)
 
 
 def process_event_async(
-    executor: ThreadPoolExecutor, message: Message, projects: Mapping[int, Project]
+    executor: ThreadPoolExecutor, message: Message, context: IngestBatchContext
 ) -> Optional["AsyncResult[str]"]:
-    result = _load_event(message, projects)
+    result = _load_event(message, context)
     if result is None:
         return None
 
@@ -325,7 +510,7 @@ def process_event_async(
 
 @trace_func(name="ingest_consumer.process_attachment_chunk")
 @metrics.wraps("ingest_consumer.process_attachment_chunk")
-def process_attachment_chunk(message, projects):
+def process_attachment_chunk(message, context):
     payload = message["payload"]
     event_id = message["event_id"]
     project_id = message["project_id"]
@@ -339,18 +524,17 @@ def process_attachment_chunk(message, projects):
 
 @trace_func(name="ingest_consumer.process_individual_attachment")
 @metrics.wraps("ingest_consumer.process_individual_attachment")
-def process_individual_attachment(message, projects) -> None:
+def process_individual_attachment(message, context) -> None:
     event_id = message["event_id"]
     project_id = int(message["project_id"])
     cache_key = cache_key_for_event({"event_id": event_id, "project": project_id})
 
-    try:
-        project = projects[project_id]
-    except KeyError:
+    project = context.get_project(project_id)
+    if project is None:
         logger.error("Project for ingested event does not exist: %s", project_id)
         return
 
-    if not features.has("organizations:event-attachments", project.organization, actor=None):
+    if not context.has_feature("organizations:event-attachments", project):
         logger.info("Organization has no event attachments: %s", project_id)
         return
 
@@ -386,14 +570,13 @@ def process_individual_attachment(message, projects) -> None:
 
 @trace_func(name="ingest_consumer.process_userreport")
 @metrics.wraps("ingest_consumer.process_userreport")
-def process_userreport(message, projects) -> None:
+def process_userreport(message, context) -> None:
     project_id = int(message["project_id"])
     start_time = to_datetime(message["start_time"])
     feedback = json.loads(message["payload"])
 
-    try:
-        project = projects[project_id]
-    except KeyError:
+    project = context.get_project(project_id)
+    if project is None:
         logger.error("Project for ingested event does not exist: %s", project_id)
         return False
 
@@ -411,7 +594,11 @@ def process_userreport(message, projects) -> None:
 
 
 def get_ingest_consumer(
-    consumer_types, once=False, executor: Optional[ThreadPoolExecutor] = None, **options
+    consumer_types,
+    once=False,
+    executor: Optional[ThreadPoolExecutor] = None,
+    processes: Optional[int] = None,
+    **options,
 ):
     """
     Handles events coming via a kafka queue.
@@ -419,6 +606,5 @@ def get_ingest_consumer(
     The events should have already been processed (normalized... ) upstream (by Relay).
     """
     topic_names = {ConsumerType.get_topic_name(consumer_type) for consumer_type in consumer_types}
-    return create_batching_kafka_consumer(
-        topic_names=topic_names, worker=IngestConsumerWorker(executor), **options
-    )
+    worker = IngestConsumerWorker(executor, processes=processes)
+    return create_batching_kafka_consumer(topic_names=topic_names, worker=worker, **options)
@@ -1,9 +1,15 @@
 from symbolic import ProguardMapper
 
+from sentry import options
 from sentry.models import EventError, ProjectDebugFile
 from sentry.plugins.base.v2 import Plugin2
 from sentry.reprocessing import report_processing_issue
-from sentry.stacktraces.processing import StacktraceProcessor
+from sentry.stacktraces.processing import (
+    StacktraceProcessor,
+    get_frame_cache_key,
+    lookup_frame_cache,
+    set_frame_cache_value,
+)
 from sentry.utils.safe import get_path
 
 
@@ -22,18 +28,65 @@ class JavaStacktraceProcessor(StacktraceProcessor):
             self.available = True
             self.images.add(str(image["uuid"]).lower())
 
+        # Mapping files are immutable, so remapped frames and classes can be
+        # cached by the debug ids of all mapping files.
+        self.use_frame_cache = options.get("processing.proguard-frame-cache")
+        self.mapping_views = None
+        self.mappings_complete = False
+        self.class_cache = {}
+
     def handles_frame(self, frame, stacktrace_info):
         platform = frame.get("platform") or self.data.get("platform")
         return platform == "java" and self.available and "function" in frame and "module" in frame
 
+    def preprocess_frame(self, processable_frame):
+        if self.use_frame_cache:
+            frame = processable_frame.frame
+            processable_frame.set_cache_key_from_values(
+                (
+                    "frame",
+                    sorted(self.images),
+                    frame["module"],
+                    frame["function"],
+                    frame.get("lineno") or 0,
+                )
+            )
+
+    def get_class_cache_key(self, class_name):
+        return get_frame_cache_key(self, ("class", sorted(self.images), class_name))
+
     def preprocess_step(self, processing_task):
         if not self.available:
             return False
 
+        if self.use_frame_cache:
+            class_names = set()
+            for info in self.stacktrace_infos:
+                if info.is_exception and info.container:
+                    class_name = self.get_exception_class_name(info.container)
+                    if class_name is not None:
+                        class_names.add(class_name)
+
+            cached = lookup_frame_cache(self.get_class_cache_key(x) for x in class_names)
+            self.class_cache = {x: cached.get(self.get_class_cache_key(x)) for x in class_names}
+
+            if None not in self.class_cache.values() and all(
+                frame.cache_value is not None
+                for frame in processing_task.iter_processable_frames(self)
+            ):
+                # Everything can be remapped from the cache, skip fetching
+                # and opening the mapping files.
+                return True
+
+        self.load_mapping_views()
+        return True
+
+    def load_mapping_views(self):
         dif_paths = ProjectDebugFile.difcache.fetch_difs(
             self.project, self.images, features=["mapping"]
         )
         self.mapping_views = []
+        self.mappings_complete = True
 
         for debug_id in self.images:
             error_type = None
@@ -51,6 +104,9 @@ class JavaStacktraceProcessor(StacktraceProcessor):
             if error_type is None:
                 continue
 
+            # Results are incomplete without this mapping file and must not be
+            # cached, it might still be uploaded.
+            self.mappings_complete = False
             self.data.setdefault("_metrics", {})["flag.processing.error"] = True
 
             self.data.setdefault("errors", []).append(
@@ -65,62 +121,117 @@ class JavaStacktraceProcessor(StacktraceProcessor):
                 data={"mapping_uuid": debug_id},
             )
 
-        return True
-
-    def process_exception(self, exception):
+    def get_exception_class_name(self, exception):
         ty = exception.get("type")
         mod = exception.get("module")
         if not ty or not mod:
-            return False
+            return None
+        return f"{mod}.{ty}"
+
+    def remap_class(self, class_name):
+        """Returns the original name of the class or an empty string if the
+        class cannot be remapped.
+        """
+        mapped = self.class_cache.get(class_name)
+        if mapped is not None:
+            return mapped
 
-        key = f"{mod}.{ty}"
+        if self.mapping_views is None:
+            self.load_mapping_views()
 
+        mapped = ""
         for view in self.mapping_views:
-            mapped = view.remap_class(key)
+            mapped = view.remap_class(class_name) or ""
             if mapped:
-                new_module, new_cls = mapped.rsplit(".", 1)
-                exception["module"] = new_module
-                exception["type"] = new_cls
-                return True
+                break
 
-        return False
+        if self.use_frame_cache and self.mappings_complete:
+            set_frame_cache_value(self.get_class_cache_key(class_name), mapped)
+        self.class_cache[class_name] = mapped
+        return mapped
 
-    def process_frame(self, processable_frame, processing_task):
-        frame = processable_frame.frame
-        raw_frame = dict(frame)
+    def remap_frame(self, frame):
+        """Returns a tuple of the remapped frames and the remapped class name
+        of the frame.  Remapped frames are lists of module, function, line
+        number and whether the frame is in a foreign class.
+        """
+        if self.mapping_views is None:
+            self.load_mapping_views()
 
         # first, try to remap complete frames
         for view in self.mapping_views:
             mapped = view.remap_frame(frame["module"], frame["function"], frame.get("lineno") or 0)
 
             if len(mapped) > 0:
-                new_frames = []
                 bottom_class = mapped[-1].class_name
 
                 # sentry expects stack traces in reverse order
-                for new_frame in reversed(mapped):
-                    frame = dict(raw_frame)
-                    frame["module"] = new_frame.class_name
-                    frame["function"] = new_frame.method
-                    frame["lineno"] = new_frame.line
-
-                    # clear the filename for all *foreign* classes
-                    if frame["module"] != bottom_class:
-                        frame.pop("filename", None)
-                        frame.pop("abs_path", None)
-
-                    new_frames.append(frame)
-
-                return new_frames, [raw_frame], []
+                return [
+                    [
+                        new_frame.class_name,
+                        new_frame.method,
+                        new_frame.line,
+                        new_frame.class_name != bottom_class,
+                    ]
+                    for new_frame in reversed(mapped)
+                ], None
 
         # second, if that is not possible, try to re-map only the class-name
         for view in self.mapping_views:
             mapped = view.remap_class(frame["module"])
 
             if mapped:
-                new_frame = dict(raw_frame)
-                new_frame["module"] = mapped
-                return [new_frame], [raw_frame], []
+                return None, mapped
+
+        return None, None
+
+    def process_exception(self, exception):
+        class_name = self.get_exception_class_name(exception)
+        if class_name is None:
+            return False
+
+        mapped = self.remap_class(class_name)
+        if mapped:
+            new_module, new_cls = mapped.rsplit(".", 1)
+            exception["module"] = new_module
+            exception["type"] = new_cls
+            return True
+
+        return False
+
+    def process_frame(self, processable_frame, processing_task):
+        frame = processable_frame.frame
+        raw_frame = dict(frame)
+
+        remapped = processable_frame.cache_value
+        if remapped is None:
+            remapped = self.remap_frame(frame)
+            if self.mappings_complete:
+                processable_frame.set_cache_value(remapped)
+
+        mapped_frames, mapped_class = remapped
+
+        if mapped_frames:
+            new_frames = []
+            for module, function, lineno, is_foreign in mapped_frames:
+                frame = dict(raw_frame)
+                frame["module"] = module
+                frame["function"] = function
+                frame["lineno"] = lineno
+
+                # clear the filename for all *foreign* classes
+                if is_foreign:
+                    frame.pop("filename", None)
+                    frame.pop("abs_path", None)
+
+                new_frames.append(frame)
+
+            return new_frames, [raw_frame], []
+
+        if mapped_class:
+            new_frame = dict(raw_frame)
+            new_frame["module"] = mapped_class
+            return [new_frame], [raw_frame], []
 
         return
 
@@ -5,9 +5,10 @@ import re
 import sys
 import time
 import zlib
+from hashlib import sha1
 from io import BytesIO
 from os.path import splitext
-from typing import IO, Optional, Tuple
+from typing import IO, Dict, Optional, Tuple
 from urllib.parse import urlsplit
 
 import sentry_sdk
@@ -16,7 +17,7 @@ from django.utils.encoding import force_bytes, force_text
 from requests.utils import get_encoding_from_headers
 from symbolic import SourceMapView
 
-from sentry import http
+from sentry import http, options
 from sentry.interfaces.stacktrace import Stacktrace
 from sentry.models import EventError, Organization, ReleaseFile
 from sentry.models.releasefile import ARTIFACT_INDEX_FILENAME, ReleaseArchive, read_artifact_index
@@ -26,7 +27,7 @@ from sentry.utils import json, metrics
 # separate from either the source cache or the source maps cache, this is for
 # holding the results of attempting to fetch both kinds of files, either from the
 # database or from the internet
-from sentry.utils.cache import cache
+from sentry.utils.cache import BoundedCache, cache
 from sentry.utils.files import compress_file
 from sentry.utils.hashlib import md5_text
 from sentry.utils.http import is_valid_origin
@@ -70,6 +71,15 @@ MAX_RESOURCE_FETCHES = 100
 
 CACHE_MAX_VALUE_SIZE = settings.SENTRY_CACHE_MAX_VALUE_SIZE
 
+# Parsed source maps can take up as much memory as the source map itself, so
+# only a few of them are kept per worker process.
+SOURCEMAP_VIEW_CACHE_SIZE = 20
+_sourcemap_view_cache = BoundedCache(max_size=SOURCEMAP_VIEW_CACHE_SIZE)
+
+# Decoded artifact indexes of recently processed releases.
+ARTIFACT_INDEX_CACHE_SIZE = 100
+_artifact_index_cache = BoundedCache(max_size=ARTIFACT_INDEX_CACHE_SIZE)
+
 logger = logging.getLogger(__name__)
 
 
@@ -300,11 +310,13 @@ def result_from_cache(filename, result):
 
 
 @metrics.wraps("sourcemaps.release_file")
-def fetch_release_file(filename, release, dist=None):
+def fetch_release_file(filename, release, dist=None, preloaded=None):
     """
     Attempt to retrieve a release artifact from the database.
 
-    Caches the result of that attempt (whether successful or not).
+    Caches the result of that attempt (whether successful or not).  Release
+    files resolved by `preload_release_artifacts` are taken from `preloaded`
+    instead of querying them.
     """
     dist_name = dist and dist.name or None
     cache_key, cache_key_meta = get_cache_keys(filename, release, dist)
@@ -322,13 +334,16 @@ def fetch_release_file(filename, release, dist=None):
                 "Checking database for release artifact %r (release_id=%s)", filename, release.id
             )
 
-            possible_files = list(
-                ReleaseFile.objects.filter(
-                    release_id=release.id,
-                    dist_id=dist.id if dist else dist,
-                    ident__in=filename_idents,
-                ).select_related("file")
-            )
+            if preloaded is not None and filename in preloaded.release_files:
+                possible_files = preloaded.release_files[filename]
+            else:
+                possible_files = list(
+                    ReleaseFile.objects.filter(
+                        release_id=release.id,
+                        dist_id=dist.id if dist else dist,
+                        ident__in=filename_idents,
+                    ).select_related("file")
+                )
 
             if len(possible_files) == 0:
                 logger.debug(
@@ -400,7 +415,7 @@ def get_artifact_index(release, dist):
     if result == -1:
         index = None
     elif result:
-        index = json.loads(result)
+        index = _decode_artifact_index(release, ident, result)
     else:
         index = read_artifact_index(release, dist, use_cache=True)
         cache_value = -1 if index is None else json.dumps(index)
@@ -410,24 +425,101 @@ def get_artifact_index(release, dist):
     return index
 
 
-def get_index_entry(release, dist, url) -> Optional[dict]:
+def _decode_artifact_index(release, ident, encoded_index):
+    # The checksum is part of the key, so an updated index is never served
+    # from the process cache.
+    cache_key = (release.id, ident, md5_text(encoded_index).hexdigest())
+    index = _artifact_index_cache.get(cache_key)
+    if index is None:
+        index = json.loads(encoded_index)
+        _artifact_index_cache.set(cache_key, index)
+    return index
+
+
+def get_index_entries(release, dist, urls) -> Dict[str, Optional[dict]]:
+    """
+    Resolves the artifact index entries of all given URLs with a single
+    index lookup.  URLs that are not part of the index map to `None`.
+    """
+    rv = dict.fromkeys(urls)
     try:
         index = get_artifact_index(release, dist)
     except Exception as exc:
         logger.error("sourcemaps.index_read_failed", exc_info=exc)
-        return None
+        return rv
 
     if index:
-        for candidate in ReleaseFile.normalize(url):
-            entry = index.get("files", {}).get(candidate)
-            if entry:
-                return entry
+        files = index.get("files", {})
+        for url in urls:
+            for candidate in ReleaseFile.normalize(url):
+                entry = files.get(candidate)
+                if entry:
+                    rv[url] = entry
+                    break
+
+    return rv
+
+
+def get_index_entry(release, dist, url) -> Optional[dict]:
+    return get_index_entries(release, dist, [url])[url]
+
+
+class PreloadedReleaseArtifacts:
+    """
+    Release artifact lookups for all files referenced by an event, resolved
+    in bulk by `preload_release_artifacts`.
+    """
+
+    def __init__(self, index_entries=None, release_files=None):
+        # url -> artifact index entry or `None`
+        self.index_entries = index_entries or {}
+        # url -> list of candidate `ReleaseFile`s, in order of priority
+        self.release_files = release_files or {}
 
-    return None
+
+@metrics.wraps("sourcemaps.preload_release_artifacts")
+def preload_release_artifacts(release, dist, urls) -> PreloadedReleaseArtifacts:
+    """
+    Resolves where the release artifacts of all given URLs are stored with
+    one artifact index lookup and at most one `ReleaseFile` query, instead
+    of one of each per URL.
+    """
+    urls = [url for url in urls if url[-3:] != "..."]
+    index_entries = get_index_entries(release, dist, urls)
+
+    # Only artifacts that are neither bundled in an archive nor in the
+    # artifact cache need to be looked up in the database.
+    cache_keys = {
+        url: get_cache_keys(url, release, dist)[0] for url in urls if index_entries.get(url) is None
+    }
+    cached = cache.get_many(list(cache_keys.values()))
+    pending = [url for url, cache_key in cache_keys.items() if cache_key not in cached]
+
+    release_files = {}
+    if pending:
+        dist_name = dist and dist.name or None
+        idents_by_url = {
+            url: [ReleaseFile.get_ident(f, dist_name) for f in ReleaseFile.normalize(url)]
+            for url in pending
+        }
+        releasefiles_by_ident = {
+            releasefile.ident: releasefile
+            for releasefile in ReleaseFile.objects.filter(
+                release_id=release.id,
+                dist_id=dist.id if dist else dist,
+                ident__in={ident for idents in idents_by_url.values() for ident in idents},
+            ).select_related("file")
+        }
+        for url, idents in idents_by_url.items():
+            release_files[url] = [
+                releasefiles_by_ident[ident] for ident in idents if ident in releasefiles_by_ident
+            ]
+
+    return PreloadedReleaseArtifacts(index_entries, release_files)
 
 
 @metrics.wraps("sourcemaps.fetch_release_archive")
-def fetch_release_archive_for_url(release, dist, url) -> Optional[IO]:
+def fetch_release_archive_for_url(release, dist, url, preloaded=None) -> Optional[IO]:
     """Fetch release archive and cache if possible.
 
     Multiple archives might have been uploaded, so we need the URL
@@ -435,7 +527,10 @@ def fetch_release_archive_for_url(release, dist, url) -> Optional[IO]:
 
     If return value is not empty, the caller is responsible for closing the stream.
     """
-    info = get_index_entry(release, dist, url)
+    if preloaded is not None and url in preloaded.index_entries:
+        info = preloaded.index_entries[url]
+    else:
+        info = get_index_entry(release, dist, url)
     if info is None:
         # Cannot write negative cache entry here because ID of release archive
         # is not yet known
@@ -487,7 +582,7 @@ def compress(fp: IO) -> Tuple[bytes, bytes]:
     return zlib.compress(content), content
 
 
-def fetch_release_artifact(url, release, dist):
+def fetch_release_artifact(url, release, dist, preloaded=None):
     """
     Get a release artifact either by extracting it or fetching it directly.
 
@@ -506,7 +601,7 @@ def fetch_release_artifact(url, release, dist):
         return result_from_cache(url, result)
 
     start = time.monotonic()
-    archive_file = fetch_release_archive_for_url(release, dist, url)
+    archive_file = fetch_release_archive_for_url(release, dist, url, preloaded=preloaded)
     if archive_file is not None:
         try:
             archive = ReleaseArchive(archive_file)
@@ -549,12 +644,12 @@ def fetch_release_artifact(url, release, dist):
 
     # Fall back to maintain compatibility with old releases and versions of
     # sentry-cli which upload files individually
-    result = fetch_release_file(url, release, dist)
+    result = fetch_release_file(url, release, dist, preloaded=preloaded)
 
     return result
 
 
-def fetch_file(url, project=None, release=None, dist=None, allow_scraping=True):
+def fetch_file(url, project=None, release=None, dist=None, allow_scraping=True, preloaded=None):
     """
     Pull down a URL, returning a UrlResult object.
 
@@ -570,7 +665,7 @@ def fetch_file(url, project=None, release=None, dist=None, allow_scraping=True):
 
     # if we've got a release to look on, try that first (incl associated cache)
     if release:
-        result = fetch_release_artifact(url, release, dist)
+        result = fetch_release_artifact(url, release, dist, preloaded=preloaded)
     else:
         result = None
 
@@ -708,13 +803,37 @@ def fetch_sourcemap(url, project=None, release=None, dist=None, allow_scraping=T
         )
         body = result.body
     try:
-        return SourceMapView.from_json_bytes(body)
+        return parse_sourcemap(body)
     except Exception as exc:
         # This is in debug because the product shows an error already.
         logger.debug(str(exc), exc_info=True)
         raise UnparseableSourcemap({"url": http.expose_url(url)})
 
 
+def parse_sourcemap(body):
+    """
+    Parses a source map into a `SourceMapView`.  If the
+    `processing.sourcemap-view-cache-ttl` option is set, parsed views are
+    shared across events processed in this worker, keyed by the checksum of
+    the source map contents.
+    """
+    cache_ttl = options.get("processing.sourcemap-view-cache-ttl")
+    if not cache_ttl:
+        return SourceMapView.from_json_bytes(body)
+
+    checksum = sha1(body).hexdigest()
+    sourcemap_view = _sourcemap_view_cache.get(checksum)
+    if sourcemap_view is not None:
+        metrics.incr("sourcemaps.view_cache.hit", skip_internal=True)
+        return sourcemap_view
+
+    metrics.incr("sourcemaps.view_cache.miss", skip_internal=True)
+    with metrics.timer("sourcemaps.parse"):
+        sourcemap_view = SourceMapView.from_json_bytes(body)
+    _sourcemap_view_cache.set(checksum, sourcemap_view, ttl=cache_ttl)
+    return sourcemap_view
+
+
 def is_data_uri(url):
     return url[:BASE64_PREAMBLE_LENGTH] == BASE64_SOURCEMAP_PREAMBLE
 
@@ -791,6 +910,7 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
 
         self.release = None
         self.dist = None
+        self.preloaded_artifacts = None
 
     def get_stacktraces(self, data):
         exceptions = get_path(data, "exception", "values", filter=True, default=())
@@ -1107,6 +1227,7 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
                     release=self.release,
                     dist=self.dist,
                     allow_scraping=self.allow_scraping,
+                    preloaded=self.preloaded_artifacts,
                 )
         except http.BadSource as exc:
             # most people don't upload release artifacts for their third-party libraries,
@@ -1185,6 +1306,14 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
                 continue
             pending_file_list.add(f["abs_path"])
 
+        if self.release is not None and pending_file_list:
+            with sentry_sdk.start_span(
+                op="JavaScriptStacktraceProcessor.populate_source_cache.preload_release_artifacts"
+            ):
+                self.preloaded_artifacts = preload_release_artifacts(
+                    self.release, self.dist, pending_file_list
+                )
+
         for idx, filename in enumerate(pending_file_list):
             with sentry_sdk.start_span(
                 op="JavaScriptStacktraceProcessor.populate_source_cache.cache_source"
@@ -2,6 +2,7 @@ import base64
 import logging
 import random
 import sys
+import threading
 import time
 from urllib.parse import urljoin
 
@@ -140,6 +141,19 @@ SOURCES_SCHEMA = {
 }
 
 
+# Sessions that are shared by all events symbolicated in a thread if the
+# `symbolicator.pooled-session` option is set, so that connections to
+# symbolicator are reused instead of being set up for every event.
+_pooled_sessions = threading.local()
+
+
+def _get_pooled_session():
+    session = getattr(_pooled_sessions, "session", None)
+    if session is None:
+        session = _pooled_sessions.session = Session()
+    return session
+
+
 def _task_id_cache_key_for_event(project_id, event_id):
     return f"symbolicator:{event_id}:{project_id}"
 
@@ -157,11 +171,18 @@ class Symbolicator:
                     id=project.organization_id
                 )
 
+        if options.get("symbolicator.non-blocking-polling"):
+            # Do not wait for symbolicator when creating tasks, the
+            # symbolicate_event task polls for the result with a backoff.
+            timeout = 0
+        else:
+            timeout = settings.SYMBOLICATOR_POLL_TIMEOUT
+
         self.sess = SymbolicatorSession(
             url=base_url,
             project_id=str(project.id),
             event_id=str(event_id),
-            timeout=settings.SYMBOLICATOR_POLL_TIMEOUT,
+            timeout=timeout,
             sources=get_sources_for_project(project),
             options=get_options_for_project(project),
         )
@@ -422,6 +443,7 @@ class SymbolicatorSession:
         self.options = options or None
         self.timeout = timeout
         self.session = None
+        self._owns_session = False
 
         # Build some maps for use in ._process_response()
         self.reverse_source_aliases = reverse_aliases_map(settings.SENTRY_BUILTIN_SOURCES)
@@ -444,11 +466,18 @@ class SymbolicatorSession:
 
     def open(self):
         if self.session is None:
-            self.session = Session()
+            if options.get("symbolicator.pooled-session"):
+                self.session = _get_pooled_session()
+                self._owns_session = False
+            else:
+                self.session = Session()
+                self._owns_session = True
 
     def close(self):
         if self.session is not None:
-            self.session.close()
+            # Pooled sessions stay open for the next event.
+            if self._owns_session:
+                self.session.close()
             self.session = None
 
     def _ensure_open(self):
@@ -538,7 +538,7 @@ class DIFCache:
             except OSError as e:
                 if e.errno != errno.ENOENT:
                     raise
-                dif.file.save_to(dif_path)
+                dif.file.save_to(dif_path, use_blob_cache=True)
             rv[debug_id] = dif_path
 
         return rv
@@ -2,11 +2,12 @@ import io
 import mmap
 import os
 import tempfile
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from contextlib import contextmanager
 from hashlib import sha1
-from threading import Semaphore
 from uuid import uuid4
 
 from django.conf import settings
@@ -37,6 +38,8 @@ UPLOAD_RETRY_TIME = getattr(settings, "SENTRY_UPLOAD_RETRY_TIME", 60)  # 1min
 DEFAULT_BLOB_SIZE = 1024 * 1024  # one mb
 CHUNK_STATE_HEADER = "__state"
 MULTI_BLOB_UPLOAD_CONCURRENCY = 8
+# Upper bound of chunk contents held in memory by ``File.putfile`` at once.
+MULTI_BLOB_UPLOAD_MAX_BYTES = 8 * 1024 * 1024
 MAX_FILE_SIZE = 2 ** 31  # 2GB is the maximum offset supported by fileblob
 
 
@@ -104,6 +107,144 @@ def get_storage(config=None):
     return storage(**options)
 
 
+class FileBlobCache:
+    """
+    Optional local disk cache for the contents of file blobs, enabled by
+    setting the `filestore.blob-cache-path` option.  Blobs are content
+    addressed, so entries are keyed by checksum and verified against it on
+    every read.  Once the cache grows beyond `filestore.blob-cache-size`
+    bytes, the least recently used entries are evicted.
+    """
+
+    # Eviction scans the entire cache directory, so every process runs it at
+    # most once per interval.
+    eviction_interval = 60
+
+    def __init__(self):
+        self._last_eviction = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cache_path(self):
+        from sentry import options as options_store
+
+        return options_store.get("filestore.blob-cache-path")
+
+    @property
+    def max_size(self):
+        from sentry import options as options_store
+
+        return options_store.get("filestore.blob-cache-size")
+
+    @property
+    def enabled(self):
+        return bool(self.cache_path) and self.max_size > 0
+
+    def get_path(self, checksum):
+        return os.path.join(self.cache_path, checksum[:2], checksum)
+
+    def getfile(self, blob):
+        """
+        Returns a file object with the contents of the blob, served from the
+        local cache if possible.
+        """
+        path = self.get_path(blob.checksum)
+        contents = self._read(path, blob.checksum)
+        if contents is not None:
+            metrics.incr("filestore.blob-cache.hit", skip_internal=True)
+            return ContentFile(contents)
+
+        metrics.incr("filestore.blob-cache.miss", skip_internal=True)
+        storage = get_storage()
+        with storage.open(blob.path) as f:
+            contents = f.read()
+
+        if sha1(contents).hexdigest() == blob.checksum:
+            self._write(path, contents)
+            self._maybe_evict()
+
+        return ContentFile(contents)
+
+    def _read(self, path, checksum):
+        try:
+            with open(path, "rb") as f:
+                contents = f.read()
+        except OSError:
+            return None
+
+        if sha1(contents).hexdigest() != checksum:
+            metrics.incr("filestore.blob-cache.corrupt", skip_internal=True)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        # The modification time doubles as the last access time for eviction.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return contents
+
+    def _write(self, path, contents):
+        base = os.path.dirname(path)
+        try:
+            os.makedirs(base, exist_ok=True)
+            with tempfile.NamedTemporaryFile(prefix="._blob-", dir=base, delete=False) as f:
+                f.write(contents)
+            os.rename(f.name, path)
+        except OSError:
+            pass
+
+    def _maybe_evict(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_eviction < self.eviction_interval:
+                return
+            self._last_eviction = now
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits into
+        the configured size.
+        """
+        entries = []
+        total_size = 0
+        for dirpath, _, filenames in os.walk(self.cache_path):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+
+        max_size = self.max_size
+        if total_size <= max_size:
+            return
+
+        entries.sort()
+        evicted = 0
+        for _, size, path in entries:
+            if total_size <= max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+            evicted += 1
+
+        metrics.incr("filestore.blob-cache.evicted", amount=evicted, skip_internal=True)
+
+
+blob_cache = FileBlobCache()
+
+
 class FileBlob(Model):
     __include_in_export__ = False
 
@@ -123,6 +264,10 @@ class FileBlob(Model):
         entries.  Files can be a list of files or tuples of file and checksum.
         If both are provided then a checksum check is performed.
 
+        Existing blobs are looked up with a single query and only missing
+        blobs are locked and uploaded to the filestore, which happens
+        concurrently.  Returns the blobs in the order of `files`.
+
         If the checksums mismatch an `IOError` is raised.
         """
         logger.debug("FileBlob.from_files.start")
@@ -134,108 +279,100 @@ class FileBlob(Model):
             else:
                 files_with_checksums.append((fileobj, None))
 
-        checksums_seen = set()
-        blobs_created = []
-        blobs_to_save = []
-        locks = set()
-        semaphore = Semaphore(value=MULTI_BLOB_UPLOAD_CONCURRENCY)
+        # Before we go and do something with the files we calculate the
+        # checksums and compare them against the reference.  This also
+        # deduplicates duplicates uploaded in the same request.  This is
+        # necessary because we acquire multiple locks in one go which would
+        # let us deadlock otherwise.
+        checksums = []
+        files_by_checksum = {}
+        for fileobj, reference_checksum in files_with_checksums:
+            size, checksum = _get_size_and_checksum(fileobj)
+            if reference_checksum is not None and checksum != reference_checksum:
+                raise OSError("Checksum mismatch")
+            checksums.append(checksum)
+            files_by_checksum.setdefault(checksum, (fileobj, size))
 
-        def _upload_and_pend_chunk(fileobj, size, checksum, lock):
+        def _ensure_blob_owned(blob):
+            if organization is None:
+                return
+            try:
+                with transaction.atomic(using=router.db_for_write(FileBlobOwner)):
+                    FileBlobOwner.objects.create(organization_id=organization.id, blob=blob)
+            except IntegrityError:
+                pass
+
+        def _upload_chunk(fileobj, size, checksum):
             logger.debug(
-                "FileBlob.from_files._upload_and_pend_chunk.start",
+                "FileBlob.from_files._upload_chunk.start",
                 extra={"checksum": checksum, "size": size},
             )
             blob = cls(size=size, checksum=checksum)
             blob.path = cls.generate_unique_path()
             storage = get_storage()
             storage.save(blob.path, fileobj)
-            blobs_to_save.append((blob, lock))
             metrics.timing("filestore.blob-size", size, tags={"function": "from_files"})
             logger.debug(
-                "FileBlob.from_files._upload_and_pend_chunk.end",
+                "FileBlob.from_files._upload_chunk.end",
                 extra={"checksum": checksum, "path": blob.path},
             )
-
-        def _ensure_blob_owned(blob):
-            if organization is None:
-                return
-            try:
-                with transaction.atomic(using=router.db_for_write(FileBlobOwner)):
-                    FileBlobOwner.objects.create(organization_id=organization.id, blob=blob)
-            except IntegrityError:
-                pass
-
-        def _save_blob(blob):
-            logger.debug("FileBlob.from_files._save_blob.start", extra={"path": blob.path})
-            blob.save()
+            return blob
+
+        # Most blobs of a re-uploaded bundle or debug file already exist, so
+        # they are resolved in one go without taking a lock.
+        blobs_by_checksum = {
+            blob.checksum: blob for blob in cls.objects.filter(checksum__in=list(files_by_checksum))
+        }
+        for blob in blobs_by_checksum.values():
             _ensure_blob_owned(blob)
-            logger.debug("FileBlob.from_files._save_blob.end", extra={"path": blob.path})
-
-        def _flush_blobs():
-            while True:
-                try:
-                    blob, lock = blobs_to_save.pop()
-                except IndexError:
-                    break
-
-                _save_blob(blob)
-                lock.__exit__(None, None, None)
-                locks.discard(lock)
-                semaphore.release()
 
+        locks = {}
         try:
             with ThreadPoolExecutor(max_workers=MULTI_BLOB_UPLOAD_CONCURRENCY) as exe:
-                for fileobj, reference_checksum in files_with_checksums:
-                    logger.debug(
-                        "FileBlob.from_files.executor_start", extra={"checksum": reference_checksum}
-                    )
-                    _flush_blobs()
-
-                    # Before we go and do something with the files we calculate
-                    # the checksums and compare it against the reference.  This
-                    # also deduplicates duplicates uploaded in the same request.
-                    # This is necessary because we acquire multiple locks in one
-                    # go which would let us deadlock otherwise.
-                    size, checksum = _get_size_and_checksum(fileobj)
-                    if reference_checksum is not None and checksum != reference_checksum:
-                        raise OSError("Checksum mismatch")
-                    if checksum in checksums_seen:
+                futures = {}
+                for checksum, (fileobj, size) in files_by_checksum.items():
+                    if checksum in blobs_by_checksum:
                         continue
-                    checksums_seen.add(checksum)
 
-                    # Check if we need to lock the blob.  If we get a result back
-                    # here it means the blob already exists.
+                    # Check again under the lock, the blob might have been
+                    # created concurrently in the meantime.
                     lock = _locked_blob(checksum, logger=logger)
                     existing = lock.__enter__()
                     if existing is not None:
                         lock.__exit__(None, None, None)
-                        blobs_created.append(existing)
+                        blobs_by_checksum[checksum] = existing
                         _ensure_blob_owned(existing)
                         continue
 
                     # Remember the lock to force unlock all at the end if we
                     # encounter any difficulties.
-                    locks.add(lock)
-
-                    # Otherwise we leave the blob locked and submit the task.
-                    # We use the semaphore to ensure we never schedule too
-                    # many.  The upload will be done with a certain amount
-                    # of concurrency controlled by the semaphore and the
-                    # `_flush_blobs` call will take all those uploaded
-                    # blobs and associate them with the database.
-                    semaphore.acquire()
-                    exe.submit(_upload_and_pend_chunk(fileobj, size, checksum, lock))
-                    logger.debug("FileBlob.from_files.end", extra={"checksum": reference_checksum})
-
-            _flush_blobs()
+                    locks[checksum] = lock
+
+                    # Otherwise we leave the blob locked and submit the upload.
+                    # The executor bounds the number of concurrent uploads.
+                    logger.debug("FileBlob.from_files.executor_start", extra={"checksum": checksum})
+                    futures[exe.submit(_upload_chunk, fileobj, size, checksum)] = checksum
+
+                # Database writes stay on this thread.  Every uploaded blob is
+                # saved and unlocked as soon as its upload completes.
+                for future in as_completed(futures):
+                    blob = future.result()
+                    logger.debug("FileBlob.from_files._save_blob.start", extra={"path": blob.path})
+                    blob.save()
+                    _ensure_blob_owned(blob)
+                    logger.debug("FileBlob.from_files._save_blob.end", extra={"path": blob.path})
+                    blobs_by_checksum[blob.checksum] = blob
+                    locks.pop(blob.checksum).__exit__(None, None, None)
         finally:
-            for lock in locks:
+            for lock in locks.values():
                 try:
                     lock.__exit__(None, None, None)
                 except Exception:
                     pass
             logger.debug("FileBlob.from_files.end")
 
+        return [blobs_by_checksum[checksum] for checksum in checksums]
+
     @classmethod
     def from_file(cls, fileobj, logger=nooplogger):
         """
@@ -294,9 +431,10 @@ class FileBlob(Model):
         if commit:
             self.save()
 
-    def getfile(self):
+    def getfile(self, use_cache=False):
         """
-        Return a file-like object for this File's content.
+        Return a file-like object for this File's content.  With `use_cache`
+        the content is served from the local blob cache if it is enabled.
 
         >>> with blob.getfile() as src, open('/tmp/localfile', 'wb') as dst:
         >>>     for chunk in src.chunks():
@@ -304,6 +442,9 @@ class FileBlob(Model):
         """
         assert self.path
 
+        if use_cache and blob_cache.enabled:
+            return blob_cache.getfile(self)
+
         storage = get_storage()
         return storage.open(self.path)
 
@@ -330,24 +471,28 @@ class File(Model):
         app_label = "sentry"
         db_table = "sentry_file"
 
-    def _get_chunked_blob(self, mode=None, prefetch=False, prefetch_to=None, delete=True):
+    def _get_chunked_blob(
+        self, mode=None, prefetch=False, prefetch_to=None, delete=True, use_blob_cache=False
+    ):
         return ChunkedFileBlobIndexWrapper(
             FileBlobIndex.objects.filter(file=self).select_related("blob").order_by("offset"),
             mode=mode,
             prefetch=prefetch,
             prefetch_to=prefetch_to,
             delete=delete,
+            use_blob_cache=use_blob_cache,
         )
 
-    def getfile(self, mode=None, prefetch=False):
+    def getfile(self, mode=None, prefetch=False, use_blob_cache=False):
         """Returns a file object.  By default the file is fetched on
         demand but if prefetch is enabled the file is fully prefetched
-        into a tempfile before reading can happen.
+        into a tempfile before reading can happen.  With `use_blob_cache`
+        blobs are read through the local blob cache.
         """
-        impl = self._get_chunked_blob(mode, prefetch)
+        impl = self._get_chunked_blob(mode, prefetch, use_blob_cache=use_blob_cache)
         return FileObj(impl, self.name)
 
-    def save_to(self, path):
+    def save_to(self, path, use_blob_cache=False):
         """Fetches the file and emplaces it at a certain location.  The
         write is done atomically to a tempfile first and then moved over.
         If the directory does not exist it is created.
@@ -362,7 +507,7 @@ class File(Model):
         f = None
         try:
             f = self._get_chunked_blob(
-                prefetch=True, prefetch_to=base, delete=False
+                prefetch=True, prefetch_to=base, delete=False, use_blob_cache=use_blob_cache
             ).detach_tempfile()
 
             # pre-emptively check if the file already exists.
@@ -389,6 +534,13 @@ class File(Model):
         """
         Save a fileobj into a number of chunks.
 
+        The stream is read in windows of up to `MULTI_BLOB_UPLOAD_CONCURRENCY`
+        chunks, which are uploaded concurrently through
+        `FileBlob.from_files`.  A window holds at most
+        `MULTI_BLOB_UPLOAD_MAX_BYTES`, but always at least one chunk, so
+        large blob sizes are uploaded with less concurrency.  Blobs that
+        already exist are reused.
+
         Returns a list of `FileBlobIndex` items.
 
         >>> indexes = file.putfile(fileobj)
@@ -396,17 +548,29 @@ class File(Model):
         results = []
         offset = 0
         checksum = sha1(b"")
+        window_size = max(
+            1, min(MULTI_BLOB_UPLOAD_CONCURRENCY, MULTI_BLOB_UPLOAD_MAX_BYTES // blob_size)
+        )
 
         while True:
-            contents = fileobj.read(blob_size)
-            if not contents:
+            chunks = []
+            while len(chunks) < window_size:
+                contents = fileobj.read(blob_size)
+                if not contents:
+                    break
+                checksum.update(contents)
+                chunks.append(ContentFile(contents))
+
+            if not chunks:
                 break
-            checksum.update(contents)
 
-            blob_fileobj = ContentFile(contents)
-            blob = FileBlob.from_file(blob_fileobj, logger=logger)
-            results.append(FileBlobIndex.objects.create(file=self, blob=blob, offset=offset))
-            offset += blob.size
+            blobs = FileBlob.from_files(chunks, logger=logger)
+            indexes = []
+            for blob in blobs:
+                indexes.append(FileBlobIndex(file=self, blob=blob, offset=offset))
+                offset += blob.size
+            results.extend(FileBlobIndex.objects.bulk_create(indexes))
+
         self.size = offset
         self.checksum = checksum.hexdigest()
         metrics.timing("filestore.file-size", offset)
@@ -477,11 +641,24 @@ class FileBlobIndex(Model):
 
 
 class ChunkedFileBlobIndexWrapper:
-    def __init__(self, indexes, mode=None, prefetch=False, prefetch_to=None, delete=True):
+    def __init__(
+        self,
+        indexes,
+        mode=None,
+        prefetch=False,
+        prefetch_to=None,
+        delete=True,
+        use_blob_cache=False,
+    ):
         # eager load from database incase its a queryset
         self._indexes = list(indexes)
+        self._use_blob_cache = use_blob_cache
+        self._offsets = [idx.offset for idx in self._indexes]
         self._curfile = None
         self._curidx = None
+        self._curpos = None
+        self._readahead = None
+        self._readahead_executor = None
         if prefetch:
             self.prefetched = True
             self._prefetch(prefetch_to, delete)
@@ -505,23 +682,56 @@ class ChunkedFileBlobIndexWrapper:
         rv.seek(0)
         return rv
 
-    def _nextidx(self):
+    def _openidx(self, pos, readahead=False):
         assert not self.prefetched, "this makes no sense"
         old_file = self._curfile
         try:
-            try:
-                self._curidx = next(self._idxiter)
-                self._curfile = self._curidx.blob.getfile()
-            except StopIteration:
+            if pos < len(self._indexes):
+                self._curpos = pos
+                self._curidx = self._indexes[pos]
+                self._curfile = self._open_blob(pos)
+                if readahead:
+                    self._schedule_readahead(pos + 1)
+            else:
+                self._curpos = None
                 self._curidx = None
                 self._curfile = None
         finally:
             if old_file is not None:
                 old_file.close()
 
+    def _nextidx(self):
+        # Crossing into the next blob while reading means the file is read
+        # sequentially, so the blob after that is fetched in the background.
+        self._openidx(self._curpos + 1, readahead=True)
+
+    def _open_blob(self, pos):
+        readahead, self._readahead = self._readahead, None
+        if readahead is not None:
+            readahead_pos, future = readahead
+            if readahead_pos == pos:
+                return future.result()
+            future.cancel()
+        return self._indexes[pos].blob.getfile(use_cache=self._use_blob_cache)
+
+    def _schedule_readahead(self, pos):
+        if pos >= len(self._indexes):
+            return
+
+        def fetch_blob(blob):
+            with blob.getfile(use_cache=self._use_blob_cache) as sf:
+                return io.BytesIO(sf.read())
+
+        if self._readahead_executor is None:
+            self._readahead_executor = ThreadPoolExecutor(max_workers=1)
+        future = self._readahead_executor.submit(fetch_blob, self._indexes[pos].blob)
+        self._readahead = (pos, future)
+
     @property
     def size(self):
-        return sum(i.blob.size for i in self._indexes)
+        if not self._indexes:
+            return 0
+        return self._indexes[-1].offset + self._indexes[-1].blob.size
 
     def open(self):
         self.closed = False
@@ -541,8 +751,8 @@ class ChunkedFileBlobIndexWrapper:
 
         mem = mmap.mmap(f.fileno(), size)
 
-        def fetch_file(offset, getfile):
-            with getfile() as sf:
+        def fetch_file(offset, blob):
+            with blob.getfile(use_cache=self._use_blob_cache) as sf:
                 while True:
                     chunk = sf.read(65535)
                     if not chunk:
@@ -552,7 +762,7 @@ class ChunkedFileBlobIndexWrapper:
 
         with ThreadPoolExecutor(max_workers=4) as exe:
             for idx in self._indexes:
-                exe.submit(fetch_file, idx.offset, idx.blob.getfile)
+                exe.submit(fetch_file, idx.offset, idx.blob)
 
         mem.flush()
         self._curfile = f
@@ -560,8 +770,15 @@ class ChunkedFileBlobIndexWrapper:
     def close(self):
         if self._curfile:
             self._curfile.close()
+        if self._readahead is not None:
+            self._readahead[1].cancel()
+        if self._readahead_executor is not None:
+            self._readahead_executor.shutdown(wait=False)
         self._curfile = None
         self._curidx = None
+        self._curpos = None
+        self._readahead = None
+        self._readahead_executor = None
         self.closed = True
 
     def _seek(self, pos):
@@ -577,14 +794,12 @@ class ChunkedFileBlobIndexWrapper:
             # Empty file, there's no seeking to be done.
             return
 
-        for n, idx in enumerate(self._indexes[::-1]):
-            if idx.offset <= pos:
-                if idx != self._curidx:
-                    self._idxiter = iter(self._indexes[-(n + 1) :])
-                    self._nextidx()
-                break
-        else:
+        # Only the blob covering the position is opened.
+        n = bisect_right(self._offsets, pos) - 1
+        if n < 0:
             raise ValueError("Cannot seek to pos")
+        if n != self._curpos:
+            self._openidx(n)
         self._curfile.seek(pos - self._curidx.offset)
 
     def seek(self, pos, whence=io.SEEK_SET):
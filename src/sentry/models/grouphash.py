@@ -1,7 +1,170 @@
-from django.db import models
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import IntegrityError, models, router, transaction
 from django.utils.translation import ugettext_lazy as _
 
 from sentry.db.models import BoundedPositiveIntegerField, FlexibleForeignKey, Model
+from sentry.db.models.manager import BaseManager
+from sentry.utils import metrics
+from sentry.utils.cache import BoundedCache
+
+# Process-local cache of resolved grouphashes, shared by all events saved in a
+# worker process. Every entry is tagged with the project's cache version, which
+# is kept in the shared cache and replaced whenever grouphashes of the project
+# are reassigned (merge, unmerge, split, discard, deletion).
+_grouphash_cache = BoundedCache(max_size=10000)
+
+CACHE_VERSION_TTL = 3600
+
+# Seconds for which a worker process keeps using the cache version it last read
+# from the shared cache. This saves a shared cache round trip per lookup, at the
+# cost of seeing invalidations made by other processes up to this much later.
+# Invalidations made by the process itself are visible immediately.
+CACHE_VERSION_LOCAL_TTL = 5
+
+_cache_versions = BoundedCache(max_size=10000, ttl=CACHE_VERSION_LOCAL_TTL)
+
+
+def _get_cache_version_key(project_id):
+    return f"grouphash-cache-version:{project_id}"
+
+
+def _get_cache_version(project_id):
+    version = _cache_versions.get(project_id)
+    if version is not None:
+        return version
+
+    version_key = _get_cache_version_key(project_id)
+    version = cache.get(version_key)
+    if version is None:
+        # A missing version must never match entries that were cached before
+        # the version got lost, so always start with a fresh one.
+        cache.add(version_key, uuid4().hex, CACHE_VERSION_TTL)
+        version = cache.get(version_key)
+
+    _cache_versions.set(project_id, version)
+    return version
+
+
+def _is_cacheable(grouphash):
+    # Hashes that are not associated with a group yet are about to be claimed
+    # by a new group and hashes that are locked for unmerge are about to move.
+    # Neither is worth caching.
+    if grouphash.state == GroupHash.State.LOCKED_IN_MIGRATION:
+        return False
+    return (
+        grouphash.group_id is not None
+        or grouphash.group_tombstone_id is not None
+        or grouphash.state == GroupHash.State.SPLIT
+    )
+
+
+class GroupHashManager(BaseManager):
+    def get_many_for_project(self, project_id, hashes, use_cache=True):
+        """
+        Returns a mapping of hash to ``GroupHash`` for all existing hashes of
+        the project in ``hashes``.
+
+        If the ``store.grouphash-cache-ttl`` option is set, resolved
+        grouphashes are served from a process-local cache. Pass
+        ``use_cache=False`` when the rows must be read from the database, for
+        instance while holding row locks.
+        """
+        from sentry import options
+
+        if not hashes:
+            return {}
+
+        cache_ttl = options.get("store.grouphash-cache-ttl")
+        if not use_cache or not cache_ttl:
+            return {h.hash: h for h in self.filter(project_id=project_id, hash__in=hashes)}
+
+        version = _get_cache_version(project_id)
+
+        rv = {}
+        for hash in hashes:
+            cached = _grouphash_cache.get((project_id, hash))
+            if cached is None:
+                continue
+
+            cached_version, (id, group_id, group_tombstone_id, state) = cached
+            if cached_version != version:
+                continue
+
+            rv[hash] = self.model(
+                id=id,
+                project_id=project_id,
+                hash=hash,
+                group_id=group_id,
+                group_tombstone_id=group_tombstone_id,
+                state=state,
+            )
+
+        metrics.incr("grouphash_cache.hit", amount=len(rv), skip_internal=True)
+
+        missing = [hash for hash in hashes if hash not in rv]
+        if missing:
+            metrics.incr("grouphash_cache.miss", amount=len(missing), skip_internal=True)
+
+            for grouphash in self.filter(project_id=project_id, hash__in=missing):
+                rv[grouphash.hash] = grouphash
+                if _is_cacheable(grouphash):
+                    _grouphash_cache.set(
+                        (project_id, grouphash.hash),
+                        (
+                            version,
+                            (
+                                grouphash.id,
+                                grouphash.group_id,
+                                grouphash.group_tombstone_id,
+                                grouphash.state,
+                            ),
+                        ),
+                        ttl=cache_ttl,
+                    )
+
+        return rv
+
+    def get_or_create_many(self, project, hashes, use_cache=True):
+        """
+        Bulk version of ``get_or_create``. Existing grouphashes are resolved
+        with a single lookup, only missing ones are created. Returns the
+        grouphashes in the order of ``hashes``.
+        """
+        grouphashes = self.get_many_for_project(project.id, hashes, use_cache=use_cache)
+
+        for hash in hashes:
+            if hash in grouphashes:
+                continue
+
+            try:
+                with transaction.atomic(using=router.db_for_write(GroupHash)):
+                    grouphashes[hash] = self.create(project=project, hash=hash)
+            except IntegrityError:
+                grouphashes[hash] = self.get(project=project, hash=hash)
+
+        return [grouphashes[hash] for hash in hashes]
+
+    def invalidate_cache(self, project_id):
+        """
+        Invalidates cached grouphashes of the given project in all processes,
+        other processes notice within ``CACHE_VERSION_LOCAL_TTL`` seconds.
+        Needs to be called whenever grouphashes are changed through bulk
+        queryset updates, which do not emit model signals.
+        """
+        version = uuid4().hex
+        cache.set(_get_cache_version_key(project_id), version, CACHE_VERSION_TTL)
+        _cache_versions.set(project_id, version)
+
+    def post_save(self, instance, **kwargs):
+        # Newly created grouphashes are never cached, so there is nothing to
+        # invalidate.
+        if not kwargs.get("created"):
+            self.invalidate_cache(instance.project_id)
+
+    def post_delete(self, instance, **kwargs):
+        self.invalidate_cache(instance.project_id)
 
 
 class GroupHash(Model):
@@ -24,6 +187,8 @@ class GroupHash(Model):
         choices=[(State.LOCKED_IN_MIGRATION, _("Locked (Migration in Progress)"))], null=True
     )
 
+    objects = GroupHashManager()
+
     class Meta:
         app_label = "sentry"
         db_table = "sentry_grouphash"
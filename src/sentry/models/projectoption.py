@@ -52,6 +52,24 @@ class ProjectOptionManager(OptionManager):
                 self._option_cache[cache_key] = result
         return self._option_cache.get(cache_key, {})
 
+    def preload_all_values(self, projects):
+        """
+        Loads the options of all given projects into the local cache, using a
+        single lookup in the shared cache. Options of projects that are not
+        in the shared cache are loaded from the database.
+        """
+        cache_keys = {self._make_key(project.id): project.id for project in projects}
+        if not cache_keys:
+            return
+
+        results = cache.get_many(list(cache_keys))
+        for cache_key, project_id in cache_keys.items():
+            result = results.get(cache_key)
+            if result is None:
+                self.reload_cache(project_id, "projectoption.get_all_values")
+            else:
+                self._option_cache[cache_key] = result
+
     def reload_cache(self, project_id, update_reason):
         if update_reason != "projectoption.get_all_values":
             schedule_update_config_cache(
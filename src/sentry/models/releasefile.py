@@ -150,7 +150,7 @@ class ReleaseFileCache:
         file_size = releasefile.file.size
         if file_size < cutoff:
             metrics.timing("release_file.cache.get.size", file_size, tags={"cutoff": True})
-            return releasefile.file.getfile()
+            return releasefile.file.getfile(use_blob_cache=True)
 
         file_id = str(releasefile.file.id)
         organization_id = str(releasefile.organization_id)
@@ -162,7 +162,7 @@ class ReleaseFileCache:
         except OSError as e:
             if e.errno != errno.ENOENT:
                 raise
-            releasefile.file.save_to(file_path)
+            releasefile.file.save_to(file_path, use_blob_cache=True)
             hit = False
 
         metrics.timing("release_file.cache.get.size", file_size, tags={"hit": hit, "cutoff": False})
@@ -51,6 +51,16 @@ register(
     flags=FLAG_PRIORITIZE_DISK,
 )
 register("releasefile.cache-limit", type=Int, default=10 * 1024 * 1024, flags=FLAG_PRIORITIZE_DISK)
+# Local disk cache for filestore blobs, disabled if no path is set
+register(
+    "filestore.blob-cache-path",
+    type=String,
+    default="",
+    flags=FLAG_ALLOW_EMPTY | FLAG_PRIORITIZE_DISK,
+)
+register(
+    "filestore.blob-cache-size", type=Int, default=1024 * 1024 * 1024, flags=FLAG_PRIORITIZE_DISK
+)
 
 # Mail
 register("mail.backend", default="smtp", flags=FLAG_NOSTORE)
@@ -113,6 +123,14 @@ register(
 # The ratio of requests for which the new stackwalking method should be compared against the old one
 register("symbolicator.compare_stackwalking_methods_rate", default=0.0)
 
+# Keep connections to symbolicator open across events instead of opening a new
+# session for every event
+register("symbolicator.pooled-session", default=False)
+
+# Re-enqueue symbolicate_event with a backoff while symbolicator is still
+# processing an event instead of blocking the worker until it is done
+register("symbolicator.non-blocking-polling", default=False)
+
 # Backend chart rendering via chartcuterie
 register("chart-rendering.enabled", default=False, flags=FLAG_ALLOW_EMPTY | FLAG_PRIORITIZE_DISK)
 register(
@@ -328,6 +346,10 @@ register("store.background-grouping-sample-rate", default=0.0)
 # True if background grouping should run before secondary and primary grouping
 register("store.background-grouping-before", default=False)
 
+# True if frame components should be shared between the primary, secondary and
+# background grouping configs of an event
+register("store.grouping-component-cache", default=False)
+
 # Killswitch for dropping events in ingest consumer (after parsing them)
 register("store.load-shed-parsed-pipeline-projects", type=Any, default=[])
 
@@ -337,6 +359,30 @@ register("store.load-shed-process-event-projects", type=Any, default=[])
 # Killswitch for dropping events in symbolicate_event
 register("store.load-shed-symbolicate-event-projects", type=Any, default=[])
 
+# Seconds for which resolved grouphashes are cached in the worker process when
+# saving events. 0 disables the cache.
+register("store.grouphash-cache-ttl", default=0)
+
+# Encode filters and extra values of buffer increments in Redis as JSON instead
+# of pickle. Only enable once all workers can read the JSON encoding.
+register("buffer.redis-json-encoding", default=False)
+
+# Flush all keys of a process_incr task at once and apply their increments with
+# one UPDATE per model instead of one per key
+register("buffer.redis-batch-process", default=False)
+
+# Drain the pending set of RedisBuffer in chunks of this many keys per host,
+# queueing up keys while draining. 0 reads the entire pending set at once.
+register("buffer.redis-pending-chunk-size", default=0)
+
+# Seconds for which parsed source maps are kept in the worker process for
+# subsequent events. 0 disables the cache.
+register("processing.sourcemap-view-cache-ttl", default=0)
+
+# Keep ProGuard remapping results in the frame cache, so that frames seen
+# before are remapped without fetching the mapping files
+register("processing.proguard-frame-cache", default=False)
+
 # Store release files bundled as zip files
 register("processing.save-release-archives", default=False)  # unused
 
@@ -472,6 +472,12 @@ def batching_kafka_options(group):
     default=None,
     help="Thread pool size (only utilitized for message types that support concurrent processing)",
 )
+@click.option(
+    "--processes",
+    type=int,
+    default=None,
+    help="Number of worker processes that decode and process messages. Messages of a partition are always processed by the same worker process.",
+)
 @configuration
 def ingest_consumer(consumer_types, all_consumer_types, **options):
     """
@@ -495,6 +501,8 @@ def ingest_consumer(consumer_types, all_consumer_types, **options):
         raise click.ClickException("Need to specify --all-consumer-types or --consumer-type")
 
     concurrency = options.pop("concurrency", None)
+    if concurrency is not None and options.get("processes"):
+        raise click.ClickException("Cannot specify --concurrency and --processes at the same time")
     if concurrency is not None:
         executor = ThreadPoolExecutor(concurrency)
     else:
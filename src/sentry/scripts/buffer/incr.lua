@@ -0,0 +1,46 @@
+--[[
+
+Applies a single buffer increment.
+
+KEYS[1] is the buffer key of the model and filters, KEYS[2] the pending set
+the buffer key is added to.
+
+ARGV contains the model name, the encoded filters, the expiry of the buffer
+key in seconds, the timestamp to add the buffer key to the pending set with,
+"1" if only the signal should be sent when processing the key, and the number
+of counter columns.  It is followed by alternating column names and amounts
+of the counters, and alternating column names and encoded values of the extra
+columns.
+
+]]--
+
+local key = KEYS[1]
+local pending_key = KEYS[2]
+
+local model = ARGV[1]
+local filters = ARGV[2]
+local expire = ARGV[3]
+local timestamp = ARGV[4]
+local signal_only = ARGV[5]
+local column_count = tonumber(ARGV[6])
+
+redis.call('HSETNX', key, 'm', model)
+redis.call('HSETNX', key, 'f', filters)
+
+local index = 7
+for _ = 1, column_count do
+    redis.call('HINCRBY', key, 'i+' .. ARGV[index], ARGV[index + 1])
+    index = index + 2
+end
+
+while index <= #ARGV do
+    redis.call('HSET', key, 'e+' .. ARGV[index], ARGV[index + 1])
+    index = index + 2
+end
+
+if signal_only == '1' then
+    redis.call('HSET', key, 's', '1')
+end
+
+redis.call('EXPIRE', key, expire)
+redis.call('ZADD', pending_key, timestamp, key)
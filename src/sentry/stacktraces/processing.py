@@ -1,4 +1,5 @@
 import logging
+import zlib
 from collections import OrderedDict, namedtuple
 from datetime import datetime
 
@@ -7,12 +8,15 @@ from django.utils import timezone
 
 from sentry.models import Project, Release
 from sentry.stacktraces.functions import set_in_app, trim_function_name
+from sentry.utils import json, metrics
 from sentry.utils.cache import cache
 from sentry.utils.hashlib import hash_values
 from sentry.utils.safe import get_path, safe_execute
 
 logger = logging.getLogger(__name__)
 
+FRAME_CACHE_TIMEOUT = 3600
+
 StacktraceInfo = namedtuple(
     "StacktraceInfo", ["stacktrace", "container", "platforms", "is_exception"]
 )
@@ -64,7 +68,7 @@ class ProcessableFrame:
 
     def set_cache_value(self, value):
         if self.cache_key is not None:
-            cache.set(self.cache_key, value, 3600)
+            set_frame_cache_value(self.cache_key, value)
             return True
         return False
 
@@ -73,8 +77,7 @@ class ProcessableFrame:
             self.cache_key = None
             return
 
-        h = hash_values(values, seed=self.processor.__class__.__name__)
-        self.cache_key = rv = "pf:%s" % h
+        self.cache_key = rv = get_frame_cache_key(self.processor, values)
         return rv
 
 
@@ -176,13 +179,11 @@ def find_stacktraces_in_data(data, include_raw=False, with_exceptions=False):
     rv = []
 
     def _report_stack(stacktrace, container, is_exception=False):
-        if not is_exception and (not stacktrace or not get_path(stacktrace, "frames", filter=True)):
+        frames = get_path(stacktrace, "frames", filter=True, default=())
+        if not is_exception and (not stacktrace or not frames):
             return
 
-        platforms = {
-            frame.get("platform") or data.get("platform")
-            for frame in get_path(stacktrace, "frames", filter=True, default=())
-        }
+        platforms = {frame.get("platform") or data.get("platform") for frame in frames}
         rv.append(
             StacktraceInfo(
                 stacktrace=stacktrace,
@@ -236,6 +237,7 @@ def normalize_stacktraces_for_grouping(data, grouping_config=None):
     Applies grouping enhancement rules and ensure in_app is set on all frames.
     This also trims functions if necessary.
     """
+    from sentry.grouping.enhancer.matchers import create_match_frame
 
     stacktraces = []
     stacktrace_exceptions = []
@@ -252,12 +254,14 @@ def normalize_stacktraces_for_grouping(data, grouping_config=None):
         return
 
     platform = data.get("platform")
+    enhancements = grouping_config.enhancements if grouping_config is not None else None
 
-    # Put the trimmed function names into the frames.  We only do this if
-    # the trimming produces a different function than the function we have
-    # otherwise stored in `function` to not make the payload larger
-    # unnecessarily.
+    # Everything that only looks at a single frame is done in one pass over
+    # the frames.  This includes the match frames for the grouping enhancers
+    # which need the trimmed function name computed here.
+    all_match_frames = []
     for frames in stacktraces:
+        match_frames = []
         for frame in frames:
             # Restore the original in_app value before the first grouping
             # enhancers have been run. This allows to re-apply grouping
@@ -266,26 +270,37 @@ def normalize_stacktraces_for_grouping(data, grouping_config=None):
             if orig_in_app is not None:
                 frame["in_app"] = None if orig_in_app == -1 else bool(orig_in_app)
 
-            if frame.get("raw_function") is not None:
-                continue
+            # Put the trimmed function names into the frames.  We only do this
+            # if the trimming produces a different function than the function
+            # we have otherwise stored in `function` to not make the payload
+            # larger unnecessarily.
+            function_name = None
             raw_func = frame.get("function")
-            if not raw_func:
-                continue
-            function_name = trim_function_name(raw_func, frame.get("platform") or platform)
-            if function_name != raw_func:
-                frame["raw_function"] = raw_func
-                frame["function"] = function_name
+            if frame.get("raw_function") is None and raw_func:
+                function_name = trim_function_name(raw_func, frame.get("platform") or platform)
+                if function_name != raw_func:
+                    frame["raw_function"] = raw_func
+                    frame["function"] = function_name
+
+            if enhancements is not None:
+                match_frames.append(create_match_frame(frame, platform, function=function_name))
+            elif frame.get("in_app") is None:
+                # Without enhancers in_app can be normalized right away.
+                set_in_app(frame, False)
+        all_match_frames.append(match_frames)
 
     # If a grouping config is available, run grouping enhancers
-    if grouping_config is not None:
-        for frames, exception_data in zip(stacktraces, stacktrace_exceptions):
-            grouping_config.enhancements.apply_modifications_to_frame(
-                frames, platform, exception_data
+    if enhancements is not None:
+        for frames, match_frames, exception_data in zip(
+            stacktraces, all_match_frames, stacktrace_exceptions
+        ):
+            enhancements.apply_modifications_to_frame(
+                frames, platform, exception_data, match_frames=match_frames
             )
 
-    # normalize in-app
-    for stacktrace in stacktraces:
-        _normalize_in_app(stacktrace)
+        # normalize in-app
+        for stacktrace in stacktraces:
+            _normalize_in_app(stacktrace)
 
 
 def should_process_for_stacktraces(data):
@@ -440,10 +455,44 @@ def get_crash_frame_from_event_data(data, frame_filter=None):
         return default
 
 
+def get_frame_cache_key(processor, values):
+    """Returns the frame cache key of the given values.  The key is specific
+    to the processor, so processors can not see each other's values.
+    """
+    return "pf:%s" % hash_values(values, seed=processor.__class__.__name__)
+
+
+def set_frame_cache_value(key, value):
+    """Stores a JSON serializable value in the frame cache.  Values are kept
+    as compressed JSON, which is a lot smaller than the pickled objects.
+    """
+    cache.set(key, zlib.compress(json.dumps(value).encode("utf-8")), FRAME_CACHE_TIMEOUT)
+
+
 def lookup_frame_cache(keys):
+    """Looks up all given keys in the frame cache at once.  Returns a
+    dictionary of all keys with the cached value or `None` on a miss.
+    """
+    keys = list(keys)
+    if not keys:
+        return {}
+
+    found = cache.get_many(keys)
     rv = {}
     for key in keys:
-        rv[key] = cache.get(key)
+        value = found.get(key)
+        if value is not None:
+            try:
+                value = json.loads(zlib.decompress(value).decode("utf-8"))
+            except (TypeError, ValueError, zlib.error):
+                # Values in an unknown format are treated as a miss and are
+                # overwritten once the frame has been processed.
+                value = None
+        rv[key] = value
+
+    hits = sum(1 for value in rv.values() if value is not None)
+    metrics.incr("stacktraces.frame_cache.hit", amount=hits, skip_internal=True)
+    metrics.incr("stacktraces.frame_cache.miss", amount=len(rv) - hits, skip_internal=True)
     return rv
 
 
@@ -105,6 +105,10 @@ def merge_groups(
             model_list, group, new_group, logger=logger, transaction_id=transaction_id
         )
 
+        # Grouphashes are moved with bulk updates, which do not invalidate
+        # grouphashes cached by event processing.
+        GroupHash.objects.invalidate_cache(group.project_id)
+
         if not has_more:
             # There are no more objects to merge for *this* "from" group, remove it
             # from the list of "from" groups that are being merged, and finish the
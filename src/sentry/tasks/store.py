@@ -125,10 +125,13 @@ def _do_preprocess_event(cache_key, data, start_time, event_id, process_task, pr
 
     from_reprocessing = process_task is process_event_from_reprocessing
 
-    with metrics.timer("tasks.store.preprocess_event.organization.get_from_cache"):
-        project._organization_cache = Organization.objects.get_from_cache(
-            id=project.organization_id
-        )
+    # The ingest consumer passes projects with their organization already
+    # loaded for the entire batch.
+    if getattr(project, "_organization_cache", None) is None:
+        with metrics.timer("tasks.store.preprocess_event.organization.get_from_cache"):
+            project._organization_cache = Organization.objects.get_from_cache(
+                id=project.organization_id
+            )
 
     if should_process_with_symbolicator(data):
         reprocessing2.backup_unprocessed_event(project=project, data=original_data)
@@ -189,7 +192,22 @@ def preprocess_event_from_reprocessing(
     )
 
 
-def _do_symbolicate_event(cache_key, start_time, event_id, symbolicate_task, data=None):
+def _get_symbolication_retry_delay(retry_after, attempt):
+    # Symbolicator's `retry_after` is only a lower bound. Events that are still
+    # pending after a couple of polls usually wait for large downloads, so back
+    # off exponentially up to the maximum delay.
+    return min(max(retry_after or 0, 2 ** attempt), SYMBOLICATOR_MAX_RETRY_AFTER)
+
+
+def _do_symbolicate_event(
+    cache_key,
+    start_time,
+    event_id,
+    symbolicate_task,
+    data=None,
+    symbolication_start_time=None,
+    symbolication_attempt=0,
+):
     from sentry.lang.native.processing import get_symbolication_function
 
     if data is None:
@@ -225,7 +243,11 @@ def _do_symbolicate_event(cache_key, start_time, event_id, symbolicate_task, dat
 
     from_reprocessing = symbolicate_task is symbolicate_event_from_reprocessing
 
-    symbolication_start_time = time()
+    # When polling without blocking the worker, the start time is carried over
+    # from the first attempt so the timeouts below apply to the whole
+    # symbolication.
+    if symbolication_start_time is None:
+        symbolication_start_time = time()
 
     with sentry_sdk.start_span(op="tasks.store.symbolicate_event.symbolication") as span:
         span.set_data("symbolicaton_function", symbolication_function.__name__)
@@ -275,11 +297,29 @@ def _do_symbolicate_event(cache_key, start_time, event_id, symbolicate_task, dat
                         has_changed = True
                         break
                     else:
-                        # sleep for `retry_after` but max 5 seconds and try again
                         metrics.incr(
                             "tasks.store.symbolicate_event.retry",
                             tags={"symbolication_function": symbolication_function.__name__},
                         )
+                        if options.get("symbolicator.non-blocking-polling"):
+                            # Hand the worker back and poll again from a new
+                            # task. Symbolicator remembers the request by its id,
+                            # which is kept in the cache, so the next attempt
+                            # picks up the result.
+                            symbolicate_task.apply_async(
+                                kwargs={
+                                    "cache_key": cache_key,
+                                    "start_time": start_time,
+                                    "event_id": event_id,
+                                    "symbolication_start_time": symbolication_start_time,
+                                    "symbolication_attempt": symbolication_attempt + 1,
+                                },
+                                countdown=_get_symbolication_retry_delay(
+                                    e.retry_after, symbolication_attempt
+                                ),
+                            )
+                            return
+                        # sleep for `retry_after` but max 5 seconds and try again
                         sleep(min(e.retry_after, SYMBOLICATOR_MAX_RETRY_AFTER))
                         continue
                 except Exception:
@@ -323,19 +363,31 @@ def _do_symbolicate_event(cache_key, start_time, event_id, symbolicate_task, dat
     soft_time_limit=settings.SYMBOLICATOR_PROCESS_EVENT_HARD_TIMEOUT + 20,
     acks_late=True,
 )
-def symbolicate_event(cache_key, start_time=None, event_id=None, **kwargs):
+def symbolicate_event(
+    cache_key,
+    start_time=None,
+    event_id=None,
+    symbolication_start_time=None,
+    symbolication_attempt=0,
+    **kwargs,
+):
     """
     Handles event symbolication using the external service: symbolicator.
 
     :param string cache_key: the cache key for the event data
     :param int start_time: the timestamp when the event was ingested
     :param string event_id: the event identifier
+    :param int symbolication_start_time: the timestamp of the first
+        symbolication attempt when polling without blocking the worker
+    :param int symbolication_attempt: the number of previous attempts
     """
     return _do_symbolicate_event(
         cache_key=cache_key,
         start_time=start_time,
         event_id=event_id,
         symbolicate_task=symbolicate_event,
+        symbolication_start_time=symbolication_start_time,
+        symbolication_attempt=symbolication_attempt,
     )
 
 
@@ -346,12 +398,21 @@ def symbolicate_event(cache_key, start_time=None, event_id=None, **kwargs):
     soft_time_limit=settings.SYMBOLICATOR_PROCESS_EVENT_HARD_TIMEOUT + 20,
     acks_late=True,
 )
-def symbolicate_event_from_reprocessing(cache_key, start_time=None, event_id=None, **kwargs):
+def symbolicate_event_from_reprocessing(
+    cache_key,
+    start_time=None,
+    event_id=None,
+    symbolication_start_time=None,
+    symbolication_attempt=0,
+    **kwargs,
+):
     return _do_symbolicate_event(
         cache_key=cache_key,
         start_time=start_time,
         event_id=event_id,
         symbolicate_task=symbolicate_event_from_reprocessing,
+        symbolication_start_time=symbolication_start_time,
+        symbolication_attempt=symbolication_attempt,
     )
 
 
@@ -1,9 +1,14 @@
 import functools
+import threading
+import time
+from collections import OrderedDict
 
 from django.core.cache import cache
 
 default_cache = cache
 
+_missing = object()
+
 
 class memoize:
     """
@@ -72,5 +77,77 @@ class cached_for_request(memoize):
         return functools.partial(self.__call__, obj)
 
 
+class BoundedCache:
+    """
+    A process-local, thread-safe cache with least-recently-used eviction.
+
+    Entries can optionally expire after ``ttl`` seconds, either configured for
+    the entire cache or passed explicitly to ``set``. Lookups of expired
+    entries behave like misses.
+
+    >>> cache = BoundedCache(max_size=100, ttl=60)
+    >>> cache.set('foo', 'bar')
+    >>> cache.get('foo')
+    'bar'
+    """
+
+    def __init__(self, max_size, ttl=None, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _missing) is not _missing
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires_at, value = self._data[key]
+            except KeyError:
+                return default
+
+            if expires_at is not None and expires_at <= self._clock():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def get_many(self, keys):
+        """
+        Returns a dictionary of all keys that are present in the cache.
+        """
+        rv = {}
+        for key in keys:
+            value = self.get(key, _missing)
+            if value is not _missing:
+                rv[key] = value
+        return rv
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        expires_at = self._clock() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
 def cache_key_for_event(data) -> str:
     return "e:{1}:{0}".format(data["project"], data["event_id"])
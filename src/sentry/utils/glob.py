@@ -1,5 +1,10 @@
 import sentry_relay
 
+# Characters that give a pattern glob semantics.  Patterns without any of
+# them match by plain comparison, unless the match is case insensitive or
+# normalizes paths.
+GLOB_SPECIAL_CHARS = frozenset("*?[]{}!\\")
+
 
 def glob_match(
     value, pat, doublestar=False, ignorecase=False, path_normalize=False, allow_newline=True
@@ -13,3 +18,7 @@ def glob_match(
         path_normalize=path_normalize,
         allow_newline=allow_newline,
     )
+
+
+def is_literal_pattern(pattern):
+    return not any(char in GLOB_SPECIAL_CHARS for char in pattern)
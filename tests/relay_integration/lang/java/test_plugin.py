@@ -4,8 +4,11 @@ from io import BytesIO
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 
+from sentry.models import ProjectDebugFile
 from sentry.testutils import RelayStoreHelper, TransactionTestCase
+from sentry.testutils.helpers import override_options
 from sentry.testutils.helpers.datetime import before_now, iso_format
+from sentry.utils.compat import mock
 
 PROGUARD_UUID = "6dc7fdb0-d2fb-4c8e-9d6b-bb1aa98929b1"
 PROGUARD_SOURCE = b"""\
@@ -139,6 +142,83 @@ class BasicResolvingIntegrationTest(RelayStoreHelper, TransactionTestCase):
             "org.slf4j.helpers.Util$ClassContextSecurityManager " "in getExtraClassContext"
         )
 
+    def test_resolving_from_frame_cache(self):
+        url = reverse(
+            "sentry-api-0-dsym-files",
+            kwargs={
+                "organization_slug": self.project.organization.slug,
+                "project_slug": self.project.slug,
+            },
+        )
+
+        self.login_as(user=self.user)
+
+        out = BytesIO()
+        f = zipfile.ZipFile(out, "w")
+        f.writestr("proguard/%s.txt" % PROGUARD_UUID, PROGUARD_SOURCE)
+        f.close()
+
+        response = self.client.post(
+            url,
+            {
+                "file": SimpleUploadedFile(
+                    "symbols.zip", out.getvalue(), content_type="application/zip"
+                )
+            },
+            format="multipart",
+        )
+        assert response.status_code == 201, response.content
+
+        def make_event_data():
+            return {
+                "project": self.project.id,
+                "platform": "java",
+                "debug_meta": {"images": [{"type": "proguard", "uuid": PROGUARD_UUID}]},
+                "exception": {
+                    "values": [
+                        {
+                            "stacktrace": {
+                                "frames": [
+                                    {
+                                        "function": "a",
+                                        "abs_path": None,
+                                        "module": "org.a.b.g$a",
+                                        "filename": None,
+                                        "lineno": 67,
+                                    },
+                                    {"function": "b", "module": "org.a.b.g$a", "lineno": 1},
+                                ]
+                            },
+                            "module": "org.a.b",
+                            "type": "g$a",
+                            "value": "Shit broke yo",
+                        }
+                    ]
+                },
+                "timestamp": iso_format(before_now(seconds=1)),
+            }
+
+        with override_options({"processing.proguard-frame-cache": True}):
+            first_event = self.post_and_retrieve_event(make_event_data())
+
+            # The second event is remapped from the frame cache without
+            # opening the mapping file.
+            with mock.patch.object(
+                ProjectDebugFile.difcache, "fetch_difs", side_effect=AssertionError
+            ):
+                event = self.post_and_retrieve_event(make_event_data())
+
+        for evt in (first_event, event):
+            exc = evt.interfaces["exception"].values[0]
+            frames = exc.stacktrace.frames
+
+            assert exc.type == "Util$ClassContextSecurityManager"
+            assert exc.module == "org.slf4j.helpers"
+            assert frames[0].function == "getClassContext"
+            assert frames[0].module == "org.slf4j.helpers.Util$ClassContextSecurityManager"
+            assert frames[1].function == "b"
+            assert frames[1].module == "org.slf4j.helpers.Util$ClassContextSecurityManager"
+
     def test_resolving_inline(self):
         url = reverse(
             "sentry-api-0-dsym-files",
@@ -1,6 +1,8 @@
 import copy
 
-from sentry.attachments.base import BaseAttachmentCache, CachedAttachment
+import pytest
+
+from sentry.attachments.base import BaseAttachmentCache, CachedAttachment, MissingAttachmentChunks
 
 
 class InMemoryCache:
@@ -110,3 +112,36 @@ def test_basic_rate_limited():
     assert att2.id == att.id == 0
     assert att2.data == att.data == b"Hello World! Bye."
     assert att2.rate_limited is True
+
+
+def test_open_chunked(monkeypatch):
+    monkeypatch.setattr("sentry.attachments.base.ATTACHMENT_SPOOL_MAX_SIZE", 4)
+
+    data = InMemoryCache()
+    cache = BaseAttachmentCache(data)
+
+    cache.set_chunk("c:foo", 123, 0, b"Hello World! ")
+    cache.set_chunk("c:foo", 123, 1, b"")
+    cache.set_chunk("c:foo", 123, 2, b"Bye.")
+
+    att = cache.get_from_chunks("c:foo", id=123, name="lol.txt", chunks=3)
+    with att.open() as fileobj:
+        assert fileobj.read(5) == b"Hello"
+        assert fileobj.read() == b" World! Bye."
+
+
+def test_open_missing_chunks():
+    data = InMemoryCache()
+    cache = BaseAttachmentCache(data)
+
+    cache.set_chunk("c:foo", 123, 0, b"Hello World! ")
+
+    att = cache.get_from_chunks("c:foo", id=123, name="lol.txt", chunks=2)
+    with pytest.raises(MissingAttachmentChunks):
+        att.open()
+
+
+def test_open_unchunked():
+    att = CachedAttachment(name="lol.txt", content_type="text/plain", data=b"Hello World! Bye.")
+    with att.open() as fileobj:
+        assert fileobj.read() == b"Hello World! Bye."
@@ -73,3 +73,48 @@ class BufferTest(TestCase):
         self.buf.process(Group, columns, filters, {"last_seen": the_date}, signal_only=True)
         group.refresh_from_db()
         assert group.times_seen == prev_times_seen
+
+    def test_process_batch(self):
+        project = Project(id=1)
+        groups = [Group.objects.create(project=project) for _ in range(2)]
+        the_date = timezone.now() + timedelta(days=5)
+        items = [
+            (Group, {"times_seen": 1}, {"id": groups[0].id}, {"last_seen": the_date}, None),
+            (Group, {"times_seen": 3}, {"id": groups[1].id}, {"last_seen": the_date}, None),
+            # Does not exist yet and is created
+            (Group, {"times_seen": 1}, {"message": "foo bar", "project_id": 1}, {}, None),
+        ]
+
+        with mock.patch("sentry.buffer.base.buffer_incr_complete") as signal, mock.patch.object(
+            self.buf, "process", wraps=self.buf.process
+        ) as process:
+            self.buf.process_batch(items)
+
+        process.assert_called_once_with(
+            Group, {"times_seen": 1}, {"message": "foo bar", "project_id": 1}, {}
+        )
+        assert signal.send_robust.call_count == 3
+
+        for group, times_seen in zip(groups, (1, 3)):
+            group_ = Group.objects.get(id=group.id)
+            assert group_.times_seen == group.times_seen + times_seen
+            assert group_.last_seen == the_date
+            assert group_.score != group.score
+        assert Group.objects.get(message="foo bar").times_seen == 2
+
+    def test_process_batch_update_fails(self):
+        project = Project(id=1)
+        groups = [Group.objects.create(project=project) for _ in range(2)]
+        items = [
+            (Group, {"times_seen": 1}, {"id": groups[0].id}, {}, None),
+            (Group, {"times_seen": 3}, {"id": groups[1].id}, {}, None),
+        ]
+
+        with mock.patch.object(
+            self.buf, "_update_many", side_effect=Exception("boom")
+        ), mock.patch.object(self.buf, "process", wraps=self.buf.process) as process:
+            self.buf.process_batch(items)
+
+        assert process.call_count == 2
+        for group, times_seen in zip(groups, (1, 3)):
+            assert Group.objects.get(id=group.id).times_seen == group.times_seen + times_seen
@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from sentry.buffer.inprocess import InProcessBuffer
+from sentry.models import Group, Project
+from sentry.testutils import TestCase
+from sentry.utils.compat import mock
+
+
+class InProcessBufferTest(TestCase):
+    def test_incr_processes_immediately(self):
+        buf = InProcessBuffer()
+        group = Group.objects.create(project=Project(id=1))
+        buf.incr(Group, {"times_seen": 1}, {"id": group.id})
+        assert Group.objects.get(id=group.id).times_seen == group.times_seen + 1
+
+    def test_incr_accumulates(self):
+        buf = InProcessBuffer(flush_interval=60)
+        groups = [Group.objects.create(project=Project(id=1)) for _ in range(2)]
+        the_date = timezone.now() + timedelta(days=5)
+
+        buf.incr(Group, {"times_seen": 1}, {"id": groups[0].id})
+        buf.incr(Group, {"times_seen": 2}, {"id": groups[0].id}, {"last_seen": the_date})
+        buf.incr(Group, {"times_seen": 1}, {"id": groups[1].id}, {"last_seen": the_date})
+        for group in groups:
+            assert Group.objects.get(id=group.id).times_seen == group.times_seen
+
+        # Both groups share a batch and are written with a single UPDATE
+        with mock.patch.object(buf, "_update_many", wraps=buf._update_many) as update_many:
+            buf.flush()
+        assert update_many.call_count == 1
+        for group, times_seen in zip(groups, (3, 1)):
+            group_ = Group.objects.get(id=group.id)
+            assert group_.times_seen == group.times_seen + times_seen
+            assert group_.last_seen == the_date
+
+        # Nothing is left to flush
+        buf.flush()
+        assert Group.objects.get(id=groups[0].id).times_seen == groups[0].times_seen + 3
+
+    def test_flush_update_fails(self):
+        buf = InProcessBuffer(flush_interval=60)
+        groups = [Group.objects.create(project=Project(id=1)) for _ in range(2)]
+
+        for group in groups:
+            buf.incr(Group, {"times_seen": 2}, {"id": group.id})
+
+        with mock.patch.object(buf, "_update_many", side_effect=Exception("boom")):
+            buf.flush()
+
+        for group in groups:
+            assert Group.objects.get(id=group.id).times_seen == group.times_seen + 2
@@ -1,12 +1,16 @@
+import os
 import pickle
 from datetime import datetime
 
+import pytest
+from celery.signals import worker_process_shutdown
 from django.utils import timezone
 from django.utils.encoding import force_text
 
 from sentry.buffer.redis import RedisBuffer
 from sentry.models import Group, Project
 from sentry.testutils import TestCase
+from sentry.testutils.helpers import override_options
 from sentry.utils.compat import mock
 
 
@@ -66,6 +70,60 @@ class RedisBufferTest(TestCase):
         self.buf.process("foo")
         process.assert_called_once_with(Group, columns, filters, extra, signal_only)
 
+    @mock.patch("sentry.buffer.base.Buffer.process_batch")
+    def test_process_batch(self, process_batch):
+        client = self.buf.cluster.get_routing_client()
+        for key, group_id in (("foo", "1"), ("bar", "2")):
+            client.hmset(
+                key,
+                {
+                    "e+foo": '["s","bar"]',
+                    "f": '{"pk": ["i","%s"]}' % group_id,
+                    "i+times_seen": "2",
+                    "m": "sentry.models.Group",
+                },
+            )
+            client.zadd("b:p", {key: 1})
+        # Locked by another worker
+        client.set("l:baz", "1")
+
+        with override_options({"buffer.redis-batch-process": True}):
+            self.buf.process(batch_keys=["foo", "bar", "baz"])
+
+        process_batch.assert_called_once_with(
+            [
+                (Group, {"times_seen": 2}, {"pk": 1}, {"foo": "bar"}, None),
+                (Group, {"times_seen": 2}, {"pk": 2}, {"foo": "bar"}, None),
+            ]
+        )
+        assert client.zrange("b:p", 0, -1) == []
+        assert not client.exists("foo", "bar", "l:foo", "l:bar")
+        assert client.exists("l:baz")
+
+    @mock.patch("sentry.buffer.base.Buffer._update_many", side_effect=Exception("boom"))
+    def test_process_batch_update_fails(self, update_many):
+        project = Project(id=1)
+        groups = [Group.objects.create(project=project) for _ in range(2)]
+        client = self.buf.cluster.get_routing_client()
+        for key, group in (("foo", groups[0]), ("bar", groups[1])):
+            client.hmset(
+                key,
+                {
+                    "f": '{"pk": ["i","%s"]}' % group.id,
+                    "i+times_seen": "2",
+                    "m": "sentry.models.Group",
+                },
+            )
+            client.zadd("b:p", {key: 1})
+
+        with override_options({"buffer.redis-batch-process": True}):
+            self.buf.process(batch_keys=["foo", "bar"])
+
+        assert update_many.call_count == 1
+        for group in groups:
+            assert Group.objects.get(id=group.id).times_seen == group.times_seen + 2
+        assert not client.exists("foo", "bar", "l:foo", "l:bar")
+
     @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
     @mock.patch("sentry.buffer.base.Buffer.process")
     def test_process_does_bubble_up_pickle(self, process):
@@ -121,6 +179,162 @@ class RedisBufferTest(TestCase):
         pending = client.zrange("b:p", 0, -1)
         assert pending == [b"foo"]
 
+    @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
+    @mock.patch("sentry.buffer.base.Buffer.process")
+    def test_incr_saves_json_to_redis(self, process):
+        now = datetime(2017, 5, 3, 6, 6, 6, tzinfo=timezone.utc)
+        client = self.buf.cluster.get_routing_client()
+        columns = {"times_seen": 1}
+        filters = {"id": 1}
+        extra = {
+            "last_seen": now,
+            "score": object(),
+            "data": {"type": "error", "metadata": {"value": "foo"}},
+            "level": 40,
+            "message": "foo",
+        }
+        with override_options({"buffer.redis-json-encoding": True}):
+            self.buf.incr(Group, columns, filters, extra=extra)
+
+        result = client.hgetall("foo")
+        result = {force_text(k): v for k, v in result.items()}
+        assert result == {
+            "e+data": b'["j","{\\"type\\":\\"error\\",\\"metadata\\":{\\"value\\":\\"foo\\"}}"]',
+            "e+last_seen": b'["d","1493791566.000000"]',
+            "e+level": b'["i","40"]',
+            "e+message": b'["s","foo"]',
+            "f": b'{"id":["i","1"]}',
+            "i+times_seen": b"1",
+            "m": b"sentry.models.group.Group",
+        }
+        assert client.zrange("b:p", 0, -1) == [b"foo"]
+
+        # The score is recomputed from last_seen and times_seen.
+        del extra["score"]
+        self.buf.process("foo")
+        process.assert_called_once_with(Group, columns, filters, extra, None)
+
+    @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
+    def test_incr_coalesces(self):
+        buf = RedisBuffer(incr_coalesce_window=60)
+        client = buf.cluster.get_routing_client()
+        model = mock.Mock()
+        model.__name__ = "Mock"
+        filters = {"pk": 1}
+        buf.incr(model, {"times_seen": 1}, filters, extra={"foo": "bar"})
+        buf.incr(model, {"times_seen": 2, "users": 1}, filters, extra={"foo": "baz"})
+        buf.incr(model, {"times_seen": 1}, filters, signal_only=True)
+        assert client.hgetall("foo") == {}
+
+        buf._flush_local_buffers()
+        result = client.hgetall("foo")
+        result = {force_text(k): v for k, v in result.items()}
+        assert pickle.loads(result.pop("f")) == filters
+        assert pickle.loads(result.pop("e+foo")) == "baz"
+        assert result == {
+            "i+times_seen": b"4",
+            "i+users": b"1",
+            "m": b"mock.mock.Mock",
+            "s": b"1",
+        }
+        assert client.zrange("b:p", 0, -1) == [b"foo"]
+
+    @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
+    def test_incr_coalesce_flushes_on_worker_shutdown(self):
+        buf = RedisBuffer(incr_coalesce_window=60)
+        client = buf.cluster.get_routing_client()
+        buf.incr(Group, {"times_seen": 1}, {"pk": 1})
+        assert client.hgetall("foo") == {}
+
+        worker_process_shutdown.send(sender=None)
+        assert client.hget("foo", "i+times_seen") == b"1"
+
+    @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
+    def test_incr_coalesce_resets_after_fork(self):
+        buf = RedisBuffer(incr_coalesce_window=60)
+        client = buf.cluster.get_routing_client()
+        buf.incr(Group, {"times_seen": 1}, {"pk": 1})
+
+        with mock.patch("sentry.buffer.redis.os.getpid", return_value=os.getpid() + 1):
+            # The increments of the parent are not sent by the child
+            buf._flush_local_buffers()
+            assert client.hgetall("foo") == {}
+
+            buf.incr(Group, {"times_seen": 2}, {"pk": 1})
+            buf._flush_local_buffers()
+            assert client.hget("foo", "i+times_seen") == b"2"
+
+    @mock.patch("sentry.buffer.redis.metrics")
+    @mock.patch("sentry.buffer.redis.process_incr")
+    def test_process_pending_in_chunks(self, process_incr, metrics):
+        self.buf.incr_batch_size = 2
+        with self.buf.cluster.map() as client:
+            client.zadd("b:p", {"foo": 1, "bar": 2, "baz": 3})
+
+        with override_options({"buffer.redis-pending-chunk-size": 2}):
+            self.buf.process_pending()
+
+        assert process_incr.apply_async.mock_calls == [
+            mock.call(kwargs={"batch_keys": ["foo", "bar"]}),
+            mock.call(kwargs={"batch_keys": ["baz"]}),
+        ]
+        client = self.buf.cluster.get_routing_client()
+        assert client.zrange("b:p", 0, -1) == []
+
+        metrics.timing.assert_any_call("buffer.pending-size", 3)
+        (lag,) = [
+            args[1] for _, args, _ in metrics.timing.mock_calls if args[0] == "buffer.pending-lag"
+        ]
+        assert lag > 1000
+
+    @mock.patch("sentry.buffer.redis.process_incr")
+    def test_process_pending_in_chunks_dispatch_fails(self, process_incr):
+        process_incr.apply_async.side_effect = [None, Exception("broker down")]
+        self.buf.incr_batch_size = 2
+        with self.buf.cluster.map() as client:
+            client.zadd("b:p", {"foo": 1, "bar": 2, "baz": 3})
+
+        with override_options({"buffer.redis-pending-chunk-size": 2}):
+            with pytest.raises(Exception):
+                self.buf.process_pending()
+
+        # Only the keys that were queued up are removed
+        client = self.buf.cluster.get_routing_client()
+        assert client.zrange("b:p", 0, -1) == [b"baz"]
+
+    @mock.patch("sentry.buffer.redis.process_incr")
+    def test_process_pending_in_chunks_smaller_than_batch(self, process_incr):
+        process_incr.apply_async.side_effect = [None, Exception("broker down")]
+        self.buf.incr_batch_size = 2
+        with self.buf.cluster.map() as client:
+            client.zadd("b:p", {"foo": 1, "bar": 2, "baz": 3})
+
+        with override_options({"buffer.redis-pending-chunk-size": 1}):
+            with pytest.raises(Exception):
+                self.buf.process_pending()
+
+        # Batches are filled across chunks
+        assert process_incr.apply_async.mock_calls == [
+            mock.call(kwargs={"batch_keys": ["foo", "bar"]}),
+            mock.call(kwargs={"batch_keys": ["baz"]}),
+        ]
+        client = self.buf.cluster.get_routing_client()
+        assert client.zrange("b:p", 0, -1) == [b"baz"]
+
+    @mock.patch("sentry.buffer.redis.metrics")
+    @mock.patch("sentry.buffer.redis.process_incr")
+    def test_process_pending_lag(self, process_incr, metrics):
+        with self.buf.cluster.map() as client:
+            client.zadd("b:p", {"foo": 1, "bar": 2})
+
+        self.buf.process_pending()
+
+        metrics.timing.assert_any_call("buffer.pending-size", 2)
+        (lag,) = [
+            args[1] for _, args, _ in metrics.timing.mock_calls if args[0] == "buffer.pending-lag"
+        ]
+        assert lag > 1000
+
     @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
     @mock.patch("sentry.buffer.redis.process_incr")
     @mock.patch("sentry.buffer.redis.process_pending")
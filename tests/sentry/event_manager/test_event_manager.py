@@ -40,6 +40,7 @@ from sentry.models import (
     UserReport,
 )
 from sentry.testutils import TestCase, assert_mock_called_once_with_partial
+from sentry.testutils.helpers import override_options
 from sentry.utils.cache import cache_key_for_event
 from sentry.utils.compat import mock
 from sentry.utils.outcomes import Outcome
@@ -234,6 +235,25 @@ class EventManagerTest(TestCase):
         assert group.last_seen == event.datetime
         assert group.message == event2.message
 
+    @override_options({"store.grouphash-cache-ttl": 60})
+    def test_grouphash_cache_with_deleted_group(self):
+        def save_event():
+            manager = EventManager(make_event(message="foo", fingerprint=["a" * 32]))
+            manager.normalize()
+            return manager.save(1)
+
+        # The second event caches the grouphash with its group
+        group_id = save_event().group_id
+        assert save_event().group_id == group_id
+
+        # Bulk deletions bypass the invalidation of the cache
+        GroupHash.objects.filter(group_id=group_id)._raw_delete(GroupHash.objects.db)
+        Group.objects.filter(id=group_id)._raw_delete(Group.objects.db)
+
+        group_id_2 = save_event().group_id
+        assert group_id_2 != group_id
+        assert Group.objects.filter(id=group_id_2).exists()
+
     def test_differentiates_with_fingerprint(self):
         manager = EventManager(
             make_event(message="foo", event_id="a" * 32, fingerprint=["{{ default }}", "a" * 32])
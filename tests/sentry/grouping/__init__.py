@@ -24,6 +24,20 @@ class GroupingInput:
             return json.load(f)
 
     def create_event(self, grouping_config):
+        data = self.normalize(grouping_config)
+
+        # Normalize the stacktrace for grouping.  This normally happens in
+        # save()
+        normalize_stacktraces_for_grouping(data, load_grouping_config(grouping_config))
+        evt = eventstore.create_event(data=data)
+
+        return evt
+
+    def normalize(self, grouping_config):
+        """Normalizes the input like ingestion does.  Stacktraces are not
+        normalized for grouping yet.  Custom enhancements of the input are
+        written into `grouping_config`.
+        """
         grouping_input = dict(self.data)
         # Customize grouping config from the _grouping config
         grouping_info = grouping_input.pop("_grouping", None) or {}
@@ -36,14 +50,7 @@ class GroupingInput:
         # Normalize the event
         mgr = EventManager(data=grouping_input, grouping_config=grouping_config)
         mgr.normalize()
-        data = mgr.get_data()
-
-        # Normalize the stacktrace for grouping.  This normally happens in
-        # save()
-        normalize_stacktraces_for_grouping(data, load_grouping_config(grouping_config))
-        evt = eventstore.create_event(data=data)
-
-        return evt
+        return mgr.get_data()
 
 
 grouping_input = list(
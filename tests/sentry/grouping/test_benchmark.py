@@ -1,11 +1,38 @@
+"""Benchmarks of the grouping pipeline over the grouping and fingerprinting
+snapshot inputs.
+
+Every stage of the pipeline is benchmarked separately for every grouping
+config.  A round processes the entire corpus, the number of events per round
+and the peak memory allocated by a round are recorded as extra info.  Run
+with ``--benchmark-json`` to get machine readable results that can be
+compared against a baseline with ``pytest-benchmark compare``.
+"""
+
+import copy
+import tracemalloc
+
 import pytest
 
-from sentry.grouping.api import get_default_grouping_config_dict
+from sentry import eventstore
+from sentry.grouping.api import (
+    apply_server_fingerprinting,
+    get_default_grouping_config_dict,
+    get_grouping_variants_for_event,
+    load_grouping_config,
+)
 from sentry.grouping.strategies.configurations import CONFIGURATIONS
+from sentry.stacktraces.processing import (
+    find_stacktraces_in_data,
+    normalize_stacktraces_for_grouping,
+)
+from sentry.utils.safe import get_path
+from tests.sentry.grouping import fingerprint_input as fingerprint_inputs
 from tests.sentry.grouping import grouping_input as grouping_inputs
 
 CONFIGS = {key: get_default_grouping_config_dict(key) for key in sorted(CONFIGURATIONS.keys())}
 
+ROUNDS = 5
+
 
 def benchmark_available():
     try:
@@ -16,16 +43,23 @@ def benchmark_available():
         return True
 
 
-@pytest.mark.skipif(not benchmark_available(), reason="requires pytest-benchmark")
-@pytest.mark.parametrize(
+requires_benchmark = pytest.mark.skipif(
+    not benchmark_available(), reason="requires pytest-benchmark"
+)
+
+with_config_name = pytest.mark.parametrize(
     "config_name", sorted(CONFIGURATIONS.keys()), ids=lambda x: x.replace("-", "_")
 )
+
+
+@requires_benchmark
+@with_config_name
 def test_benchmark_grouping(config_name, benchmark):
     config = CONFIGS[config_name]
     input_iter = iter(grouping_inputs)
 
     def setup():
-        return (next(input_iter), config), {}
+        return (next(input_iter), dict(config)), {}
 
     benchmark.pedantic(run_configuration, setup=setup, rounds=len(grouping_inputs))
 
@@ -37,3 +71,119 @@ def run_configuration(grouping_input, config):
     event.project = None
 
     event.get_hashes()
+
+
+def prepare_corpus(config_name):
+    """Normalizes all grouping inputs once.  Returns a list of normalized
+    event data and the loaded grouping config of every input.
+    """
+    rv = []
+    for grouping_input in grouping_inputs:
+        grouping_config = dict(CONFIGS[config_name])
+        data = grouping_input.normalize(grouping_config)
+        rv.append((data, load_grouping_config(grouping_config)))
+    return rv
+
+
+def benchmark_stage(benchmark, stage, setup):
+    """Times `stage` on the arguments returned by `setup`, which is called
+    before every round and not timed.
+    """
+    args = setup()
+    benchmark.extra_info["events"] = len(args[0])
+
+    tracemalloc.start()
+    try:
+        stage(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    benchmark.extra_info["peak_allocated_bytes"] = peak
+
+    benchmark.pedantic(stage, setup=lambda: (setup(), {}), rounds=ROUNDS)
+
+
+@requires_benchmark
+@with_config_name
+def test_benchmark_normalize_stacktraces(config_name, benchmark):
+    corpus = prepare_corpus(config_name)
+
+    def setup():
+        return ([(copy.deepcopy(data), config) for data, config in corpus],)
+
+    def stage(items):
+        for data, config in items:
+            normalize_stacktraces_for_grouping(data, config)
+
+    benchmark_stage(benchmark, stage, setup)
+
+
+@requires_benchmark
+@with_config_name
+def test_benchmark_apply_modifications_to_frame(config_name, benchmark):
+    corpus = []
+    for data, config in prepare_corpus(config_name):
+        # Trims function names and normalizes in_app like the grouping
+        # normalization does before running the enhancements.
+        normalize_stacktraces_for_grouping(data)
+        corpus.append((data, config))
+
+    def setup():
+        items = []
+        for data, config in corpus:
+            data = copy.deepcopy(data)
+            for info in find_stacktraces_in_data(data, include_raw=True):
+                frames = get_path(info.stacktrace, "frames", filter=True, default=())
+                if frames:
+                    items.append(
+                        (
+                            config.enhancements,
+                            frames,
+                            data.get("platform"),
+                            info.container if info.is_exception else None,
+                        )
+                    )
+        return (items,)
+
+    def stage(items):
+        for enhancements, frames, platform, exception_data in items:
+            enhancements.apply_modifications_to_frame(frames, platform, exception_data)
+
+    benchmark_stage(benchmark, stage, setup)
+
+
+@requires_benchmark
+@with_config_name
+def test_benchmark_grouping_variants(config_name, benchmark):
+    corpus = []
+    for data, config in prepare_corpus(config_name):
+        normalize_stacktraces_for_grouping(data, config)
+        corpus.append((data, config))
+
+    def setup():
+        # Events memoize their interfaces, so every round gets fresh ones.
+        return ([(eventstore.create_event(data=data), config) for data, config in corpus],)
+
+    def stage(items):
+        for event, config in items:
+            for variant in get_grouping_variants_for_event(event, config).values():
+                variant.get_hash()
+
+    benchmark_stage(benchmark, stage, setup)
+
+
+@requires_benchmark
+def test_benchmark_apply_server_fingerprinting(benchmark):
+    corpus = []
+    for fingerprint_input in fingerprint_inputs:
+        config, event = fingerprint_input.create_event()
+        corpus.append((event.data.data, config))
+
+    def setup():
+        return ([(copy.deepcopy(data), config) for data, config in corpus],)
+
+    def stage(items):
+        for data, config in items:
+            apply_server_fingerprinting(data, config)
+
+    benchmark_stage(benchmark, stage, setup)
@@ -0,0 +1,38 @@
+from sentry.grouping.component import GroupingComponent
+from sentry.grouping.utils import hash_from_values
+
+
+def test_get_hash():
+    component = GroupingComponent(
+        id="stacktrace",
+        values=[
+            GroupingComponent(
+                id="frame", values=["a", GroupingComponent(id="function", values=["b"])]
+            ),
+            GroupingComponent(id="frame", values=["c"], contributes=False),
+            GroupingComponent(id="frame", values=[GroupingComponent(id="module", values=[])]),
+            "d",
+        ],
+    )
+    assert component.get_hash() == hash_from_values(component.iter_values())
+    assert component.get_hash() == hash_from_values(["a", "b", "d"])
+
+    component.update(contributes=False)
+    assert component.get_hash() is None
+
+
+def test_lazy_hint():
+    calls = []
+
+    def get_hint():
+        calls.append(1)
+        return "ignored by stack trace rule"
+
+    component = GroupingComponent(id="frame", values=["a"])
+    component.update(contributes=False, hint=get_hint)
+    assert component.get_hash() is None
+    assert not calls
+
+    assert component.hint == "ignored by stack trace rule"
+    assert component.as_dict()["hint"] == "ignored by stack trace rule"
+    assert len(calls) == 1
@@ -1,6 +1,14 @@
 import pytest
 
-from sentry.grouping.enhancer import Enhancements, InvalidEnhancerConfig, create_match_frame
+from sentry.grouping.enhancer import (
+    Enhancements,
+    InvalidEnhancerConfig,
+    Rule,
+    _candidate_rules_cache,
+    _frame_rules_cache,
+    create_match_frame,
+)
+from sentry.utils.compat import mock
 
 
 def dump_obj(obj):
@@ -152,6 +160,55 @@ def test_family_matching():
     assert bool(_get_matching_frame_actions(native_rule, [{"function": "std::whatever"}], "native"))
 
 
+def test_family_prefilter():
+    enhancement = Enhancements.from_config_string(
+        """
+        family:javascript path:**/test.js              +app
+        family:native function:std::*                  -app
+        family:native,javascript function:main         +app
+        !family:native function:foo                    +app
+        function:bar                                   +app
+    """
+    )
+    js_rule, native_rule, any_rule, negated_rule, plain_rule = enhancement.rules
+
+    assert js_rule.families == {b"javascript"}
+    assert native_rule.families == {b"native"}
+    assert any_rule.families == {b"native", b"javascript"}
+    assert negated_rule.families is None
+    assert plain_rule.families is None
+
+    match_frames = [create_match_frame({"function": "foo"}, "javascript")]
+    assert [
+        rule
+        for _, rule in enhancement._get_candidate_rules(enhancement._updater_rules, match_frames)
+    ] == [js_rule, any_rule, negated_rule, plain_rule]
+
+    # Frames of other families are skipped without evaluating the rule
+    assert _get_matching_frame_actions(
+        any_rule, [{"function": "main", "platform": "native"}, {"function": "main"}], "python"
+    ) == [(0, any_rule.actions[0])]
+
+
+def test_literal_matching():
+    enhancement = Enhancements.from_config_string(
+        """
+        function:main              +app
+        module:foo.bar             +app
+        function:ma?n              +app
+    """
+    )
+    function_rule, module_rule, glob_rule = enhancement.rules
+
+    assert _get_matching_frame_actions(function_rule, [{"function": "main"}], "python")
+    assert not _get_matching_frame_actions(function_rule, [{"function": "main2"}], "python")
+    assert not _get_matching_frame_actions(function_rule, [{"function": "Main"}], "python")
+    assert _get_matching_frame_actions(module_rule, [{"module": "foo.bar"}], "python")
+    assert not _get_matching_frame_actions(module_rule, [{"module": "foo.baz"}], "python")
+    assert not _get_matching_frame_actions(module_rule, [{}], "python")
+    assert _get_matching_frame_actions(glob_rule, [{"function": "main"}], "python")
+
+
 def test_app_matching():
     enhancement = Enhancements.from_config_string(
         """
@@ -400,3 +457,73 @@ def test_range_matching_direct():
         ],
         "python",
     )
+
+
+def test_frame_rules_cache():
+    _frame_rules_cache.clear()
+
+    def apply(config):
+        frames = [{"function": "main"}, {"function": "std::whatever"}]
+        enhancement = Enhancements.loads(Enhancements.from_config_string(config).dumps())
+        enhancement.apply_modifications_to_frame(frames, "native", None)
+        return [frame.get("in_app") for frame in frames]
+
+    with mock.patch("sentry.grouping.enhancer.metrics") as metrics:
+        assert apply("function:std::* -app") == [None, False]
+        assert metrics.incr.call_args_list[0] == mock.call(
+            "grouping.enhancer.frame_cache.hit", amount=0, skip_internal=True
+        )
+
+    with mock.patch("sentry.grouping.enhancer.metrics") as metrics:
+        assert apply("function:std::* -app") == [None, False]
+        assert metrics.incr.call_args_list[0] == mock.call(
+            "grouping.enhancer.frame_cache.hit", amount=2, skip_internal=True
+        )
+
+    # A changed config does not reuse the results of the previous one
+    assert apply("function:main +app") == [True, None]
+
+
+def test_candidate_rules_cache():
+    _candidate_rules_cache.clear()
+    config = Enhancements.from_config_string(
+        """
+        family:javascript path:**/test.js              +app
+        family:native function:std::*                  -app
+        function:bar                                   +app
+    """
+    ).dumps()
+    match_frames = [create_match_frame({"function": "foo"}, "javascript")]
+
+    enhancement = Enhancements.loads(config)
+    assert [
+        rule
+        for _, rule in enhancement._get_candidate_rules(enhancement._updater_rules, match_frames)
+    ] == [enhancement.rules[0], enhancement.rules[2]]
+
+    # Another instance of the same config reuses the result without looking at
+    # the families of its rules, but gets its own rules
+    enhancement = Enhancements.loads(config)
+    with mock.patch.object(Rule, "families", new_callable=mock.PropertyMock) as families:
+        assert [
+            rule
+            for _, rule in enhancement._get_candidate_rules(
+                enhancement._updater_rules, match_frames
+            )
+        ] == [enhancement.rules[0], enhancement.rules[2]]
+    assert not families.called
+    assert len(_candidate_rules_cache) == 1
+
+
+def test_frame_rules_cache_sees_modifications():
+    enhancement = Enhancements.from_config_string(
+        """
+        function:foo +app
+        app:yes category=app
+        """
+    )
+    frames = [{"function": "foo"}, {"function": "bar"}]
+    enhancement.apply_modifications_to_frame(frames, "native", None)
+
+    assert frames[0]["data"]["category"] == "app"
+    assert "data" not in frames[1]
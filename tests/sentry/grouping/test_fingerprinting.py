@@ -157,6 +157,31 @@ app:true                                        -> {{ default }}
     )
 
 
+def test_literal_matching():
+    rules = FingerprintingRules.from_config_string(
+        """
+function:Assert tags.server:web-1                  -> assert-web
+function:assert                                    -> assert
+level:ERROR                                        -> error
+"""
+    )
+
+    def get_fingerprint(event):
+        rv = rules.get_fingerprint_values_for_event(event)
+        return rv and rv[1]
+
+    frames = {"frames": [{"function": "main"}, {"function": "assert"}]}
+    event = {"platform": "python", "stacktrace": frames, "tags": [["server", "web-1"]]}
+    assert get_fingerprint(event) == ["assert"]
+
+    frames["frames"][1]["function"] = "Assert"
+    assert get_fingerprint(event) == ["assert-web"]
+
+    # Literal patterns still obey the case insensitivity of their key.
+    event = {"platform": "python", "level": "error"}
+    assert get_fingerprint(event) == ["error"]
+
+
 @with_fingerprint_input("input")
 def test_event_hash_variant(insta_snapshot, input):
     config, evt = input.create_event()
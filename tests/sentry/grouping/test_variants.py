@@ -51,6 +51,16 @@ def dump_variant(variant, lines=None, indent=0):
     return lines
 
 
+def dump_variants(variants):
+    rv = []
+    for (key, value) in sorted(variants.items()):
+        if rv:
+            rv.append("-" * 74)
+        rv.append("%s:" % key)
+        dump_variant(value, rv, 1)
+    return "\n".join(rv)
+
+
 @with_grouping_input("grouping_input")
 @pytest.mark.parametrize("config_name", CONFIGURATIONS.keys(), ids=lambda x: x.replace("-", "_"))
 def test_event_hash_variant(config_name, grouping_input, insta_snapshot, log):
@@ -61,15 +71,24 @@ def test_event_hash_variant(config_name, grouping_input, insta_snapshot, log):
     # break stuff later on.
     evt.project = None
 
-    rv = []
-    for (key, value) in sorted(evt.get_grouping_variants().items()):
-        if rv:
-            rv.append("-" * 74)
-        rv.append("%s:" % key)
-        dump_variant(value, rv, 1)
-    output = "\n".join(rv)
+    output = dump_variants(evt.get_grouping_variants())
     log(repr(evt.get_hashes()))
 
     assert evt.get_grouping_config() == grouping_config
 
     insta_snapshot(output)
+
+
+@with_grouping_input("grouping_input")
+def test_shared_component_cache(grouping_input):
+    # A single cache is shared by all configs, just like the primary,
+    # secondary and background grouping of an event share one.
+    cache = {}
+    for config_name in sorted(CONFIGURATIONS):
+        grouping_config = get_default_grouping_config_dict(config_name)
+        evt = grouping_input.create_event(grouping_config)
+        evt.project = None
+
+        expected = dump_variants(evt.get_grouping_variants())
+        assert dump_variants(evt.get_grouping_variants(cache=cache)) == expected
+        assert dump_variants(evt.get_grouping_variants(cache=cache)) == expected
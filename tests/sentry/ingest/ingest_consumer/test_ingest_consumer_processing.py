@@ -1,10 +1,18 @@
+import os
 import time
 import uuid
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
 
+import msgpack
 import pytest
+from django.core.cache import cache
 
 from sentry.event_manager import EventManager
 from sentry.ingest.ingest_consumer import (
+    IngestBatchContext,
+    IngestConsumerWorker,
+    _flush_raw_batch,
     process_attachment_chunk,
     process_event,
     process_individual_attachment,
@@ -47,7 +55,7 @@ def test_deduplication_works(default_project, task_runner, preprocess_event):
                 "project_id": project_id,
                 "remote_addr": "127.0.0.1",
             },
-            projects={default_project.id: default_project},
+            context=IngestBatchContext({default_project.id: default_project}),
         )
 
     (kwargs,) = preprocess_event
@@ -80,7 +88,7 @@ def test_with_attachments(default_project, task_runner, missing_chunks, monkeypa
                 "id": attachment_id,
                 "chunk_index": 0,
             },
-            projects={default_project.id: default_project},
+            context=IngestBatchContext({default_project.id: default_project}),
         )
 
         process_attachment_chunk(
@@ -91,7 +99,7 @@ def test_with_attachments(default_project, task_runner, missing_chunks, monkeypa
                 "id": attachment_id,
                 "chunk_index": 1,
             },
-            projects={default_project.id: default_project},
+            context=IngestBatchContext({default_project.id: default_project}),
         )
 
     with task_runner():
@@ -112,7 +120,7 @@ def test_with_attachments(default_project, task_runner, missing_chunks, monkeypa
                     }
                 ],
             },
-            projects={default_project.id: default_project},
+            context=IngestBatchContext({default_project.id: default_project}),
         )
 
     persisted_attachments = list(
@@ -166,7 +174,7 @@ def test_individual_attachments(
                 "id": attachment_id,
                 "chunk_index": i,
             },
-            projects={default_project.id: default_project},
+            context=IngestBatchContext({default_project.id: default_project}),
         )
 
     process_individual_attachment(
@@ -182,7 +190,7 @@ def test_individual_attachments(
             "event_id": event_id,
             "project_id": project_id,
         },
-        projects={default_project.id: default_project},
+        context=IngestBatchContext({default_project.id: default_project}),
     )
 
     attachments = list(EventAttachment.objects.filter(project_id=project_id, event_id=event_id))
@@ -234,7 +242,7 @@ def test_userreport(default_project, monkeypatch):
             ),
             "project_id": default_project.id,
         },
-        projects={default_project.id: default_project},
+        context=IngestBatchContext({default_project.id: default_project}),
     )
 
     (report,) = UserReport.objects.all()
@@ -268,7 +276,7 @@ def test_userreport_reverse_order(default_project, monkeypatch):
             ),
             "project_id": default_project.id,
         },
-        projects={default_project.id: default_project},
+        context=IngestBatchContext({default_project.id: default_project}),
     )
 
     mgr = EventManager(data={"event_id": event_id, "user": {"email": "markus+dontatme@sentry.io"}})
@@ -306,9 +314,148 @@ def test_individual_attachments_missing_chunks(default_project, factories, monke
             "event_id": event_id,
             "project_id": project_id,
         },
-        projects={default_project.id: default_project},
+        context=IngestBatchContext({default_project.id: default_project}),
     )
 
     attachments = list(EventAttachment.objects.filter(project_id=project_id, event_id=event_id))
 
     assert not attachments
+
+
+class FakeKafkaMessage:
+    def __init__(self, topic, partition, value):
+        self._topic = topic
+        self._partition = partition
+        self._value = value
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return self._partition
+
+    def value(self):
+        return self._value
+
+
+class FakeProcessPoolExecutor:
+    """
+    Runs batches synchronously in the test process, while recording which
+    partitions' messages were routed to which pool.
+    """
+
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        self.batches = []
+        FakeProcessPoolExecutor.instances.append(self)
+
+    def submit(self, func, *args):
+        future = Future()
+        # Worker process initialization must not touch the test process.
+        if func is _flush_raw_batch:
+            self.batches.append(args[0])
+            func(*args)
+        future.set_result(None)
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def _kill_worker_process(values):
+    os._exit(1)
+
+
+def make_event_message(project, message="hello world"):
+    payload = get_normalized_event({"message": message}, project)
+    return msgpack.packb(
+        {
+            "type": "event",
+            "payload": json.dumps(payload),
+            "start_time": time.time() - 3600,
+            "event_id": payload["event_id"],
+            "project_id": project.id,
+            "remote_addr": "127.0.0.1",
+        }
+    )
+
+
+@pytest.mark.django_db
+def test_flush_raw_batch(default_project, task_runner, preprocess_event):
+    _flush_raw_batch([make_event_message(default_project)])
+
+    (kwargs,) = preprocess_event
+    assert kwargs["data"]["logentry"]["formatted"] == "hello world"
+    assert kwargs["project"] == default_project
+
+
+@pytest.mark.django_db
+def test_multiprocess_worker_routes_by_partition(
+    default_project, task_runner, preprocess_event, monkeypatch
+):
+    monkeypatch.setattr(
+        "sentry.ingest.ingest_consumer.ProcessPoolExecutor", FakeProcessPoolExecutor
+    )
+    FakeProcessPoolExecutor.instances = []
+
+    worker = IngestConsumerWorker(processes=2)
+    batch = [
+        worker.process_message(
+            FakeKafkaMessage(topic, partition, make_event_message(default_project))
+        )
+        for topic, partition in (("events", 0), ("events", 1), ("attachments", 0), ("events", 0))
+    ]
+    worker.flush_batch(batch)
+    worker.shutdown()
+
+    assert len(preprocess_event) == 4
+    pool_a, pool_b = FakeProcessPoolExecutor.instances
+    assert pool_a.batches == [[batch[0][1], batch[2][1], batch[3][1]]]
+    assert pool_b.batches == [[batch[1][1]]]
+
+
+def test_multiprocess_worker_crash(monkeypatch):
+    # Worker processes are forked with the patched function.
+    monkeypatch.setattr("sentry.ingest.ingest_consumer._flush_raw_batch", _kill_worker_process)
+
+    worker = IngestConsumerWorker(processes=1)
+    message = worker.process_message(FakeKafkaMessage("events", 0, b""))
+    try:
+        with pytest.raises(BrokenProcessPool):
+            worker.flush_batch([message])
+    finally:
+        worker.shutdown()
+
+
+@pytest.mark.django_db
+def test_batch_context(default_project, default_organization, monkeypatch):
+    feature_checks = []
+
+    def has(name, organization, actor=None):
+        feature_checks.append((name, organization.id))
+        return True
+
+    monkeypatch.setattr("sentry.features.has", has)
+
+    processed_key = f"ev:{default_project.id}:{'a' * 32}"
+    unprocessed_key = f"ev:{default_project.id}:{'b' * 32}"
+    cache.set(processed_key, "", 60)
+
+    context = IngestBatchContext.load(
+        [default_project.id], event_keys=[processed_key, unprocessed_key]
+    )
+
+    project = context.get_project(default_project.id)
+    assert project == default_project
+    assert project._organization_cache == default_organization
+    assert context.get_project(default_project.id + 1) is None
+
+    assert context.has_feature("organizations:event-attachments", project)
+    assert context.has_feature("organizations:event-attachments", project)
+    assert feature_checks == [("organizations:event-attachments", default_organization.id)]
+
+    assert context.is_event_processed(processed_key)
+    assert not context.is_event_processed(unprocessed_key)
+    context.mark_event_processed(unprocessed_key)
+    assert context.is_event_processed(unprocessed_key)
@@ -17,6 +17,7 @@ from sentry.lang.javascript.processor import (
     CACHE_CONTROL_MIN,
     JavaScriptStacktraceProcessor,
     UnparseableSourcemap,
+    _sourcemap_view_cache,
     cache,
     discover_sourcemap,
     fetch_file,
@@ -27,12 +28,14 @@ from sentry.lang.javascript.processor import (
     get_max_age,
     get_release_file_cache_key,
     get_release_file_cache_key_meta,
+    preload_release_artifacts,
     should_retry_fetch,
     trim_line,
 )
 from sentry.models import EventError, File, Release, ReleaseFile
 from sentry.models.releasefile import ARTIFACT_INDEX_FILENAME, update_artifact_index
 from sentry.testutils import TestCase
+from sentry.testutils.helpers import override_options
 from sentry.utils import json
 from sentry.utils.compat.mock import ANY, MagicMock, call, patch
 from sentry.utils.strings import truncatechars
@@ -701,6 +704,57 @@ class FetchFileTest(TestCase):
         assert exc.value.data["url"] == url
 
 
+class PreloadReleaseArtifactsTest(TestCase):
+    def test_simple(self):
+        compressed = BytesIO()
+        with zipfile.ZipFile(compressed, mode="w") as zip_file:
+            zip_file.writestr("example.js", b"foo")
+            zip_file.writestr(
+                "manifest.json",
+                json.dumps({"files": {"example.js": {"url": "/example.js"}}}),
+            )
+
+        release = Release.objects.create(version="1", organization_id=self.project.organization_id)
+        release.add_project(self.project)
+
+        compressed.seek(0)
+        file_ = File.objects.create(name="foo", type="release.bundle")
+        file_.putfile(compressed)
+        update_artifact_index(release, None, file_)
+
+        file = File.objects.create(name="file.min.js", type="release.file")
+        file.putfile(BytesIO(b"bar"))
+        releasefile = ReleaseFile.objects.create(
+            name="file.min.js",
+            release_id=release.id,
+            organization_id=self.project.organization_id,
+            file=file,
+        )
+
+        preloaded = preload_release_artifacts(
+            release, None, ["/example.js", "file.min.js", "missing.js"]
+        )
+
+        assert preloaded.index_entries["/example.js"]["filename"] == "example.js"
+        assert preloaded.index_entries["file.min.js"] is None
+        assert "/example.js" not in preloaded.release_files
+        assert preloaded.release_files["file.min.js"] == [releasefile]
+        assert preloaded.release_files["missing.js"] == []
+
+        with patch.object(ReleaseFile.objects, "filter") as mock_filter:
+            result = fetch_file("file.min.js", release=release, preloaded=preloaded)
+            assert result.body == b"bar"
+
+            with pytest.raises(http.BadSource):
+                fetch_file("missing.js", release=release, preloaded=preloaded)
+
+        assert not mock_filter.called
+
+        # Cached artifacts do not need to be looked up again
+        preloaded = preload_release_artifacts(release, None, ["file.min.js"])
+        assert preloaded.release_files == {}
+
+
 class CacheControlTest(unittest.TestCase):
     def test_simple(self):
         headers = {"content-type": "application/json", "cache-control": "max-age=120"}
@@ -927,6 +981,15 @@ class FetchSourcemapTest(TestCase):
         assert sv.get_source() == 'console.log("hello, World!")'
         assert smap_view.get_source_name(0) == "/test.js"
 
+    def test_view_cache(self):
+        _sourcemap_view_cache.clear()
+        assert fetch_sourcemap(base64_sourcemap) is not fetch_sourcemap(base64_sourcemap)
+
+        with override_options({"processing.sourcemap-view-cache-ttl": 60}):
+            smap_view = fetch_sourcemap(base64_sourcemap)
+            assert fetch_sourcemap(base64_sourcemap) is smap_view
+            assert fetch_sourcemap(base64_sourcemap.rstrip("=")) is smap_view
+
     def test_broken_base64(self):
         with pytest.raises(UnparseableSourcemap):
             fetch_sourcemap("data:application/json;base64,xxx")
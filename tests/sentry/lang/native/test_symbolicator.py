@@ -1,10 +1,17 @@
 import copy
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import pytest
 
 from sentry.lang.native import symbolicator
-from sentry.lang.native.symbolicator import get_sources_for_project, redact_internal_sources
-from sentry.testutils.helpers import Feature
+from sentry.lang.native.symbolicator import (
+    SymbolicatorSession,
+    get_sources_for_project,
+    redact_internal_sources,
+)
+from sentry.testutils.helpers import Feature, override_options
+from sentry.utils import json
 from sentry.utils.compat import map
 
 CUSTOM_SOURCE_CONFIG = """
@@ -265,3 +272,52 @@ class TestAliasReversion:
         reverse_aliases = symbolicator.reverse_aliases_map(builtin_sources)
         expected = {"sentry:ios-source": "sentry:ios", "sentry:tvos-source": "sentry:ios"}
         assert reverse_aliases == expected
+
+
+class StandInSymbolicatorHandler(BaseHTTPRequestHandler):
+    """Answers every symbolication request right away and records the
+    client connections it was sent over."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.connections.add(self.client_address)
+
+        body = json.dumps({"status": "completed", "stacktraces": [], "modules": []}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def symbolicator_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInSymbolicatorHandler)
+    server.connections = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield "http://%s:%s" % server.server_address, server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize("pooled, connections", [(False, 3), (True, 1)])
+def test_pooled_session(symbolicator_server, monkeypatch, pooled, connections):
+    url, server = symbolicator_server
+    monkeypatch.setattr(symbolicator, "_pooled_sessions", threading.local())
+
+    with override_options({"symbolicator.pooled-session": pooled}):
+        for event_id in ("a" * 32, "b" * 32, "c" * 32):
+            with SymbolicatorSession(url=url, project_id="1", event_id=event_id, timeout=5) as sess:
+                rv = sess.symbolicate_stacktraces(stacktraces=[], modules=[])
+            assert rv["status"] == "completed"
+            assert sess.session is None
+
+    assert len(server.connections) == connections
@@ -1,12 +1,17 @@
 import os
+import shutil
+import tempfile
+from hashlib import sha1
 from io import BytesIO
 from unittest.mock import patch
 
 from django.core.files.base import ContentFile
 from django.db import DatabaseError
 
-from sentry.models import File, FileBlob, FileBlobIndex
+from sentry.models import File, FileBlob, FileBlobIndex, FileBlobOwner
+from sentry.models.file import MULTI_BLOB_UPLOAD_CONCURRENCY, blob_cache
 from sentry.testutils import TestCase
+from sentry.testutils.helpers import override_options
 from sentry.utils.compat import map
 
 
@@ -26,6 +31,30 @@ class FileBlobTest(TestCase):
         assert my_file1.checksum == my_file2.checksum
         assert my_file1.path == my_file2.path
 
+    def test_from_files(self):
+        existing = FileBlob.from_file(ContentFile(b"foo"))
+
+        blobs = FileBlob.from_files(
+            [ContentFile(b"bar"), ContentFile(b"foo"), ContentFile(b"bar")],
+            organization=self.organization,
+        )
+
+        assert [blob.checksum for blob in blobs] == [
+            sha1(b"bar").hexdigest(),
+            sha1(b"foo").hexdigest(),
+            sha1(b"bar").hexdigest(),
+        ]
+        assert blobs[1].id == existing.id
+        assert blobs[0].id == blobs[2].id
+        assert FileBlob.objects.count() == 2
+        assert FileBlobOwner.objects.filter(organization_id=self.organization.id).count() == 2
+
+    def test_from_files_checksum_mismatch(self):
+        with self.assertRaises(IOError):
+            FileBlob.from_files([(ContentFile(b"foo"), sha1(b"bar").hexdigest())])
+
+        assert not FileBlob.objects.exists()
+
     def test_generate_unique_path(self):
         path = FileBlob.generate_unique_path()
         assert path
@@ -127,6 +156,38 @@ class FileTest(TestCase):
         with self.assertRaises(ValueError):
             fp.read()
 
+    def test_putfile_reuses_blobs(self):
+        data = b"abcd" * (MULTI_BLOB_UPLOAD_CONCURRENCY + 2)
+        file1 = File.objects.create(name="baz.js", type="default", size=len(data))
+        results = file1.putfile(BytesIO(data), 4)
+
+        assert len(results) == MULTI_BLOB_UPLOAD_CONCURRENCY + 2
+        assert [index.offset for index in results] == list(range(0, len(data), 4))
+        assert len({index.blob_id for index in results}) == 1
+        assert file1.size == len(data)
+        assert file1.checksum == sha1(data).hexdigest()
+
+        with file1.getfile() as fp:
+            assert fp.read() == data
+
+    @patch("sentry.models.file.MULTI_BLOB_UPLOAD_MAX_BYTES", 8)
+    def test_putfile_bounds_window_by_bytes(self):
+        data = b"abcdefghijklmnopqrstuvwxyz"
+        file1 = File.objects.create(name="baz.js", type="default", size=len(data))
+
+        with patch.object(FileBlob, "from_files", wraps=FileBlob.from_files) as from_files:
+            results = file1.putfile(BytesIO(data), 3)
+
+        # At most 8 bytes, so two chunks of 3 bytes, are read at once
+        assert [len(call[0][0]) for call in from_files.call_args_list] == [2, 2, 2, 2, 1]
+        assert len(results) == 9
+
+        with patch.object(FileBlob, "from_files", wraps=FileBlob.from_files) as from_files:
+            file1.putfile(BytesIO(data), 10)
+
+        # Chunks larger than the limit are read one at a time
+        assert [len(call[0][0]) for call in from_files.call_args_list] == [1, 1, 1]
+
     def test_seek(self):
         """Test behavior of seek with difference values for whence"""
         bytes = BytesIO(b"abcdefghijklmnopqrstuvwxyz")
@@ -155,6 +216,47 @@ class FileTest(TestCase):
             with self.assertRaises(ValueError):
                 fp.seek(0, 666)
 
+    def test_range_read_opens_covering_blobs(self):
+        file1 = File.objects.create(name="baz.js", type="default", size=26)
+        file1.putfile(BytesIO(b"abcdefghijklmnopqrstuvwxyz"), 5)
+
+        getfile = FileBlob.getfile
+        opened = []
+
+        def record_getfile(blob, **kwargs):
+            opened.append(blob.checksum)
+            return getfile(blob, **kwargs)
+
+        with patch.object(FileBlob, "getfile", autospec=True, side_effect=record_getfile):
+            with file1.getfile() as fp:
+                del opened[:]
+                fp.seek(-4, 2)
+                assert fp.read() == b"wxyz"
+                assert opened == [sha1(b"uvwxy").hexdigest(), sha1(b"z").hexdigest()]
+
+                del opened[:]
+                fp.seek(12)
+                assert fp.read(2) == b"mn"
+                assert opened == [sha1(b"klmno").hexdigest()]
+
+    def test_sequential_read_ahead(self):
+        data = b"abcdefghijklmnopqrstuvwxyz"
+        file1 = File.objects.create(name="baz.js", type="default", size=len(data))
+        file1.putfile(BytesIO(data), 5)
+
+        with file1.getfile() as fp:
+            result = b""
+            while True:
+                chunk = fp.read(3)
+                if not chunk:
+                    break
+                result += chunk
+            assert result == data
+
+            fp.seek(7)
+            assert fp.read(10) == data[7:17]
+            assert fp.tell() == 17
+
     def test_multi_chunk_prefetch(self):
         random_data = os.urandom(1 << 25)
 
@@ -164,3 +266,64 @@ class FileTest(TestCase):
 
         f = file.getfile(prefetch=True)
         assert f.read() == random_data
+
+
+class FileBlobCacheTest(TestCase):
+    def setUp(self):
+        self.cache_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_path)
+
+    def test_disabled(self):
+        blob = FileBlob.from_file(ContentFile(b"foo bar"))
+
+        with patch.object(blob_cache, "getfile") as mock_getfile:
+            with blob.getfile(use_cache=True) as f:
+                assert f.read() == b"foo bar"
+
+        assert not mock_getfile.called
+
+    def test_hit_and_miss(self):
+        blob = FileBlob.from_file(ContentFile(b"foo bar"))
+
+        with override_options({"filestore.blob-cache-path": self.cache_path}):
+            with blob.getfile(use_cache=True) as f:
+                assert f.read() == b"foo bar"
+
+            assert os.path.isfile(blob_cache.get_path(blob.checksum))
+
+            with patch("sentry.models.file.get_storage") as mock_get_storage:
+                with blob.getfile(use_cache=True) as f:
+                    assert f.read() == b"foo bar"
+
+            assert not mock_get_storage.called
+
+    def test_corrupt_entry(self):
+        blob = FileBlob.from_file(ContentFile(b"foo bar"))
+
+        with override_options({"filestore.blob-cache-path": self.cache_path}):
+            path = blob_cache.get_path(blob.checksum)
+            os.makedirs(os.path.dirname(path))
+            with open(path, "wb") as f:
+                f.write(b"garbage")
+
+            with blob.getfile(use_cache=True) as f:
+                assert f.read() == b"foo bar"
+
+            with open(path, "rb") as f:
+                assert f.read() == b"foo bar"
+
+    def test_evict(self):
+        old = FileBlob.from_file(ContentFile(b"foo"))
+        new = FileBlob.from_file(ContentFile(b"bar"))
+
+        with override_options(
+            {"filestore.blob-cache-path": self.cache_path, "filestore.blob-cache-size": 4}
+        ):
+            old.getfile(use_cache=True).close()
+            new.getfile(use_cache=True).close()
+            os.utime(blob_cache.get_path(old.checksum), (0, 0))
+
+            blob_cache.evict()
+
+            assert not os.path.exists(blob_cache.get_path(old.checksum))
+            assert os.path.isfile(blob_cache.get_path(new.checksum))
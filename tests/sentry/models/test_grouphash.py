@@ -0,0 +1,165 @@
+from django.core.cache import cache
+
+from sentry.models import GroupHash
+from sentry.models.grouphash import (
+    CACHE_VERSION_LOCAL_TTL,
+    _cache_versions,
+    _get_cache_version_key,
+    _grouphash_cache,
+)
+from sentry.tasks.merge import merge_groups
+from sentry.tasks.unmerge import lock_hashes, unlock_hashes
+from sentry.testutils import TestCase
+from sentry.testutils.helpers import override_options
+from sentry.unmerge import PrimaryHashUnmergeReplacement
+from sentry.utils.compat import mock
+
+
+class GroupHashManagerTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        _grouphash_cache.clear()
+        _cache_versions.clear()
+
+    def test_get_or_create_many(self):
+        existing = GroupHash.objects.create(project=self.project, hash="a" * 32)
+
+        grouphashes = GroupHash.objects.get_or_create_many(self.project, ["b" * 32, "a" * 32])
+
+        assert [gh.hash for gh in grouphashes] == ["b" * 32, "a" * 32]
+        assert grouphashes[1].id == existing.id
+        assert GroupHash.objects.filter(project=self.project).count() == 2
+
+    def test_get_many_for_project_without_cache(self):
+        group = self.create_group()
+        GroupHash.objects.create(project=self.project, hash="a" * 32, group=group)
+
+        with self.assertNumQueries(1):
+            rv = GroupHash.objects.get_many_for_project(self.project.id, ["a" * 32, "b" * 32])
+        assert list(rv) == ["a" * 32]
+
+        assert len(_grouphash_cache) == 0
+
+    @override_options({"store.grouphash-cache-ttl": 60})
+    def test_get_many_for_project_cached(self):
+        group = self.create_group()
+        grouphash = GroupHash.objects.create(project=self.project, hash="a" * 32, group=group)
+        GroupHash.objects.create(project=self.project, hash="b" * 32)
+
+        rv = GroupHash.objects.get_many_for_project(self.project.id, ["a" * 32, "b" * 32])
+        assert rv["a" * 32].group_id == group.id
+        assert rv["b" * 32].group_id is None
+
+        # Only the hash that resolves to a group is cached.
+        with self.assertNumQueries(0):
+            rv = GroupHash.objects.get_many_for_project(self.project.id, ["a" * 32])
+        assert rv["a" * 32].id == grouphash.id
+        assert rv["a" * 32].group_id == group.id
+
+        with self.assertNumQueries(1):
+            GroupHash.objects.get_many_for_project(self.project.id, ["a" * 32], use_cache=False)
+
+    @override_options({"store.grouphash-cache-ttl": 60})
+    def test_invalidate_cache(self):
+        group = self.create_group()
+        new_group = self.create_group()
+        GroupHash.objects.create(project=self.project, hash="a" * 32, group=group)
+
+        GroupHash.objects.get_many_for_project(self.project.id, ["a" * 32])
+
+        GroupHash.objects.filter(project=self.project).update(group=new_group)
+        GroupHash.objects.invalidate_cache(self.project.id)
+
+        rv = GroupHash.objects.get_many_for_project(self.project.id, ["a" * 32])
+        assert rv["a" * 32].group_id == new_group.id
+
+    @override_options({"store.grouphash-cache-ttl": 60})
+    def test_save_invalidates_cache(self):
+        group = self.create_group()
+        grouphash = GroupHash.objects.create(project=self.project, hash="a" * 32, group=group)
+
+        GroupHash.objects.get_many_for_project(self.project.id, ["a" * 32])
+
+        grouphash.state = GroupHash.State.SPLIT
+        grouphash.save()
+
+        rv = GroupHash.objects.get_many_for_project(self.project.id, ["a" * 32])
+        assert rv["a" * 32].state == GroupHash.State.SPLIT
+
+    @override_options({"store.grouphash-cache-ttl": 60})
+    def test_cache_version_is_kept_locally(self):
+        group = self.create_group()
+        GroupHash.objects.create(project=self.project, hash="a" * 32, group=group)
+
+        GroupHash.objects.get_many_for_project(self.project.id, ["a" * 32])
+
+        with mock.patch("sentry.models.grouphash.cache") as shared_cache, self.assertNumQueries(0):
+            rv = GroupHash.objects.get_many_for_project(self.project.id, ["a" * 32])
+        assert rv["a" * 32].group_id == group.id
+        assert not shared_cache.get.called
+
+    @override_options({"store.grouphash-cache-ttl": 60})
+    def test_invalidate_cache_in_other_process(self):
+        group = self.create_group()
+        new_group = self.create_group()
+        GroupHash.objects.create(project=self.project, hash="a" * 32, group=group)
+
+        now = _cache_versions._clock()
+
+        with mock.patch.object(_cache_versions, "_clock", return_value=now):
+            GroupHash.objects.get_many_for_project(self.project.id, ["a" * 32])
+
+        # Another process moves the grouphash and replaces the version in the
+        # shared cache, this process still holds the old version.
+        GroupHash.objects.filter(project=self.project).update(group=new_group)
+        cache.set(_get_cache_version_key(self.project.id), "other", 3600)
+
+        with mock.patch.object(_cache_versions, "_clock", return_value=now + 1):
+            rv = GroupHash.objects.get_many_for_project(self.project.id, ["a" * 32])
+        assert rv["a" * 32].group_id == group.id
+
+        with mock.patch.object(
+            _cache_versions, "_clock", return_value=now + CACHE_VERSION_LOCAL_TTL + 1
+        ):
+            rv = GroupHash.objects.get_many_for_project(self.project.id, ["a" * 32])
+        assert rv["a" * 32].group_id == new_group.id
+
+    @override_options({"store.grouphash-cache-ttl": 60})
+    def test_merge_invalidates_cache(self):
+        group = self.create_group()
+        new_group = self.create_group()
+        GroupHash.objects.create(project=self.project, hash="a" * 32, group=group)
+
+        GroupHash.objects.get_many_for_project(self.project.id, ["a" * 32])
+
+        with self.tasks():
+            merge_groups([group.id], new_group.id)
+
+        rv = GroupHash.objects.get_many_for_project(self.project.id, ["a" * 32])
+        assert rv["a" * 32].group_id == new_group.id
+
+    @override_options({"store.grouphash-cache-ttl": 60})
+    def test_unmerge_invalidates_cache(self):
+        group = self.create_group()
+        new_group = self.create_group()
+        GroupHash.objects.create(project=self.project, hash="a" * 32, group=group)
+        GroupHash.objects.create(project=self.project, hash="b" * 32, group=group)
+
+        GroupHash.objects.get_many_for_project(self.project.id, ["a" * 32, "b" * 32])
+
+        locked_hashes = lock_hashes(self.project.id, group.id, ["a" * 32])
+        assert locked_hashes == ["a" * 32]
+
+        rv = GroupHash.objects.get_many_for_project(self.project.id, ["a" * 32, "b" * 32])
+        assert rv["a" * 32].state == GroupHash.State.LOCKED_IN_MIGRATION
+        assert rv["b" * 32].state is None
+
+        PrimaryHashUnmergeReplacement(fingerprints=["a" * 32]).run_postgres_replacement(
+            self.project, new_group.id, locked_hashes
+        )
+        unlock_hashes(self.project.id, locked_hashes)
+
+        rv = GroupHash.objects.get_many_for_project(self.project.id, ["a" * 32, "b" * 32])
+        assert rv["a" * 32].group_id == new_group.id
+        assert rv["a" * 32].state is None
+        assert rv["b" * 32].group_id == group.id
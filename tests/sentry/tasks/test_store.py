@@ -7,12 +7,15 @@ from sentry import quotas
 from sentry.event_manager import EventManager, HashDiscarded
 from sentry.plugins.base.v2 import Plugin2
 from sentry.tasks.store import (
+    RetrySymbolication,
+    _do_symbolicate_event,
     preprocess_event,
     process_event,
     save_event,
     symbolicate_event,
     time_synthetic_monitoring_event,
 )
+from sentry.testutils.helpers import override_options
 from sentry.utils.compat import mock
 
 EVENT_ID = "cc3e6c2bb6b6498097f336d1e6979f4b"
@@ -169,6 +172,56 @@ def test_symbolicate_event_call_process_inline(
     )
 
 
+@pytest.mark.django_db
+@pytest.mark.parametrize("non_blocking", [False, True])
+def test_symbolicate_event_retry(
+    default_project,
+    mock_event_processing_store,
+    mock_get_symbolication_function,
+    non_blocking,
+):
+    data = {
+        "project": default_project.id,
+        "platform": "native",
+        "event_id": EVENT_ID,
+    }
+    mock_event_processing_store.get.return_value = data
+
+    def symbolicate(data):
+        if not retries:
+            return {"type": "error"}
+        raise RetrySymbolication(retry_after=retries.pop())
+
+    retries = [0]
+    mock_get_symbolication_function.return_value = symbolicate
+    symbolicate_task = mock.Mock()
+
+    with override_options({"symbolicator.non-blocking-polling": non_blocking}), mock.patch(
+        "sentry.tasks.store.sleep"
+    ) as mock_sleep, mock.patch("sentry.tasks.store._do_process_event") as mock_do_process_event:
+        _do_symbolicate_event(
+            cache_key="e:1",
+            start_time=1,
+            event_id=EVENT_ID,
+            symbolicate_task=symbolicate_task,
+            symbolication_attempt=2,
+        )
+
+    if non_blocking:
+        # The worker is released and the task polls again after a backoff.
+        assert mock_sleep.call_count == 0
+        assert mock_do_process_event.call_count == 0
+        ((_, kwargs),) = symbolicate_task.apply_async.call_args_list
+        assert kwargs["countdown"] == 4
+        assert kwargs["kwargs"]["cache_key"] == "e:1"
+        assert kwargs["kwargs"]["symbolication_attempt"] == 3
+        assert kwargs["kwargs"]["symbolication_start_time"] is not None
+    else:
+        mock_sleep.assert_called_once_with(0)
+        assert symbolicate_task.apply_async.call_count == 0
+        assert mock_do_process_event.call_count == 1
+
+
 @pytest.mark.django_db
 def test_move_to_save_event(
     default_project, mock_process_event, mock_save_event, mock_symbolicate_event, register_plugin
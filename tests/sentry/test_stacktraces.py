@@ -1,12 +1,17 @@
 import pytest
 
 from sentry.grouping.api import get_default_grouping_config_dict, load_grouping_config
+from sentry.grouping.enhancer import Enhancements
+from sentry.projectoptions.defaults import DEFAULT_GROUPING_CONFIG
 from sentry.stacktraces.processing import (
     find_stacktraces_in_data,
     get_crash_frame_from_event_data,
+    lookup_frame_cache,
     normalize_stacktraces_for_grouping,
+    set_frame_cache_value,
 )
 from sentry.testutils import TestCase
+from sentry.utils.cache import cache
 
 
 class FindStacktracesTest(TestCase):
@@ -243,6 +248,31 @@ class NormalizeInApptest(TestCase):
         # Unknown object should default to not in_app
         assert data["stacktrace"]["frames"][3]["in_app"] is False
 
+    def test_normalize_with_trimmed_function(self):
+        data = {
+            "platform": "native",
+            "stacktrace": {
+                "frames": [
+                    {"function": "void foo::bar(int)", "instruction_addr": "0x1000"},
+                    {"function": "baz", "instruction_addr": "0x2000"},
+                ]
+            },
+        }
+
+        enhancements = Enhancements.from_config_string("function:foo::bar +app")
+        config = load_grouping_config(
+            {"id": DEFAULT_GROUPING_CONFIG, "enhancements": enhancements.dumps()}
+        )
+        for _ in range(2):
+            normalize_stacktraces_for_grouping(data, grouping_config=config)
+
+            frames = data["stacktrace"]["frames"]
+            assert frames[0]["function"] == "foo::bar"
+            assert frames[0]["raw_function"] == "void foo::bar(int)"
+            assert frames[0]["in_app"] is True
+            assert "raw_function" not in frames[1]
+            assert frames[1]["in_app"] is False
+
     def tes_macos_package_in_app_detection(self):
         data = {
             "platform": "cocoa",
@@ -419,3 +449,15 @@ class NormalizeInApptest(TestCase):
 )
 def test_get_crash_frame(event):
     assert get_crash_frame_from_event_data(event)["marco"] == "polo"
+
+
+def test_lookup_frame_cache():
+    set_frame_cache_value("pf:hit", [None, "org.slf4j.helpers.Util"])
+    cache.set("pf:unknown", {"not": "encoded"})
+
+    assert lookup_frame_cache(["pf:hit", "pf:miss", "pf:unknown"]) == {
+        "pf:hit": [None, "org.slf4j.helpers.Util"],
+        "pf:miss": None,
+        "pf:unknown": None,
+    }
+    assert lookup_frame_cache([]) == {}
@@ -0,0 +1,55 @@
+from sentry.utils.cache import BoundedCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bounded_cache_get_set():
+    cache = BoundedCache(max_size=10)
+    assert cache.get("foo") is None
+    assert cache.get("foo", 42) == 42
+
+    cache.set("foo", "bar")
+    assert cache.get("foo") == "bar"
+    assert "foo" in cache
+    assert len(cache) == 1
+
+    cache.delete("foo")
+    assert "foo" not in cache
+
+    cache.set("foo", None)
+    assert "foo" in cache
+    assert cache.get_many(["foo", "bar"]) == {"foo": None}
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_bounded_cache_evicts_least_recently_used():
+    cache = BoundedCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    cache.set("c", 3)
+    assert cache.get_many(["a", "b", "c"]) == {"a": 1, "c": 3}
+
+
+def test_bounded_cache_ttl():
+    clock = FakeClock()
+    cache = BoundedCache(max_size=10, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=20)
+
+    clock.now = 15
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+    clock.now = 20
+    assert cache.get("b") is None
+    assert len(cache) == 0